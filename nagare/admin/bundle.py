@@ -0,0 +1,100 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""The ``bundle`` administrative command
+
+Precompute the bundles of the static CSS and javascript files of an application,
+by rendering some of its pages
+"""
+
+import os
+
+import webob
+
+from nagare import log, local, bundles
+from nagare.admin import util, command
+from nagare.sessions.memory_sessions import SessionsWithPickledStates
+
+
+def set_options(optparser):
+    """Register the possible options
+
+    In:
+      - ``optparser`` -- the options parser
+    """
+    optparser.usage += ' <application> [url ...]'
+
+
+def run(parser, options, args):
+    """Render pages of an application to create the bundles of their ``<head>``
+
+    In:
+      - ``parser`` -- the ``optparse.OptParser`` object used to parse the configuration file
+      - ``options`` -- options in the command lines
+      - ``args`` -- arguments in the command lines: the application and the URLs
+        of the pages to render (by default, the root page)
+    """
+    if not args:
+        parser.error('Bad number of parameters')
+
+    cfgfile, app, project_name, aconf = util.read_application(args[0], parser.error)
+    if cfgfile is None:
+        parser.error('Configuration file not found for application "%s"' % args[0])
+
+    bundles_path = aconf['application']['bundles']
+    if not bundles_path:
+        parser.error('No "bundles" directory configured for application "%s"' % args[0])
+
+    log.configure(aconf['logging'].dict(), aconf['application']['app'])
+    log.activate()
+
+    local.worker = local.Process()
+    local.request = local.Process()
+
+    app_url = aconf['application']['name']
+    static_url = '/static/%s/' % app_url
+
+    static_path = aconf['application']['static']
+    if not os.path.isdir(static_path):
+        static_path = None
+
+    data_path = aconf['application']['data']
+    if not os.path.isdir(data_path):
+        data_path = None
+
+    app, databases = util.activate_WSGIApp(
+        app,
+        cfgfile, aconf, parser.error,
+        project_name,
+        static_path, static_url,
+        data_path,
+        sessions_manager=SessionsWithPickledStates()
+    )
+
+    app.set_bundles(bundles.create(bundles_path, static_url + bundles.URL_NAME, static_path, static_url))
+    app.start()
+
+    for url in args[1:] or ['/']:
+        request = webob.Request.blank('/' + url.lstrip('/'))
+        request.script_name = '/' + app_url
+
+        print url, request.get_response(app).status
+
+    for (kind, urls), (bundle, mtimes) in sorted(app.bundles.manifest.items()):
+        print
+        print os.path.join(bundles_path, bundle)
+        for url in urls:
+            print ' -', url
+
+
+class Bundle(command.Command):
+    desc = 'Create the bundles of the static files of an application'
+
+    set_options = staticmethod(set_options)
+    run = staticmethod(run)
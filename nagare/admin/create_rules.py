@@ -18,6 +18,7 @@ instead of the applications themselves.
 import os
 import pkg_resources
 
+from nagare import bundles
 from nagare.admin import util, command
 
 
@@ -67,7 +68,11 @@ def create_rules(app_names, error):
             if os.path.isdir(static):
                 apps.append((aconf['application']['name'], static))
 
-    return sorted(apps, key=lambda (url, _): len(url))
+            if aconf['application']['bundles']:
+                apps.append((aconf['application']['name'] + '/' + bundles.URL_NAME, aconf['application']['bundles']))
+
+    # The longest URLs first, the bundles before the static contents of their application
+    return sorted(apps, key=lambda (url, _): -len(url))
 
 
 def generate_lighttpd_rules(app_names, error):
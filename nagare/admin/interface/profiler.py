@@ -0,0 +1,80 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Profiles of the components views administrative view
+
+The views are only profiled for the applications with the ``profile_views``
+parameter activated
+"""
+
+from nagare import presentation, state
+
+
+class Admin(object):
+    priority = 300        # Order of the default view, into the administrative interface
+
+    def __init__(self, apps):
+        """Initialization
+
+        In:
+          - ``apps`` -- list of tuples (application, application name, application urls)
+        """
+        # The profiles are not kept into the states of the administrative application
+        self.apps = sorted(
+            (app_name, app.profile_views, state.shared(app.profiler, 'nagare.admin.profiler.' + app_name))
+            for (app, app_name, _) in apps
+        )
+
+    def clear(self, app_name):
+        """Forget the profiles of an application
+
+        In:
+          - ``app_name`` -- name of the application
+        """
+        for name, _, statistics in self.apps:
+            if name == app_name:
+                statistics.clear()
+
+
+@presentation.render_for(Admin)
+def render(self, h, *args):
+    """Display, for each application, the rendering profiles of the views
+    aggregated over the requests, sorted by decreasing exclusive time
+    """
+    with h.div:
+        h << h.h2('Views profiles')
+
+        for app_name, activated, statistics in self.apps:
+            h << h.h3("Application '%s'" % app_name)
+
+            if not activated:
+                h << h.p('The views of this application are not profiled ("profile_views" parameter)')
+                continue
+
+            nb_requests, views = statistics.get_views()
+
+            with h.p('%d profiled requests ' % nb_requests):
+                h << h.a('Reset').action(lambda app_name=app_name: self.clear(app_name))
+
+            if not views:
+                continue
+
+            with h.table:
+                with h.tr:
+                    h << h.th('View') << h.th('Renderings')
+                    h << h.th('Total time (ms)') << h.th('Exclusive time (ms)') << h.th('Exclusive time per rendering (ms)')
+                    h << h.th('Tags per rendering') << h.th('Callbacks per rendering')
+
+                for name, nb, total, exclusive, tags, callbacks in views:
+                    with h.tr:
+                        h << h.td(name) << h.td(nb)
+                        h << h.td('%.1f' % (total * 1000)) << h.td('%.1f' % (exclusive * 1000)) << h.td('%.3f' % (exclusive * 1000 / nb))
+                        h << h.td('%.1f' % (float(tags) / nb)) << h.td('%.1f' % (float(callbacks) / nb))
+
+    return h.root
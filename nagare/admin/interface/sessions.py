@@ -0,0 +1,208 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Sessions and states sizes, and sessions locks wait times, administrative view
+
+Only a random sample of the sessions is inspected and the sizes of a state
+are only broken down on demand, so this view can be used in production
+"""
+
+import cPickle
+import contextlib
+
+from nagare import presentation, state
+from nagare.sessions import ExpirationError, SessionBusyError, serializer
+
+NB_SESSIONS = 20    # Number of sessions sampled for each application
+NB_SIZES = 50       # Number of the biggest attributes displayed for a state
+LOCK_WAIT_TIME = 1.  # Maximum time to wait for the lock of an inspected session, in seconds
+
+
+@contextlib.contextmanager
+def session_states(sessions_manager, session_id):
+    """Read the states of a session, while the session is locked
+
+    The session is locked for a shared access, so that no request modifies
+    its objects graphs while they are read. The wait is bounded, as the
+    session can be the one of the current request
+
+    In:
+      - ``sessions_manager`` -- the sessions manager
+      - ``session_id`` -- id of the session
+
+    Return:
+      - data kept into the session
+      - list of the (state id, data kept into the state)
+    """
+    lock = sessions_manager.get_lock(session_id)
+
+    shared = hasattr(lock, 'acquire_shared')
+    if shared:
+        acquired = lock.acquire_shared(LOCK_WAIT_TIME)
+    else:
+        acquired = lock.acquire()
+
+    if acquired is False:
+        raise SessionBusyError()
+
+    try:
+        yield sessions_manager.get_session_states(session_id)
+    finally:
+        (lock.release_shared if shared else lock.release)()
+
+
+class Admin(object):
+    priority = 200        # Order of the default view, into the administrative interface
+
+    def __init__(self, apps):
+        """Initialization
+
+        In:
+          - ``apps`` -- list of tuples (application, application name, application urls)
+        """
+        # The sessions managers are not kept into the states of the administrative application
+        self.apps = sorted(
+            (app_name, state.shared(app.sessions, 'nagare.admin.sessions.' + app_name))
+            for (app, app_name, _) in apps
+        )
+
+        self.samples = None
+        self.inspected = None
+
+    def sample(self):
+        """Collect the sizes of a random sample of sessions for each application"""
+        self.samples = []
+        self.inspected = None
+
+        for app_name, sessions_manager in self.apps:
+            statistics = sessions_manager.lock_statistics
+            locks = (statistics.nb, statistics.nb_busy, statistics.total_wait_time / (statistics.nb or 1), statistics.max_wait_time)
+
+            try:
+                nb, sessions_ids = sessions_manager.sample_sessions(NB_SESSIONS)
+            except NotImplementedError:
+                self.samples.append((app_name, locks, None, ()))
+                continue
+
+            sessions = []
+            for session_id in sessions_ids:
+                try:
+                    with session_states(sessions_manager, session_id) as (session_data, states):
+                        states = [(state_id, serializer.pickled_size(data)) for state_id, data in states]
+                        sessions.append((session_id, serializer.pickled_size(session_data), sorted(states), None))
+                except ExpirationError:
+                    continue
+                except SessionBusyError:
+                    sessions.append((session_id, None, [], 'Session locked'))
+                except (RuntimeError, cPickle.PicklingError) as e:
+                    sessions.append((session_id, None, [], str(e)))
+
+            sessions.sort(key=lambda session: -sum(size or 0 for _, size in session[2]))
+            self.samples.append((app_name, locks, nb, sessions))
+
+    def inspect(self, app_name, session_id, state_id):
+        """Break the size of a state down by component class and attribute
+
+        In:
+          - ``app_name`` -- name of the application
+          - ``session_id`` -- id of the session
+          - ``state_id`` -- id of the state
+        """
+        sessions_manager = dict(self.apps)[app_name]
+
+        try:
+            with session_states(sessions_manager, session_id) as (session_data, states):
+                root, callbacks = sessions_manager.serializer.loads(session_data, dict(states)[state_id])
+                sizes = serializer.pickled_sizes(root).items()
+        except (ExpirationError, KeyError):
+            self.inspected = (app_name, session_id, state_id, None, (), 'This state no longer exists')
+            return
+        except SessionBusyError:
+            self.inspected = (app_name, session_id, state_id, None, (), 'This session is locked')
+            return
+        except (RuntimeError, cPickle.PicklingError) as e:
+            self.inspected = (app_name, session_id, state_id, None, (), "This state can't be inspected: %s" % e)
+            return
+
+        sizes.sort(key=lambda size: -size[1][1])
+
+        self.inspected = (
+            app_name, session_id, state_id, len(callbacks),
+            [(class_name, name, nb, size) for ((class_name, name), (nb, size)) in sizes[:NB_SIZES]],
+            None
+        )
+
+
+def format_size(size):
+    return '-' if size is None else '{:,}'.format(size)
+
+
+@presentation.render_for(Admin)
+def render(self, h, *args):
+    """Display the sizes of a sample of sessions and, on demand, the
+    breakdown of a state size
+    """
+    with h.div:
+        h << h.h2('Sessions')
+
+        h << h.p(h.a('Sample the sessions' if self.samples is None else 'Sample again').action(self.sample))
+
+        for app_name, locks, nb, sessions in self.samples or ():
+            h << h.h3("Application '%s'" % app_name)
+
+            h << h.p('%d locks acquired (average wait: %.3fs, maximum wait: %.3fs), %d requests rejected' % (locks[0], locks[2], locks[3], locks[1]))
+
+            if nb is None:
+                h << h.p("The sessions manager can't list its sessions")
+                continue
+
+            h << h.p('%d sessions, %d sampled' % (nb, len(sessions)))
+
+            if not sessions:
+                continue
+
+            with h.table:
+                with h.tr:
+                    h << h.th('Session') << h.th('Session data (bytes)') << h.th('States') << h.th('Bytes per state')
+
+                for session_id, session_size, states, error in sessions:
+                    with h.tr:
+                        h << h.td(session_id) << h.td(format_size(session_size)) << h.td(len(states))
+
+                        with h.td:
+                            if error:
+                                h << error
+
+                            for i, (state_id, size) in enumerate(states):
+                                if i:
+                                    h << ', '
+
+                                h << h.a('#%d: %s' % (state_id, format_size(size))).action(
+                                    lambda app_name=app_name, session_id=session_id, state_id=state_id: self.inspect(app_name, session_id, state_id)
+                                )
+
+        if self.inspected is not None:
+            app_name, session_id, state_id, nb_callbacks, sizes, error = self.inspected
+
+            h << h.h3("State #%d of the session %d of the application '%s'" % (state_id, session_id, app_name))
+
+            if error:
+                h << h.p(error)
+            else:
+                h << h.p('%d registered callbacks' % nb_callbacks)
+
+                with h.table:
+                    with h.tr:
+                        h << h.th('Class') << h.th('Attribute') << h.th('Instances') << h.th('Bytes')
+
+                    for class_name, name, nb, size in sizes:
+                        with h.tr:
+                            h << h.td(class_name) << h.td(name) << h.td(nb) << h.td(format_size(size))
+
+    return h.root
@@ -17,7 +17,7 @@ import os
 import pkg_resources
 import configobj
 
-from nagare import config, log
+from nagare import config, log, compression, bundles, fragments
 from nagare.admin import reloader, util, reference, command
 
 # ---------------------------------------------------------------------------
@@ -122,10 +122,16 @@ def create_wsgi_pipe(app, options, config_filename, config, error):
         app = debugged_app(app)
 
     wsgi_pipe = config['application']['wsgi_pipe']
-    if not wsgi_pipe:
-        return app
+    if wsgi_pipe:
+        app = reference.load_object(wsgi_pipe)[0](app, options, config_filename, config, error)
+
+    if config['application']['esi'] == 'local':
+        app = fragments.create_pipe(app, options, config_filename, config, error)
+
+    if config['application']['compression']:
+        app = compression.create_pipe(app, options, config_filename, config, error)
 
-    return reference.load_object(wsgi_pipe)[0](app, options, config_filename, config, error)
+    return app
 
 
 # ---------------------------------------------------------------------------
@@ -228,6 +234,16 @@ def run(parser, options, args):
         else:
             static_path = static_url = None
 
+        bundles_path = aconf['application']['bundles']
+        if bundles_path:
+            # Register the function to serve the bundles of the static contents,
+            # with a far-future expiration date
+            bundles_url = publisher.register_static(
+                app_url + '/' + bundles.URL_NAME,
+                lambda path, bundles_path=bundles_path: get_file_from_root(bundles_path, path),
+                bundles.MAX_AGE
+            )
+
         data_path = aconf['application']['data']
         if not os.path.isdir(data_path):
             data_path = None
@@ -251,6 +267,9 @@ def run(parser, options, args):
             sessions_manager
         )
 
+        if bundles_path:
+            app.set_bundles(bundles.create(bundles_path, bundles_url, static_path, static_url))
+
         # Register the application to the publisher
         publisher.register_application(
             aconf['application']['app'],
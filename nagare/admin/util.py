@@ -28,6 +28,21 @@ application_options_spec = {
 
         redirect_after_post='boolean(default=False)',  # Follow the PRG pattern ?
         always_html='boolean(default=True)',  # Don't generate xhtml, even if it's a browser capability ?
+        coalescing_window='float(default=1.)',  # Time during which the duplicates of a request receive its response
+        streaming_output='boolean(default=False)',  # Send the HTML pages by chunks, while they are serialized ?
+        compact_output='boolean(default=False)',  # Generate the HTML without indentation nor namespaces cleaning ?
+        etags='boolean(default=False)',  # Entity tags on the pages and "304 Not Modified" answers ?
+        defer_scripts='boolean(default=False)',  # Defer the javascript URLs of the head, when safe ?
+        preload_links='boolean(default=False)',  # Send the HTTP "Link" headers of the head contents ?
+        profile_views='boolean(default=False)',  # Record the rendering profiles of the views, for the administrative interface ?
+        profile_header='boolean(default=False)',  # Send the profile of a request into a "X-Nagare-Profile" header, if requested ?
+        esi='option("off", "edge", "local", default="off")',  # Include the fragment views with ESI tags, processed by an edge server or locally ?
+        compression='boolean(default=False)',  # Compress the responses, if accepted by the browser ?
+        compress_threshold='integer(default=512)',  # The responses smaller than this size, in bytes, are not compressed
+        compress_level='integer(min=1, max=9, default=6)',  # Compression level, from 1 (fastest) to 9 (smallest)
+        lazy_sessions='boolean(default=True)',  # Create a new session only when a rendered view references it ?
+        bootstrap_cache='boolean(default=False)',  # Create the new sessions from a cached root component ?
+        bundles='string(default="")',  # Directory where the bundles of the static files are written ("": no bundles)
         wsgi_pipe='string(default="")',  # Method to create the WSGI middlewares pipe
         static='string(default="%s")' % os.path.join('$root', '$app', 'static'),  # Default directory of the static files
         data='string(default="%s")' % os.path.join('$root', '$app', 'data')  # Default directory of the data files
@@ -18,7 +18,7 @@ import re
 import peak.rules
 import pyjs
 
-from nagare import presentation, namespaces, serializer, security, partial
+from nagare import presentation, serializer, security, partial, callbacks
 
 YUI_INTERNAL_PREFIX = '/static/nagare/yui/build'
 YUI_EXTERNAL_PREFIX = 'http://yui.yahooapis.com/2.9.0/build'
@@ -137,10 +137,16 @@ class Update(object):
         self.with_request = with_request
         self.component_to_update = component_to_update
 
+        # Without action or with a read-only action, only a view is rendered
+        readonly = (action is None) or callbacks.is_readonly(action)
+
         # Wrap the ``action`` into a wrapper that will check the user permissions
         action = security.wrapper(action or self.no_action, permissions, subject)
         self.action = partial.Partial(action, *args, **kw)
 
+        if readonly:
+            self.action = callbacks.readonly(self.action)
+
     @classmethod
     def _generate_response(cls, render, args, js, component_to_update, r):
         """Wrap the rendering of a component into a JS statement
@@ -183,7 +189,7 @@ class Update(object):
             js = 'nagare_replaceNode'
 
         # Get the ``id`` attribute of the target element or, else, generate one
-        if isinstance(component_to_update, namespaces.xml._Tag):
+        if not isinstance(component_to_update, basestring):
             id_ = component_to_update.get('id')
             if id_ is None:
                 id_ = renderer.generate_id('id')
@@ -0,0 +1,317 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Bundles of the static CSS and javascript files of the ``<head>``
+
+The consecutive CSS (or javascript) URLs collected by the ``<head>`` renderer,
+referencing local static files, are replaced by a bundle: the files are
+concatenated, the CSS ones minified, and written into a file named after a
+digest of its content. As the URL of a bundle changes with its content, the bundles are
+served with a far-future expiration date.
+
+The bundles are created the first time a list of URLs is rendered, or
+precomputed by the ``nagare-admin bundle`` command. The ``manifest.json`` file
+of the bundles directory keeps the bundles created across the restarts, as
+long as their files are not modified.
+"""
+
+import os
+import re
+import json
+import urlparse
+import hashlib
+import threading
+
+import pkg_resources
+
+# Name of the bundles directory, under the URL of the static contents of the application
+URL_NAME = '_bundles'
+
+# Name of the file listing the created bundles
+MANIFEST = 'manifest.json'
+
+# Expiration time of the bundles, in seconds
+MAX_AGE = 365 * 24 * 3600
+
+CSS_STRINGS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_STRINGS_COMMENTS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/''', re.S)
+CSS_SPACES = re.compile(r'\s+')
+CSS_SEPARATORS = re.compile(r'\s*([{};,>])\s*')
+CSS_COLONS = re.compile(r':\s+')
+CSS_URLS = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+CSS_CHARSET = re.compile(r'''@charset\s+["'][^"']*["']\s*;''', re.I)
+CSS_IMPORT = re.compile(r'@import\b', re.I)
+JS_USE_STRICT = re.compile(r'''^\s*(?:(?://[^\n]*|/\*.*?\*/)\s*)*(['"])use strict\1''', re.S)
+
+_marker = object()
+
+
+def minify_css(css):
+    """Minify a CSS style
+
+    The comments and the useless spaces are removed, the strings are kept
+
+    In:
+      - ``css`` -- the CSS style
+
+    Return:
+      - the minified CSS style
+    """
+    css = CSS_STRINGS_COMMENTS.sub(lambda match: match.group(1) or '', css)
+
+    parts = CSS_STRINGS.split(css)  # The strings are at the odd positions
+    parts[::2] = [CSS_COLONS.sub(':', CSS_SEPARATORS.sub(r'\1', CSS_SPACES.sub(' ', part))) for part in parts[::2]]
+
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+class Bundles(object):
+    """The bundles of the static files of an application
+    """
+    minifiers = {'css': minify_css}  # The javascript files are only concatenated
+    separators = {'css': '\n', 'js': ';\n'}
+
+    def __init__(self, directory, url, static):
+        """Initialization
+
+        In:
+          - ``directory`` -- directory where the bundles are written
+          - ``url`` -- URL prefix of the bundles
+          - ``static`` -- list of tuples (URL prefix, directory) of the static contents
+        """
+        self.directory = directory
+        self.url = url.rstrip('/') + '/'
+
+        # The longest URL prefixes first
+        self.static = sorted([(prefix.rstrip('/') + '/', path) for prefix, path in static], key=lambda (prefix, path): -len(prefix))
+        self.prefixes = tuple(prefix for prefix, path in self.static)
+
+        self.bundles = {}  # (kind, URLs) -> bundle URL (or ``None`` if the files can't be bundled)
+        self.manifest = {}  # (kind, URLs) -> (bundle name, {filename -> modification time})
+        self.lock = threading.Lock()
+
+        self.load_manifest()
+
+    def load_manifest(self):
+        """Read the bundles already created
+
+        The bundles with modified files are discarded
+        """
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                entries = json.load(f)
+        except (IOError, ValueError):
+            entries = []
+
+        for entry in entries:
+            mtimes = entry['mtimes']
+            if os.path.isfile(os.path.join(self.directory, entry['bundle'])) and all(
+                os.path.isfile(filename) and (os.path.getmtime(filename) == mtime)
+                for filename, mtime in mtimes.items()
+            ):
+                key = (entry['kind'], tuple(entry['urls']))
+                self.manifest[key] = (entry['bundle'], mtimes)
+                self.bundles[key] = self.url + entry['bundle']
+
+    def save_manifest(self):
+        """Write the list of the created bundles
+        """
+        entries = [
+            {'kind': kind, 'urls': urls, 'bundle': bundle, 'mtimes': mtimes}
+            for (kind, urls), (bundle, mtimes) in sorted(self.manifest.items())
+        ]
+
+        self.write(MANIFEST, json.dumps(entries, indent=2))
+
+    def write(self, name, content):
+        """Atomically write a file into the bundles directory
+
+        In:
+          - ``name`` -- name of the file
+          - ``content`` -- content of the file
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        filename = os.path.join(self.directory, name)
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+
+        with open(tmp_filename, 'wb') as f:
+            f.write(content)
+
+        if os.path.exists(filename) and (os.name == 'nt'):
+            os.remove(filename)
+        os.rename(tmp_filename, filename)
+
+    def is_local(self, url):
+        """Does an URL reference a local static file?
+
+        In:
+          - ``url`` -- the URL
+
+        Return:
+          - a boolean
+        """
+        return url.startswith(self.prefixes) and ('?' not in url) and ('#' not in url)
+
+    def get_filename(self, url):
+        """Return the file referenced by an URL
+
+        In:
+          - ``url`` -- the URL
+
+        Return:
+          - the path of the file (``None`` if not found)
+        """
+        for prefix, path in self.static:
+            if url.startswith(prefix):
+                path = os.path.normpath(path)
+                filename = os.path.normpath(os.path.join(path, url[len(prefix):]))
+
+                # The files outside of the static directory are not served
+                return filename if filename.startswith(os.path.join(path, '')) and os.path.isfile(filename) else None
+
+        return None
+
+    def read(self, kind, url, filename):
+        """Read and minify a file
+
+        In:
+          - ``kind`` -- ``css`` or ``js``
+          - ``url`` -- URL of the file
+          - ``filename`` -- path of the file
+
+        Return:
+          - the content, minified for a CSS file (``None`` if the file can't be bundled)
+        """
+        with open(filename, 'rb') as f:
+            content = f.read()
+
+        if kind == 'css':
+            if CSS_IMPORT.search(content):
+                # The ``@import`` rules must be at the beginning of a style sheet
+                return None
+
+            content = CSS_CHARSET.sub('', content)
+
+            # The relative URLs are relative to the original location of the file
+            content = CSS_URLS.sub(lambda match: 'url(%s%s%s)' % (match.group(1), urlparse.urljoin(url, match.group(2)), match.group(1)), content)
+
+        if (kind == 'js') and JS_USE_STRICT.match(content):
+            # The strict mode of the file would apply to the whole bundle
+            return None
+
+        minifier = self.minifiers.get(kind)
+        if (minifier is None) or filename.endswith(('.min.' + kind, '-min.' + kind)):
+            # Already minified, or only concatenated
+            return content
+
+        return minifier(content)
+
+    def create(self, kind, urls):
+        """Create a bundle
+
+        In:
+          - ``kind`` -- ``css`` or ``js``
+          - ``urls`` -- URLs of the files to bundle
+
+        Return:
+          - the URL of the bundle (``None`` if the files can't be bundled)
+        """
+        filenames = [self.get_filename(url) for url in urls]
+        if None in filenames:
+            return None
+
+        contents = [self.read(kind, url, filename) for url, filename in zip(urls, filenames)]
+        if None in contents:
+            return None
+
+        content = self.separators[kind].join(contents)
+        name = hashlib.sha1(content).hexdigest()[:16] + '.' + kind
+
+        if not os.path.isfile(os.path.join(self.directory, name)):
+            self.write(name, content)
+
+        self.manifest[(kind, urls)] = (name, {filename: os.path.getmtime(filename) for filename in filenames})
+        self.save_manifest()
+
+        return self.url + name
+
+    def bundle(self, kind, urls):
+        """Return the bundle of a list of files
+
+        In:
+          - ``kind`` -- ``css`` or ``js``
+          - ``urls`` -- URLs of the files
+
+        Return:
+          - the URL of the bundle (``None`` if the files can't be bundled)
+        """
+        key = (kind, tuple(urls))
+
+        bundle = self.bundles.get(key, _marker)
+        if bundle is _marker:
+            with self.lock:
+                bundle = self.bundles.get(key, _marker)
+                if bundle is _marker:
+                    bundle = self.bundles[key] = self.create(*key)
+
+        return bundle
+
+    def rewrite(self, kind, entries):
+        """Replace the consecutive local static files by their bundle
+
+        The files with attributes are not bundled
+
+        In:
+          - ``kind`` -- ``css`` or ``js``
+          - ``entries`` -- list of tuples (URL, attributes)
+
+        Return:
+          - the new list of tuples (URL, attributes)
+        """
+        rewritten = []
+        group = []
+
+        for url, attributes in entries + [(None, None)]:
+            if (url is not None) and not attributes and self.is_local(url):
+                group.append(url)
+                continue
+
+            bundle = self.bundle(kind, group) if len(group) > 1 else None
+            rewritten.extend([(bundle, {})] if bundle else [(grouped_url, {}) for grouped_url in group])
+            group = []
+
+            if url is not None:
+                rewritten.append((url, attributes))
+
+        return rewritten
+
+
+def create(directory, url, static_path, static_url):
+    """Create the bundles of an application
+
+    The static contents of the application and of the framework can be bundled
+
+    In:
+      - ``directory`` -- directory where the bundles are written
+      - ``url`` -- URL prefix of the bundles
+      - ``static_path`` -- the directory of the static contents of the application (or ``None``)
+      - ``static_url`` -- the URL of the static contents of the application
+
+    Return:
+      - the ``Bundles`` object
+    """
+    nagare = pkg_resources.Requirement.parse('nagare')
+    static = [('/static/nagare/', os.path.join(pkg_resources.resource_filename(nagare, 'nagare'), 'static'))]
+
+    if static_path is not None:
+        static.append((static_url, static_path))
+
+    return Bundles(directory, url, static)
@@ -12,14 +12,47 @@ Manage the dictionary of the ids / callbacks associations
 """
 
 import random
+import contextlib
 
+from nagare import local
 from nagare.continuation import Continuation
 
+# The ids of the read-only callbacks start at this value
+READONLY_ID = 90000000
+
 
 class CallbackLookupError(LookupError):
     pass
 
 
+def readonly(f):
+    """Decorator to declare an action as read-only
+
+    A read-only action doesn't modify the objects graph, so the requests only
+    calling read-only actions can be processed concurrently in a session
+
+    In:
+      - ``f`` -- the action function or method
+
+    Return:
+      - ``f``
+    """
+    f.readonly = True
+    return f
+
+
+def is_readonly(f):
+    """Is an action declared as read-only?
+
+    In:
+      - ``f`` -- the action
+
+    Return:
+      - a boolean
+    """
+    return getattr(f, 'readonly', False)
+
+
 def register(model, priority, callback, with_request, render, callbacks):
     """Register a callback
 
@@ -45,14 +78,47 @@ def register(model, priority, callback, with_request, render, callbacks):
     Return:
       - the callback identifier
     """
-    id_ = random.randint(10000000, 99999999)
+    if is_readonly(callback):
+        id_ = random.randint(READONLY_ID, 99999999)
+    else:
+        id_ = random.randint(10000000, READONLY_ID - 1)
 
     # Remember the model, the action and the rendering function
     callbacks[id_] = (model, callback, with_request, render)
+    record(id_)
 
     return '_action%d%08d' % (priority, id_)
 
 
+def record(id_):
+    """Record a registered callback id into all the current recordings
+
+    In:
+      - ``id_`` -- the callback id
+    """
+    for ids in getattr(local.request, 'callbacks_recordings', ()):
+        ids.append(id_)
+
+
+@contextlib.contextmanager
+def recording():
+    """Context manager recording the ids of the callbacks registered during the request
+
+    The recordings can be nested
+
+    Return:
+      - the list of the recorded ids
+    """
+    ids = []
+
+    recordings = local.request.__dict__.setdefault('callbacks_recordings', [])
+    recordings.append(ids)
+    try:
+        yield ids
+    finally:
+        recordings.pop()
+
+
 def clean(old, new):
     """Keep the old callbacks registered by a view only if this view has not registered new callbacks
 
@@ -67,6 +133,45 @@ def clean(old, new):
     return {k: v for k, v in old.iteritems() if v[0] not in models}
 
 
+def get_ids(request):
+    """Return the callback identifiers received
+
+    In:
+      - ``request`` -- the web request object
+
+    Return:
+      - list of tuples (callback identifier, value)
+    """
+    ids = []
+
+    for name, value in request.params.items():
+        if isinstance(value, basestring) and value.startswith('_action'):
+            # For the radio buttons, the callback identifier is the value,
+            # not the name
+            name = value
+
+        if name and name.startswith('_action'):
+            ids.append((name, value))
+
+    return ids
+
+
+def is_readonly_request(request):
+    """Does a request only call read-only actions?
+
+    The read-only actions are only known by their identifiers, before the
+    objects graph is loaded. The identifiers are generated by the server so a
+    request can't call a not read-only action with a read-only identifier
+
+    In:
+      - ``request`` -- the web request object
+
+    Return:
+      - a boolean
+    """
+    return all(name[8:16].isdigit() and (int(name[8:16]) >= READONLY_ID) for name, _ in get_ids(request))
+
+
 def process(callbacks, request, response):
     """Call the actions associated to the callback identifiers received
 
@@ -84,20 +189,14 @@ def process(callbacks, request, response):
     actions = {}
 
     try:
-        for name, value in request.params.items():
-            if isinstance(value, basestring) and value.startswith('_action'):
-                # For the radio buttons, the callback identifier is the value,
-                # not the name
-                name = value
-
-            if name and name.startswith('_action'):
-                v = actions.get(name)
-                if v is not None:
-                    # Multiple values for the same callback are put into a tuple
-                    v = v[3]
-                    value = (v if isinstance(v, tuple) else (v,)) + (value,)
-
-                actions[name] = (int(name[7]), len(actions)), int(name[8:16]), name, value
+        for name, value in get_ids(request):
+            v = actions.get(name)
+            if v is not None:
+                # Multiple values for the same callback are put into a tuple
+                v = v[3]
+                value = (v if isinstance(v, tuple) else (v,)) + (value,)
+
+            actions[name] = (int(name[7]), len(actions)), int(name[8:16]), name, value
     except ValueError:
         raise CallbackLookupError(name[8:])
 
@@ -110,14 +110,14 @@ class Component(object):
 
         Forward the call to the generic method of the ``presentation`` service
         """
-        return presentation.render(self, renderer, self, model)
+        return presentation.cached_render(self, renderer, self, model)
 
     def init(self, url, http_method, request):
         """Initialisation from an url
 
         Forward the call to the generic method of the ``presentation`` service
         """
-        return presentation.init(self, url, self, http_method, request)
+        return presentation.cached_init(self, url, self, http_method, request)
 
     def _becomes(self, o, model, url):
         """Replace a component by an object or an other component
@@ -254,13 +254,28 @@ def render(self, renderer, comp, model):
       - the view of the component object
     """
     renderer = renderer.new()   # Create a new renderer of the same class than the current renderer
-    renderer.start_rendering(self, model)
 
-    if model == 0:
-        model = self.model
+    profile = renderer.profile
+    if profile is not None:
+        profile.start()
 
-    output = presentation.render(self(), renderer, self, model)
-    return renderer.end_rendering(output)
+    try:
+        renderer.start_rendering(self, model)
+
+        if model == 0:
+            model = self.model
+
+        output = presentation.cached_render(self(), renderer, self, model)
+        output = renderer.end_rendering(output)
+    except Exception:
+        if profile is not None:
+            profile.abort()
+        raise
+
+    if profile is not None:
+        profile.stop(self(), model, output)
+
+    return output
 
 
 @presentation.init_for(Component)
@@ -276,7 +291,7 @@ def init_for(self, url, comp, http_method, request):
     Return:
       - ``presentation.NOT_FOUND`` if the url is invalid, else ``None``
     """
-    presentation.init(self(), url, self, http_method, request)
+    presentation.cached_init(self(), url, self, http_method, request)
 
 
 # -----------------------------------------------------------------------------------------------------
@@ -0,0 +1,237 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""WSGI middleware compressing the responses
+
+The ``gzip`` or ``deflate`` encoding is negotiated with the ``Accept-Encoding``
+header of the request. Are not compressed:
+
+  - the responses smaller than a threshold
+  - the responses already encoded
+  - the already compressed content types (images, audios, videos, archives ...)
+
+The streamed responses are compressed chunk by chunk.
+
+The middleware is activated by the ``compression`` application parameter or,
+with the ``wsgi_pipe`` application parameter, by ``nagare.compression:create_pipe``
+"""
+
+import zlib
+
+# Content types not compressed
+COMPRESSED_TYPES = (
+    'image/', 'audio/', 'video/',
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/x-bzip2',
+    'application/x-7z-compressed', 'application/x-rar-compressed', 'application/pdf',
+    'application/octet-stream', 'font/woff'
+)
+
+# Compressed content types, even if declared above
+UNCOMPRESSED_TYPES = ('image/svg+xml', 'image/x-icon', 'image/bmp')
+
+# Window bits of the ``zlib`` compressor for each encoding
+ENCODINGS = (('gzip', 16 + zlib.MAX_WBITS), ('deflate', zlib.MAX_WBITS))
+
+
+def negotiate_encoding(accept_encoding):
+    """Choose the compression encoding accepted by the browser
+
+    In:
+      - ``accept_encoding`` -- value of the ``Accept-Encoding`` header
+
+    Return:
+      - tuple (name of the encoding, window bits of the ``zlib`` compressor)
+        (``None`` if no compression encoding is accepted)
+    """
+    qualities = {}
+    for encoding in accept_encoding.split(','):
+        encoding, _, params = encoding.strip().partition(';')
+
+        quality = 1.
+        for param in params.split(';'):
+            param, _, value = param.strip().partition('=')
+            if param.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.
+
+        qualities[encoding.strip().lower()] = quality
+
+    default_quality = qualities.get('*', 0.)
+
+    encodings = [(qualities.get(name, default_quality), -i, name, wbits) for i, (name, wbits) in enumerate(ENCODINGS)]
+    quality, _, name, wbits = max(encodings)
+
+    return (name, wbits) if quality > 0 else None
+
+
+def is_compressible(content_type):
+    """Is a content type to be compressed?
+
+    In:
+      - ``content_type`` -- value of the ``Content-Type`` header
+
+    Return:
+      - boolean
+    """
+    content_type = content_type.split(';')[0].strip().lower()
+
+    return content_type.startswith(UNCOMPRESSED_TYPES) or not content_type.startswith(COMPRESSED_TYPES)
+
+
+class CompressionMiddleware(object):
+    """WSGI middleware compressing the responses
+    """
+    def __init__(self, app, threshold=512, level=6):
+        """Initialization
+
+        In:
+          - ``app`` -- the wrapped WSGI application
+          - ``threshold`` -- the responses smaller than this size, in bytes, are not compressed
+          - ``level`` -- compression level, from 1 (fastest) to 9 (smallest)
+        """
+        self.app = app
+        self.threshold = threshold
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        """WSGI interface
+
+        In:
+          - ``environ`` -- dictionary of the received elements
+          - ``start_response`` -- callback to send the headers to the browser
+
+        Return:
+          - the content to send back to the browser
+        """
+        encoding = negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if (encoding is None) or (environ.get('REQUEST_METHOD') == 'HEAD'):
+            return self.app(environ, start_response)
+
+        response = []  # [status, headers, exc_info]
+        written = []   # Content sent through the legacy ``write()`` callable
+
+        def intercept_start_response(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.app(environ, intercept_start_response)
+
+        return self.compress(encoding, response, written, app_iter, start_response)
+
+    def compress(self, encoding, response, written, app_iter, start_response):
+        """Generate the compressed content
+
+        In:
+          - ``encoding`` -- tuple (name of the encoding, window bits of the ``zlib`` compressor)
+          - ``response`` -- [status, headers, exc_info] received from the application
+          - ``written`` -- content sent through the ``write()`` callable
+          - ``app_iter`` -- the content returned by the application
+          - ``start_response`` -- callback to send the headers to the browser
+
+        Return:
+          - generator of the chunks of content
+        """
+        try:
+            # The first chunks of a streamed content are buffered until the threshold
+            # is reached, the application must have called ``start_response()`` at that time
+            # Not a streamed content?
+            exhausted = isinstance(app_iter, (list, tuple))
+
+            chunks = iter(() if exhausted else app_iter)
+            buffered = written + list(app_iter) if exhausted else list(written)
+            size = sum(len(chunk) for chunk in buffered)
+
+            while size < self.threshold:
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    exhausted = True
+                    break
+
+                buffered.append(chunk)
+                size += len(chunk)
+
+            status, headers, exc_info = response
+            headers = list(headers)
+            header_names = {name.lower(): value for name, value in headers}
+
+            compressible = (size >= self.threshold) and (int(status.split()[0]) not in (204, 206, 304))
+            compressible &= header_names.get('content-encoding', 'identity').lower() == 'identity'
+            compressible &= is_compressible(header_names.get('content-type', ''))
+
+            if not compressible:
+                # The content is not compressed
+                start_response(status, headers, exc_info)
+
+                for chunk in buffered:
+                    yield chunk
+
+                for chunk in chunks:
+                    yield chunk
+
+                return
+
+            name, wbits = encoding
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+
+            headers = [(header, value) for header, value in headers if header.lower() not in ('content-length', 'content-encoding')]
+            headers.append(('Content-Encoding', name))
+
+            vary = header_names.get('vary')
+            if vary is None:
+                headers.append(('Vary', 'Accept-Encoding'))
+            elif 'accept-encoding' not in vary.lower():
+                headers = [(header, (value + ', Accept-Encoding') if header.lower() == 'vary' else value) for header, value in headers]
+
+            # A strong entity tag identifies an uncompressed content
+            headers = [(header, ('W/' + value) if (header.lower() == 'etag') and value.startswith('"') else value) for header, value in headers]
+
+            if exhausted:
+                # The whole content is compressed at once
+                body = compressor.compress(''.join(buffered)) + compressor.flush()
+                headers.append(('Content-Length', str(len(body))))
+
+                start_response(status, headers, exc_info)
+                yield body
+                return
+
+            # Streamed content: each chunk is compressed and flushed to the browser
+            start_response(status, headers, exc_info)
+
+            yield compressor.compress(''.join(buffered)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+            yield compressor.flush()
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+
+
+def create_pipe(app, options, config_filename, config, error):
+    """Wrap an application into the compression middleware
+
+    To be used as the ``wsgi_pipe`` application parameter
+
+    In:
+      - ``app`` -- the application
+      - ``options`` -- options in the command line
+      - ``config_filename`` -- the path to the configuration file
+      - ``config`` -- the ``ConfigObj`` object, created from the configuration file
+      - ``error`` -- the function to call in case of configuration errors
+
+    Return:
+      - the wsgi pipe
+    """
+    return CompressionMiddleware(app, config['application']['compress_threshold'], config['application']['compress_level'])
@@ -0,0 +1,290 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Per types caches of the generic methods
+
+The generic methods only dispatched on the types of their arguments, like
+``xml.add_child()``, ``xml.add_attribute()`` or ``serializer.serialize()``,
+are called for each child and each attribute of each tag.
+
+A ``TypesCache`` resolves, once for each tuple of concrete types of the
+arguments, the chain of methods ``peak.rules`` would call. The next calls
+with the same types are only a dictionary lookup.
+
+The cache is cleared each time a rule is added to the generic method, so the
+generic method can still be extended with ``peak.rules.when``. The generic
+method is directly called when the rules can't be resolved by types:
+
+  - rules with a condition, not only a tuple of classes
+  - ``around``, ``before`` or ``after`` rules
+  - ambiguous rules
+  - rules or changes of the rules that can't be read from ``peak.rules``
+"""
+
+import types
+import inspect
+import functools
+
+import peak.rules.core
+
+CLASS_TYPES = (type, types.ClassType)
+
+
+def get_signature(predicate):
+    """Convert a rule predicate to a tuple of classes tuples
+
+    In:
+      - ``predicate`` -- the predicate of the rule
+
+    Return:
+      - the signature (``None`` if the predicate is not only made of classes)
+    """
+    if not isinstance(predicate, tuple):
+        return None
+
+    signature = []
+    for classes in predicate:
+        classes = classes if isinstance(classes, tuple) else (classes,)
+        if not classes or not all(isinstance(cls, CLASS_TYPES) for cls in classes):
+            return None
+
+        signature.append(classes)
+
+    return tuple(signature)
+
+
+def subscribe(generic, listener):
+    """Notify a listener each time the rules of a generic method change
+
+    In:
+      - ``generic`` -- the generic method
+      - ``listener`` -- object with an ``actions_changed(added, removed)`` method
+
+    Return:
+      - boolean, ``False`` if the changes of the rules can't be observed
+    """
+    try:
+        peak.rules.core.rules_for(generic).subscribe(listener)
+    except Exception:
+        # Not the rules engine expected
+        return False
+
+    return True
+
+
+def get_rules(generic):
+    """Return the rules of a generic method
+
+    In:
+      - ``generic`` -- the generic method
+
+    Return:
+      - list of tuples (predicate, method, does the method receive the next method?)
+        (``None`` if a rule is not a simple method or if its shape is not recognized)
+    """
+    try:
+        rules = [(rule.predicate, rule.body, rule.actiontype) for rule in peak.rules.core.rules_for(generic)]
+        method_type = peak.rules.core.Method
+    except Exception:
+        # Not the rules engine expected
+        return None
+
+    methods = []
+    for predicate, body, actiontype in rules:
+        if actiontype not in (None, method_type):
+            return None
+
+        try:
+            args = inspect.getargspec(body)[0]
+        except TypeError:
+            return None
+
+        methods.append((predicate, body, args[:1] == ['next_method']))
+
+    return methods
+
+
+def is_subclass(cls, classes):
+    """``issubclass()`` where the old-style classes are subclasses of ``object``
+
+    In:
+      - ``cls`` -- a class
+      - ``classes`` -- tuple of classes
+
+    Return:
+      - boolean
+    """
+    return (object in classes) or issubclass(cls, classes)
+
+
+def implies(signature1, signature2):
+    """Is a signature more specific than an other one?
+
+    In:
+      - ``signature1``, ``signature2`` -- tuples of classes tuples
+
+    Return:
+      - boolean
+    """
+    return (len(signature1) >= len(signature2)) and all(
+        all(is_subclass(cls, classes2) for cls in classes1)
+        for classes1, classes2 in zip(signature1, signature2)
+    )
+
+
+class TypesCache(object):
+    """Generic method called through a per types cache of its methods chains
+    """
+    def __init__(self, generic):
+        """Initialization
+
+        In:
+          - ``generic`` -- the generic method
+        """
+        self.generic = generic
+        self.methods = {}  # Types of the arguments -> methods chain
+        self.rules = None
+
+        functools.update_wrapper(self, generic)
+
+        # Be notified when rules are added or removed
+        self.observed = subscribe(generic, self)
+
+    def actions_changed(self, added, removed):
+        """The rules of the generic method changed
+
+        In:
+          - ``added`` -- the new rules
+          - ``removed`` -- the removed rules
+        """
+        self.rules = None
+        self.methods.clear()
+
+    def get_key(self, args):
+        """Return the cache key of the arguments
+
+        In:
+          - ``args`` -- the arguments
+
+        Return:
+          - the types of the arguments
+        """
+        return tuple([getattr(arg, '__class__', type(arg)) for arg in args])
+
+    def parse_rule(self, predicate, method):
+        """Return the signature of a rule
+
+        In:
+          - ``predicate`` -- the predicate of the rule
+          - ``method`` -- the method of the rule
+
+        Return:
+          - the signature (``None`` if the rule can't be resolved by types)
+        """
+        return get_signature(predicate)
+
+    def matches(self, signature, key):
+        """Does a rule apply to the arguments?
+
+        In:
+          - ``signature`` -- signature of the rule
+          - ``key`` -- cache key of the arguments
+
+        Return:
+          - boolean
+        """
+        return (len(signature) <= len(key)) and all(is_subclass(cls, classes) for cls, classes in zip(key, signature))
+
+    def implies(self, signature1, signature2):
+        """Is a rule more specific than an other one?
+
+        In:
+          - ``signature1``, ``signature2`` -- signatures of the rules
+
+        Return:
+          - boolean
+        """
+        return implies(signature1, signature2)
+
+    def get_rules(self):
+        """Return the rules of the generic method
+
+        Return:
+          - list of tuples (signature, method, does the method receive the next method?)
+            (``None`` if the rules can't be resolved)
+        """
+        if not self.observed:
+            # The cache couldn't be cleared when the rules change
+            return None
+
+        if self.rules is None:
+            rules = get_rules(self.generic)
+
+            for i, (predicate, method, next_method) in enumerate(rules or ()):
+                signature = self.parse_rule(predicate, method)
+                if signature is None:
+                    rules = None
+                    break
+
+                rules[i] = (signature, method, next_method)
+
+            self.rules = rules
+
+        return self.rules
+
+    def resolve(self, key):
+        """Resolve the methods chain for arguments
+
+        In:
+          - ``key`` -- cache key of the arguments
+
+        Return:
+          - the methods chain (the generic method if it can't be resolved)
+        """
+        rules = self.get_rules()
+        if rules is None:
+            return self.generic
+
+        applicable = [rule for rule in rules if self.matches(rule[0], key)]
+
+        # Sort the rules, from the most specific to the most general
+        chain = []
+        while applicable:
+            for rule in applicable:
+                others = [other for other in applicable if other is not rule]
+                if all(self.implies(rule[0], other[0]) and not self.implies(other[0], rule[0]) for other in others):
+                    break
+            else:
+                # Ambiguous rules
+                return self.generic
+
+            chain.append(rule)
+            applicable = others
+
+        method = None
+        for _, body, next_method in reversed(chain):
+            if not next_method:
+                method = body
+            elif method is not None:
+                method = functools.partial(body, method)
+            else:
+                # No next method to call
+                return self.generic
+
+        return method or self.generic
+
+    def __call__(self, *args):
+        key = self.get_key(args)
+
+        try:
+            method = self.methods[key]
+        except KeyError:
+            method = self.methods[key] = self.resolve(key)
+
+        return method(*args)
@@ -0,0 +1,32 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Entity tags of the pages and of the static contents"""
+
+
+def etag_matches(etag, if_none_match):
+    """Is an entity tag listed into a ``If-None-Match`` header?
+
+    The weak comparison is used: the ``W/`` prefixes are ignored (the compression
+    middleware weakens the entity tags of the compressed pages)
+
+    In:
+      - ``etag`` -- the entity tag
+      - ``if_none_match`` -- value of the ``If-None-Match`` header
+
+    Return:
+      - a boolean
+    """
+    if if_none_match.strip() == '*':
+        return True
+
+    etag = etag[2:] if etag.startswith('W/') else etag
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+
+    return any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in tags)
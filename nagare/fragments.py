@@ -0,0 +1,348 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Views cached by an edge server, as fragments included with ESI tags
+
+A fragment view is declared with ``presentation.render_for(cls, model, fragment=ttl)``.
+When the ``esi`` application parameter is activated, the view is not rendered
+into the page but replaced by an ``<esi:include>`` tag. Its ``src`` is the
+session independent URL of the fragment:
+
+  ``<application url>/_fragment/<module>.<class>[:<model>]/<argument>/...``
+
+where the arguments, returned by the ``fragment_args`` function of the view,
+are given to the class to recreate the object ("404 Not Found" if they are not
+the arguments of the class or if they are rejected by it). The fragment responses can be
+cached ``ttl`` seconds by the edge server (``Cache-Control`` and
+``Surrogate-Control`` headers) and the pages with fragments are flagged by a
+``Surrogate-Control: content="ESI/1.0"`` header.
+
+A fragment view is rendered without session nor request parameters: it
+can't register actions and its ``<head>`` declarations are ignored.
+
+The ``ESIMiddleware`` processes the ``<esi:include>`` tags of the pages,
+without an edge server. It's activated by ``esi = local`` or, with the
+``wsgi_pipe`` application parameter, by ``nagare.fragments:create_pipe``
+"""
+
+import re
+import time
+import urllib
+import inspect
+import itertools
+
+from webob import exc
+
+from nagare import component
+from nagare.namespaces import esi
+from nagare.sessions.lru_dict import ThreadSafeLRUDict
+
+# Prefix of the fragments URLs, after the application URL
+URL_PREFIX = '/_fragment/'
+
+# ``Surrogate-Control`` header of the pages with fragments
+ESI_CONTENT = 'content="ESI/1.0"'
+
+# ``<esi:include>`` tags of a serialized page
+INCLUDE = re.compile(r'<esi:include\s[^>]*?src="([^"]*)"[^>]*?(?:/>|>\s*</esi:include>)')
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+# The registered fragment views: name -> (class, model, time to live)
+_fragments = {}
+
+
+def get_name(cls, model):
+    """Return the name of a fragment view
+
+    In:
+      - ``cls`` -- the class of the objects
+      - ``model`` -- the model of the view
+
+    Return:
+      - ``<module>.<class>`` for the default view, else ``<module>.<class>:<model>``
+    """
+    name = cls.__module__ + '.' + cls.__name__
+    return name if model is None else '%s:%s' % (name, model)
+
+
+def get_url(url, name, args):
+    """Return the URL of a fragment
+
+    In:
+      - ``url`` -- URL of the application
+      - ``name`` -- name of the fragment view
+      - ``args`` -- arguments to recreate the object
+
+    Return:
+      - the URL
+    """
+    # The arguments are in the path because a ``&`` is escaped into the ``src`` attribute.
+    # They are quoted twice because the path is unquoted by the server, before to be split
+    path = [name] + [urllib.quote(unicode(arg).encode('utf-8'), '') for arg in args]
+    return url + URL_PREFIX + '/'.join(urllib.quote(e, '') for e in path)
+
+
+def include(renderer, src):
+    """Generate an ``<esi:include>`` tag
+
+    In:
+      - ``renderer`` -- the current renderer
+      - ``src`` -- URL of the fragment
+
+    Return:
+      - the tag
+    """
+    h = esi.Renderer()
+    h.namespaces = {'esi': esi.NS}
+    h.default_namespace = 'esi'
+
+    if renderer.response is not None:
+        renderer.response.headers['Surrogate-Control'] = ESI_CONTENT
+
+    return h.include(src=src)
+
+
+def fragment_view(view, cls, model, ttl, fragment_args=None):
+    """Register a fragment view
+
+    In:
+      - ``view`` -- the view
+      - ``cls`` -- the class of the objects
+      - ``model`` -- the model of the view
+      - ``ttl`` -- time, in seconds, the fragment can be cached
+      - ``fragment_args`` -- function receiving the object and returning the
+        arguments to recreate it (``None``: no arguments)
+
+    Return:
+      - the view, rendering an ``<esi:include>`` tag when the fragments are activated
+    """
+    name = get_name(cls, model)
+    _fragments[name] = (cls, model, ttl)
+
+    def render(self, renderer, comp, model):
+        url = getattr(renderer, 'fragments_url', None)
+        if url is None:
+            return view(self, renderer, comp, model)
+
+        return include(renderer, get_url(url, name, fragment_args(self) if fragment_args else ()))
+
+    return render
+
+
+def accepts(cls, nb_args):
+    """Can a class be instantiated with a number of positional arguments?
+
+    In:
+      - ``cls`` -- the class
+      - ``nb_args`` -- number of arguments
+
+    Return:
+      - a boolean (``True`` if the signature of the class can't be inspected)
+    """
+    try:
+        args, varargs, _, defaults = inspect.getargspec(cls.__init__)
+    except (AttributeError, TypeError):
+        return True
+
+    nb_max = len(args) - 1  # Without ``self``
+    return (nb_max - len(defaults or ())) <= nb_args and (varargs is not None or nb_args <= nb_max)
+
+
+def is_fragment_url(path_info):
+    """Is a path the path of a fragment?
+
+    In:
+      - ``path_info`` -- the path, after the application URL
+
+    Return:
+      - a boolean
+    """
+    return path_info.startswith(URL_PREFIX)
+
+
+def render_fragment(path_info, renderer):
+    """Render a fragment
+
+    In:
+      - ``path_info`` -- path of the fragment, after the application URL (not decoded)
+      - ``renderer`` -- the renderer, not attached to a session
+
+    Return:
+      - tuple (time, in seconds, the fragment can be cached, rendered tree)
+    """
+    path = [urllib.unquote(e).decode('utf-8') for e in path_info[len(URL_PREFIX):].split('/')]
+
+    fragment = _fragments.get(path[0])
+    if fragment is None:
+        raise exc.HTTPNotFound()
+
+    cls, model, ttl = fragment
+
+    args = path[1:]
+    if not accepts(cls, len(args)):
+        raise exc.HTTPNotFound()
+
+    try:
+        o = cls(*args)
+    except (TypeError, ValueError, LookupError):
+        # Arguments not valid to recreate the object
+        raise exc.HTTPNotFound()
+
+    return ttl, component.Component(o).render(renderer, model)
+
+
+def set_cache_headers(response, ttl):
+    """Set the caching headers of a fragment response
+
+    In:
+      - ``response`` -- the response
+      - ``ttl`` -- time, in seconds, the fragment can be cached
+    """
+    response.headers['Cache-Control'] = 'public, max-age=%d' % ttl
+    response.headers['Surrogate-Control'] = 'max-age=%d' % ttl
+
+# ---------------------------------------------------------------------------
+
+
+class ESIMiddleware(object):
+    """WSGI middleware processing the ``<esi:include>`` tags of the pages
+
+    Only the fragments of the wrapped application are included. They are kept
+    into a local cache during their time to live
+    """
+    def __init__(self, app, max_fragments=1000):
+        """Initialization
+
+        In:
+          - ``app`` -- the wrapped WSGI application
+          - ``max_fragments`` -- maximum number of fragments kept in memory
+        """
+        self.app = app
+        self.fragments = ThreadSafeLRUDict(max_fragments)  # URL -> (expiration time, content)
+
+    def fetch(self, environ, src):
+        """Return the content of a fragment
+
+        In:
+          - ``environ`` -- the environment of the page request
+          - ``src`` -- URL of the fragment
+
+        Return:
+          - the content (``''`` if the fragment is not found)
+        """
+        src = src.replace('&amp;', '&')
+
+        expiration, content = self.fragments.peek(src, (0, None))
+        if expiration > time.time():
+            return content
+
+        script_name = environ.get('SCRIPT_NAME', '')
+        if not src.startswith(script_name + URL_PREFIX):
+            return ''
+
+        path_info = urllib.unquote(src[len(script_name):])
+
+        # The fragments are session independent: no cookies nor conditional headers
+        fragment_environ = {
+            name: value for name, value in environ.items()
+            if name.startswith(('wsgi.', 'SERVER_')) or (name in ('SCRIPT_NAME', 'HTTP_HOST', 'HTTP_ACCEPT', 'HTTP_ACCEPT_LANGUAGE'))
+        }
+        fragment_environ.update(REQUEST_METHOD='GET', PATH_INFO=path_info, QUERY_STRING='', CONTENT_LENGTH='0')
+
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+            return lambda data: None
+
+        app_iter = self.app(fragment_environ, start_response)
+        try:
+            content = ''.join(app_iter)
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+
+        status, headers = response
+        if not status.startswith('200'):
+            return ''
+
+        headers = {name.lower(): value for name, value in headers}
+        max_age = MAX_AGE.search(headers.get('surrogate-control') or headers.get('cache-control') or '')
+        if max_age is not None:
+            self.fragments[src] = (time.time() + int(max_age.group(1)), content)
+
+        return content
+
+    def __call__(self, environ, start_response):
+        """WSGI interface
+
+        In:
+          - ``environ`` -- dictionary of the received elements
+          - ``start_response`` -- callback to send the headers to the browser
+
+        Return:
+          - the content to send back to the browser
+        """
+        response = []  # [status, headers, exc_info]
+        written = []   # Content sent through the legacy ``write()`` callable
+
+        def intercept_start_response(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.app(environ, intercept_start_response)
+        try:
+            chunks = iter(app_iter)
+
+            # An application can start its response only when its first chunk is produced
+            first = list(itertools.islice(chunks, 1))
+
+            status, headers, exc_info = response
+            if not any((name.lower() == 'surrogate-control') and ('ESI/1.0' in value) for name, value in headers):
+                start_response(status, headers, exc_info)
+
+                for chunk in itertools.chain(written, first, chunks):
+                    yield chunk
+
+                return
+
+            content = ''.join(itertools.chain(written, first, chunks))
+        finally:
+            close = getattr(app_iter, 'close', None)
+            if close is not None:
+                close()
+
+        content = INCLUDE.sub(lambda include: self.fetch(environ, include.group(1)), content)
+
+        # The entity tag of the page doesn't identify the included fragments
+        headers = [
+            (name, value) for name, value in headers
+            if name.lower() not in ('surrogate-control', 'content-length', 'etag')
+        ]
+        headers.append(('Content-Length', str(len(content))))
+
+        start_response(status, headers, exc_info)
+        yield content
+
+
+def create_pipe(app, options, config_filename, config, error):
+    """Wrap an application into the ESI middleware
+
+    In:
+      - ``app`` -- the application
+      - ``options`` -- options in the command line
+      - ``config_filename`` -- the path to the configuration file
+      - ``config`` -- the ``ConfigObj`` object, created from the configuration file
+      - ``error`` -- the function to call in case of configuration errors
+
+    Return:
+      - the wsgi pipe
+    """
+    return ESIMiddleware(app)
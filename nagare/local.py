@@ -15,6 +15,7 @@ Currently:
   - objects scoped to a request (i.e a scoped cleared on each new request)
 """
 
+import time
 import threading
 
 
@@ -24,12 +25,126 @@ class Thread(threading.local):
     def clear(self):
         self.__dict__.clear()
 
-    def create_lock(self):
-        return threading.Lock()
+    def create_lock(self, max_wait_time=0, max_waiters=0):
+        return RWLock(max_wait_time, max_waiters)
+
+
+class RWLock(object):
+    """Readers / writer lock
+
+    Several readers can share the lock but a writer has an exclusive access.
+    The waiting writers have the priority over the new readers
+    """
+    def __init__(self, max_wait_time=0, max_waiters=0):
+        """Initialization
+
+        In:
+          - ``max_wait_time`` -- maximum time to wait to acquire the lock, in seconds (0 = no limit)
+          - ``max_waiters`` -- maximum number of threads waiting for the lock (0 = no limit)
+        """
+        self.max_wait_time = max_wait_time
+        self.max_waiters = max_waiters
+
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0  # Number of readers sharing the lock
+        self.writer = False  # Is the lock exclusively acquired?
+        self.waiting_readers = 0
+        self.waiting_writers = 0
+
+    def _wait(self, is_busy, max_wait_time=None):
+        """Wait until the lock is free
+
+        In:
+          - ``is_busy`` -- function returning ``True`` while the lock can't be acquired
+          - ``max_wait_time`` -- maximum time to wait, in seconds (``None``: the one of the lock)
+
+        Return:
+          - is the lock free?
+        """
+        if not is_busy():
+            return True
+
+        # This thread is already counted into the waiting ones
+        if self.max_waiters and (self.waiting_readers + self.waiting_writers > self.max_waiters):
+            return False
+
+        if max_wait_time is None:
+            max_wait_time = self.max_wait_time
+
+        if not max_wait_time:
+            while is_busy():
+                self.condition.wait()
+
+            return True
+
+        end = time.time() + max_wait_time
+        while is_busy():
+            remaining = end - time.time()
+            if remaining <= 0:
+                return False
+
+            self.condition.wait(remaining)
+
+        return True
+
+    def acquire(self):
+        """Acquire the lock for an exclusive access
+
+        Return:
+          - was the lock acquired?
+        """
+        with self.condition:
+            self.waiting_writers += 1
+            try:
+                acquired = self._wait(lambda: self.writer or self.readers)
+            finally:
+                self.waiting_writers -= 1
+
+            if acquired:
+                self.writer = True
+            else:
+                # The readers blocked by this writer can go on
+                self.condition.notify_all()
+
+            return acquired
+
+    def release(self):
+        """Release the exclusive access"""
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    def acquire_shared(self, max_wait_time=None):
+        """Acquire the lock for a shared access
+
+        In:
+          - ``max_wait_time`` -- maximum time to wait, in seconds (``None``: the one of the lock)
+
+        Return:
+          - was the lock acquired?
+        """
+        with self.condition:
+            self.waiting_readers += 1
+            try:
+                acquired = self._wait(lambda: self.writer or self.waiting_writers, max_wait_time)
+            finally:
+                self.waiting_readers -= 1
+
+            if acquired:
+                self.readers += 1
+
+            return acquired
+
+    def release_shared(self):
+        """Release a shared access"""
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
 
 
 class DummyLock(object):
-    acquire = release = lambda self: None
+    acquire = release = acquire_shared = release_shared = lambda self, *args: None
 
 
 class Process(object):
@@ -38,7 +153,7 @@ class Process(object):
     def clear(self):
         self.__dict__.clear()
 
-    def create_lock(self):
+    def create_lock(self, max_wait_time=0, max_waiters=0):
         return DummyLock()
 
 
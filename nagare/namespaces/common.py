@@ -13,6 +13,8 @@ import random
 
 
 class Renderer(object):
+    profile = None  # The ``nagare.profiler.Profile`` object of the rendering, if profiled
+
     def new(self):
         """Create a new renderer from the same type of this renderer
         """
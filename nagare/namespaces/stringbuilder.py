@@ -0,0 +1,487 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""HTML renderer building the views as lists of strings
+
+The plain tags (``<div>``, ``<tr>``, ``<td>`` ...) are light Python objects,
+directly serialized into HTML. The tags with a special behavior (``<a>``,
+``<form>``, ``<input>``, ``<script>`` ...) are still ``lxml`` elements.
+
+A light tag is converted into a ``lxml`` element, with all the tree it belongs
+to, as soon as a not light method (``xpath()``, ``findmeld()``, ``replace()`` ...)
+is called on it. So the views keep the same API.
+
+Usage:
+
+.. code-block:: python
+
+    class App(wsgi.WSGIApp):
+        renderer_factory = stringbuilder.Renderer
+"""
+
+import cgi
+import types
+
+import peak.rules
+from lxml import etree as ET
+
+from nagare import serializer
+from nagare.namespaces import xml, xhtml_base, xhtml5
+
+# HTML tags without end tag
+VOID_TAGS = frozenset((
+    'area', 'base', 'basefont', 'br', 'col', 'embed', 'frame',
+    'hr', 'img', 'input', 'isindex', 'link', 'meta', 'param'
+))
+
+# HTML attributes generated without value
+BOOLEAN_ATTRIBUTES = frozenset((
+    'checked', 'compact', 'declare', 'defer', 'disabled', 'ismap', 'multiple',
+    'nohref', 'noresize', 'noshade', 'nowrap', 'readonly', 'selected'
+))
+
+
+def escape_text(text):
+    if isinstance(text, str):
+        text = text.decode('utf-8')
+
+    return cgi.escape(text)
+
+
+def escape_attribute(value):
+    if isinstance(value, str):
+        value = value.decode('utf-8')
+
+    return cgi.escape(value, True)
+
+
+class Tag(object):
+    """A light HTML tag
+    """
+    __slots__ = ('tag', '_renderer', '_attrib', '_children', '_parent', '_element', '_authorized_attribs')
+
+    def __init__(self, renderer, tag):
+        """Initialization
+
+        In:
+          - ``renderer`` -- the renderer that created this tag
+          - ``tag`` -- name of the tag
+        """
+        self.tag = tag
+        self._renderer = renderer
+        self._attrib = []  # ``[name, value]`` pairs, in order
+        self._children = []  # Strings, light tags and ``lxml`` elements
+        self._parent = None
+        self._element = None  # The ``lxml`` element, once this tag is materialized
+        self._authorized_attribs = None
+
+    def __repr__(self):
+        return '<Tag %s at 0x%x>' % (self.tag, id(self))
+
+    # Conversion to a ``lxml`` element
+    # --------------------------------
+
+    def _build(self):
+        """Create the ``lxml`` tree of this tag
+
+        Return:
+          - the ``lxml`` element
+        """
+        element = self._renderer.makelxmlelement(self.tag)
+
+        for name, value in self._attrib:
+            element.set(name, value)
+
+        for child in self._children:
+            if isinstance(child, basestring):
+                element.append_text(child)
+            else:
+                if isinstance(child, Tag):
+                    child = child._element if child._element is not None else child._build()
+
+                element.append(child)
+
+        self._element = element
+        self._attrib = self._children = None
+
+        return element
+
+    def materialize(self):
+        """Return the ``lxml`` element of this tag
+
+        The whole tree this tag belongs to is converted into ``lxml`` elements
+        on the first call
+
+        Return:
+          - the ``lxml`` element
+        """
+        if self._element is None:
+            if self._parent is not None:
+                self._parent.materialize()
+            else:
+                self._build()
+
+        return self._element
+
+    def detach(self):
+        """Remove this tag from its parent
+        """
+        parent = self._parent
+        if parent is not None:
+            if parent._element is None:
+                parent._children.remove(self)
+
+            self._parent = None
+
+    # Any not light method is forwarded to the ``lxml`` element
+    # --------------------------------------------------------
+
+    def __getattr__(self, name):
+        return getattr(self.materialize(), name)
+
+    def __setattr__(self, name, value):
+        if name in Tag.__slots__:
+            super(Tag, self).__setattr__(name, value)
+        else:
+            setattr(self.materialize(), name, value)
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __getitem__(self, i):
+        return self.materialize()[i]
+
+    def __setitem__(self, i, value):
+        self.materialize()[i] = value
+
+    def __delitem__(self, i):
+        del self.materialize()[i]
+
+    def __contains__(self, element):
+        return element in self.materialize()
+
+    # Light methods
+    # -------------
+
+    @property
+    def renderer(self):
+        return self._renderer
+
+    def init(self, renderer):
+        self._renderer = renderer
+        return self
+
+    def get(self, name, default=None):
+        if self._element is not None:
+            return self._element.get(name, default)
+
+        for attrib in self._attrib:
+            if attrib[0] == name:
+                return attrib[1]
+
+        return default
+
+    def set(self, name, value):
+        if self._element is not None:
+            self._element.set(name, value)
+            return
+
+        for attrib in self._attrib:
+            if attrib[0] == name:
+                attrib[1] = value
+                break
+        else:
+            self._attrib.append([name, value])
+
+    def add_attribute(self, name, value):
+        """Add an attribute to this tag
+
+        In:
+          - ``name`` -- name of the attribute
+          - ``value`` -- value of the attribute
+        """
+        if (self._element is None) and ('{' not in name):
+            if isinstance(value, (int, long, float)):
+                value = unicode(value)
+
+            if isinstance(value, basestring):
+                if name.startswith('data_'):
+                    name = name.replace('_', '-')
+
+                if name.endswith('_'):
+                    name = name[:-1]
+
+                self.set(name, value)
+                return
+
+        # Namespaced attributes and actions are set on the ``lxml`` element
+        xml.add_attribute(self.materialize(), name, value)
+
+    def append_text(self, text):
+        if self._element is not None:
+            self._element.append_text(text)
+        else:
+            self._children.append(text)
+
+    def add_child(self, child):
+        """Append a child to this tag
+
+        In:
+          - ``child`` -- child to add
+        """
+        if self._element is not None:
+            self._element.add_child(child)
+        elif isinstance(child, basestring):
+            self._children.append(child)
+        elif isinstance(child, Tag):
+            child.detach()
+            child._parent = self
+            self._children.append(child)
+        elif isinstance(child, (list, tuple, types.GeneratorType)):
+            for e in child:
+                self.add_child(e)
+        elif isinstance(child, (int, long, float)):
+            self._children.append(str(child))
+        elif isinstance(child, dict):
+            for name, value in child.iteritems():
+                self.add_attribute(name, value)
+        elif isinstance(child, ET._Element):
+            self._children.append(child.decorate_error() if isinstance(child, xhtml_base._HTMLTag) else child)
+        elif hasattr(child, 'render'):
+            # Components
+            self.add_child(child.render(self._renderer))
+        else:
+            # Lazy translations ... are added to the ``lxml`` element
+            xml.add_child(self.materialize(), child)
+
+    def __call__(self, *children, **attrib):
+        """Append child and attributes to this tag
+
+        In:
+          - ``children`` -- children to add
+          - ``attrib`` -- attributes to add
+
+        Return:
+          - ``self``
+        """
+        if attrib:
+            self.add_child(attrib)
+
+        for child in children:
+            self.add_child(child)
+
+        return self
+
+    def fill(self, *children, **attrib):
+        """Change all the child and append attributes of this tag
+
+        In:
+          - ``children`` -- list of the new children of this tag
+          - ``attrib`` -- dictionnary of attributes of this tag
+
+        Return:
+          - ``self``
+        """
+        if self._element is not None:
+            self._element.fill(*children, **attrib)
+            return self
+
+        for child in self._children:
+            if isinstance(child, Tag):
+                child._parent = None
+
+        self._children = []
+
+        return self(*children, **attrib)
+
+    def __enter__(self):
+        return self._renderer.enter(self)
+
+    def __exit__(self, exception, data, tb):
+        if exception is None:
+            self._renderer.exit()
+
+    def error(self, err):
+        """Mark this tag as erroneous
+
+        In:
+          - ``err`` -- the error message
+
+        Return:
+          - ``self``
+        """
+        if err is not None:
+            self.materialize().error(err)
+
+        return self
+
+    def decorate_error(self):
+        return self if self._element is None else self._element.decorate_error()
+
+    # Serialization
+    # -------------
+
+    def write(self, append):
+        """Serialize this tag
+
+        In:
+          - ``append`` -- function called with each unicode chunk of HTML
+        """
+        if self._element is not None:
+            append(ET.tostring(self._element.decorate_error(), encoding=unicode, method='html'))
+            return
+
+        tag = self.tag
+        append(u'<' + tag)
+
+        for name, value in self._attrib:
+            if name in BOOLEAN_ATTRIBUTES:
+                append(u' ' + name)
+            else:
+                append(u' %s="%s"' % (name, escape_attribute(value)))
+
+        append(u'>')
+
+        if tag in VOID_TAGS:
+            return
+
+        for child in self._children:
+            if isinstance(child, Tag):
+                child.write(append)
+            elif isinstance(child, basestring):
+                append(escape_text(child))
+            else:
+                append(ET.tostring(child, encoding=unicode, method='html'))
+
+        append(u'</%s>' % tag)
+
+    def write_htmlstring(self, encoding='utf-8', pipeline=True, doctype=None, **kw):
+        """Serialize in HTML the tree beginning at this tag
+
+        In:
+          - ``encoding`` -- encoding of the HTML
+          - ``pipeline`` -- if False, the ``meld:id`` attributes are deleted
+          - ``doctype`` -- the (optional) doctype
+
+        Return:
+          - the HTML
+        """
+        if self._element is not None:
+            return self._element.write_htmlstring(encoding, pipeline, doctype=doctype, **kw)
+
+        chunks = [doctype + u'\n'] if doctype else []
+        self.write(chunks.append)
+
+        html = u''.join(chunks)
+        return html if encoding is unicode else html.encode(encoding)
+
+
+@peak.rules.when(xml.add_child, (Tag, object))
+def add_child_to_tag(self, child):
+    """Add an object to a light tag
+
+    In:
+      - ``self`` -- the light tag
+      - ``child`` -- object to add
+    """
+    self.add_child(child)
+
+
+@peak.rules.when(xml.add_child, (xml._Tag, Tag))
+def add_tag(self, tag):
+    """Add a light tag to a ``lxml`` element
+
+    In:
+      - ``self`` -- the ``lxml`` element
+      - ``tag`` -- the light tag to add
+    """
+    tag.detach()
+    xml.add_child(self, tag.materialize())
+
+
+@peak.rules.when(xml.add_attribute, (Tag, basestring, object))
+def add_attribute(self, name, value):
+    self.add_attribute(name, value)
+
+
+@peak.rules.when(serializer.serialize, (Tag,))
+def serialize(output, content_type, doctype, declaration):
+    """Generic method to generate a HTML text from a light tree
+
+    In:
+      - ``output`` -- the rendered content
+      - ``content_type`` -- the rendered content type
+      - ``doctype`` -- the (optional) doctype
+      - ``declaration`` -- is the XML declaration to be outputed?
+
+    Return:
+      - a tuple (content_type, content)
+    """
+    if (output._element is not None) or (content_type != 'text/html'):
+        return serializer.serialize(output.materialize(), content_type, doctype, declaration)
+
+    return content_type, output.write_htmlstring(doctype=doctype if declaration else None) + '\n'
+
+
+class StringBuilderRenderer(object):
+    """Mixin creating light tags for all the plain HTML tags
+    """
+    def makelxmlelement(self, tag):
+        """Make a ``lxml`` element
+
+        In:
+          - ``tag`` -- name of the tag to create
+
+        Return:
+          - the new element
+        """
+        return super(StringBuilderRenderer, self).makeelement(tag)
+
+    def makeelement(self, tag):
+        """Make a tag
+
+        In:
+          - ``tag`` -- name of the tag to create
+
+        Return:
+          - a light tag for a plain HTML tag, else a ``lxml`` element
+        """
+        if self._prefix or self.namespaces or (tag in self._specialTags):
+            return self.makelxmlelement(tag)
+
+        return Tag(self, tag)
+
+    @property
+    def root(self):
+        """Return the first tag(s) sent to the renderer
+
+        .. warning::
+            A list of tags can be returned
+
+        Return:
+          - the tag(s)
+        """
+        root = self._stack[0]
+        if root._element is not None:
+            return super(StringBuilderRenderer, self).root
+
+        children = root._children
+        if not children:
+            return ''
+
+        return children[0] if len(children) == 1 else children[:]
+
+
+class Renderer(StringBuilderRenderer, xhtml5.Renderer):
+    """The HTML5 renderer building the views as lists of strings
+    """
+    pass
@@ -0,0 +1,103 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+from paste import fixture
+
+from nagare.namespaces import xhtml5, stringbuilder
+from nagare import component, presentation, wsgi, local
+from nagare.sessions.memory_sessions import SessionsWithPickledStates
+
+
+def render(h):
+    with h.div(class_='list'):
+        h << h.p('a & b') << h.br << 'text'
+
+        with h.table:
+            for i in range(3):
+                with h.tr:
+                    h << h.td(i, data_id=i, title='%d & %d' % (i, i))
+
+        h << h.a('link', href='/x')
+        h << h.input(type='checkbox', checked=True)
+
+    return h.root
+
+
+def test_render1():
+    """ String builder renderer - Same HTML as the lxml renderer """
+    h = stringbuilder.Renderer()
+    root = render(h)
+
+    assert isinstance(root, stringbuilder.Tag)
+    assert root.write_htmlstring() == render(xhtml5.Renderer()).write_htmlstring()
+
+
+def test_render2():
+    """ String builder renderer - Special tags are lxml elements """
+    h = stringbuilder.Renderer()
+
+    assert isinstance(h.div, stringbuilder.Tag)
+    assert not isinstance(h.a, stringbuilder.Tag)
+    assert not isinstance(h.form, stringbuilder.Tag)
+
+
+def test_render3():
+    """ String builder renderer - Not light methods convert the whole tree """
+    h = stringbuilder.Renderer()
+    root = render(h)
+
+    tds = root.xpath('.//td')
+    assert [td.text for td in tds] == ['0', '1', '2']
+
+    tds[1].text = 'one'
+    assert '>one</td>' in root.write_htmlstring()
+
+
+def test_render4():
+    """ String builder renderer - Light tag added to a lxml element """
+    h = stringbuilder.Renderer()
+    a = h.a(h.span('hello'), href='/x')
+
+    assert a.write_htmlstring() == '<a href="/x"><span>hello</span></a>'
+
+
+class Hello(object):
+    pass
+
+
+@presentation.render_for(Hello)
+def render_hello(self, h, *args):
+    with h.ul:
+        h << h.li('hello') << h.li('world')
+
+    return h.root
+
+
+class App(object):
+    def __init__(self):
+        self.hello = component.Component(Hello())
+
+
+@presentation.render_for(App)
+def render_app(self, h, *args):
+    return h.div(self.hello)
+
+
+def test_app1():
+    """ String builder renderer - Rendering of an application """
+    local.worker = local.Process()
+    local.request = local.Process()
+
+    app = wsgi.create_WSGIApp(App)
+    app.renderer_factory = stringbuilder.Renderer
+    app.set_sessions_manager(SessionsWithPickledStates())
+    app.start()
+
+    res = fixture.TestApp(app).get('/')
+    assert '<div><ul><li>hello</li><li>world</li></ul></div>' in res.body
@@ -285,6 +285,23 @@ def test_html_render_parse_html1():
         assert True
 
 
+def test_html_render_parse_html_template():
+    """ XHTML namespace unit test - HTMLRender - parse_html - template parsed once and copied """
+    filename = os.path.join(os.path.dirname(__file__), 'helloworld.html')
+
+    h = xhtml.Renderer()
+    root1 = h.parse_html(filename)
+    root2 = h.parse_html(filename)
+    assert root1 is not root2
+    assert root1.write_htmlstring() == root2.write_htmlstring()
+    assert root2.renderer is h
+
+    root1.text = 'modified'
+    assert h.parse_html(filename).write_htmlstring() == root2.write_htmlstring()
+
+    xml.clear_templates()
+
+
 if 0:
     def test_html_render_parse_html2():
         """ XHTML namespace unit test - HTMLRender - parse_html - bad encoding """
@@ -1082,3 +1099,44 @@ def test_global2():
     html = h.html([h.body([helloWorld, totoDiv, yeah012, table], {'onload': 'javascript:alert()'})])
 
     assert c14n(html) == xml_test1_out
+
+
+def test_child_renderers():
+    """ XHTML namespace unit test - the child renderers are copies of their parent """
+    h = xhtml.AsyncRenderer(xhtml.Renderer(session='session', url='/app'))
+    h.start_rendering(component.Component(None), None)
+
+    child = h.new()
+    assert (child.__class__ is xhtml.AsyncRenderer) and (child.parent is h)
+    assert (child.session == 'session') and (child.url == '/app') and (child.head is h.head)
+    assert child.async_root and not child.wrapper_to_generate
+
+    # The tags stack and the id are created on demand
+    assert ('_stack' not in child.__dict__) and ('id' not in child.__dict__)
+    assert child.root == ''
+
+    child << child.div('hello')
+    assert child.root.text == 'hello'
+    assert (child.id == child.id) and (child.id != h.new().id)
+
+    class Renderer(xhtml.Renderer):
+        def __init__(self, parent=None):
+            super(Renderer, self).__init__(parent)
+            self.children = []
+
+    # Renderers with a ``__init__()`` but no ``light_children`` flag are still initialized
+    h = Renderer()
+    assert not h.has_light_children() and (h.new().children is not h.children)
+
+    class LightRenderer(Renderer):
+        light_children = True
+
+        def __init__(self, parent=None):
+            super(LightRenderer, self).__init__(parent)
+
+    assert not LightRenderer.has_light_children()
+
+    # The attributes set on a renderer are inherited by its children
+    h = xhtml.Renderer()
+    h.theme = 'dark'
+    assert xhtml.Renderer.has_light_children() and (h.new().theme == 'dark')
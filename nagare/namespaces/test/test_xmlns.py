@@ -9,10 +9,14 @@
 
 import csv
 import os
+import tempfile
 from types import ListType
 
+import peak.rules
+import peak.rules.core
 from lxml import etree as ET
 
+from nagare import dispatch
 from nagare.namespaces import xml
 
 
@@ -547,6 +551,40 @@ def test_findmeld3():
     assert child == 'test'
 
 
+def test_findmeld4():
+    """ XML namespace unit test - find_meld - indexed template """
+    filename = os.path.join(tempfile.mkdtemp(), 'template.xml')
+    with open(filename, 'w') as f:
+        f.write('<node xmlns:meld="http://www.plope.com/software/meld3"><a meld:id="a"/><b><c meld:id="c"/></b><d meld:id="c"/></node>')
+
+    x = xml.Renderer()
+    node = x.parse_xml(filename)
+    assert node._meld_index == {'a': [0], 'c': [1, 0]}
+    assert node.findmeld('c').getparent().tag == 'b'
+    assert node.findmeld('c').renderer is x
+
+    # The index is only a hint, checked against the modified tree
+    node.remove(node[0])
+    assert node.findmeld('a') is None
+    assert node.findmeld('c').getparent().tag == 'b'
+
+    node.insert(0, x.parse_xmlstring('<e xmlns:meld="http://www.plope.com/software/meld3" meld:id="e"/>'))
+    assert node.findmeld('e').tag == 'e'
+
+    xml.clear_templates()
+    os.remove(filename)
+
+
+def test_findmeld5():
+    """ XML namespace unit test - find_meld - indexed clones """
+    x = xml.Renderer()
+    node = x.parse_xmlstring('<node xmlns:meld="http://www.plope.com/software/meld3"><li meld:id="entry"><span/><span meld:id="count"/></li></node>')
+
+    clones = [clone for (clone, i) in node.repeat(range(2), 'entry')]
+    assert clones[0]._meld_index is clones[1]._meld_index
+    assert [clone.findmeld('count') for clone in clones] == [clone[1] for clone in clones]
+
+
 # Test for XML namespace
 
 xml_test2_in = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
@@ -769,3 +807,71 @@ def test_global8():
     assert [elt.text for elt in x.root.xpath('.//td')] == ['Girls', 'Pretty', 'Boys', 'Ugly']
     assert x.root[0][1].text == 'My document'
     assert x.root.xpath('.//form')[0].attrib['action'] == './handler'
+
+
+class Temperature(object):
+    def __init__(self, degrees):
+        self.degrees = degrees
+
+
+class Point(tuple):
+    pass
+
+
+def test_add_child_rule():
+    """ XML namespace unit test - add_child - Rules registered after the first dispatch of a type are used """
+    x = xml.Renderer()
+
+    assert x.node(Point((1, 2))).write_xmlstring() == '<node>12</node>'
+
+    @peak.rules.when(xml.add_child, (xml._Tag, Point))
+    def add_child(next_method, self, point):
+        next_method(self, ','.join(map(str, point)))
+
+    assert x.node(Point((1, 2))).write_xmlstring() == '<node>1,2</node>'
+    assert x.node((1, 2)).write_xmlstring() == '<node>12</node>'
+
+
+def test_add_attribute_rule():
+    """ XML namespace unit test - add_attribute - Rules registered after the first dispatch of a type are used """
+    x = xml.Renderer()
+
+    assert x.node(value=Temperature(20)).get('value').startswith('<')
+
+    @peak.rules.when(xml.add_attribute, (xml._Tag, basestring, Temperature))
+    def add_attribute(self, name, value):
+        self.set(name, '%d C' % value.degrees)
+
+    assert x.node(value=Temperature(20)).write_xmlstring() == '<node value="20 C"/>'
+
+
+def test_types_cache_unknown_rules():
+    """ XML namespace unit test - add_child - The generic method is called when its rules can't be read """
+    x = xml.Renderer()
+    rules_for = peak.rules.core.rules_for
+
+    try:
+        peak.rules.core.rules_for = None
+        cache = dispatch.TypesCache(xml.add_child)
+    finally:
+        peak.rules.core.rules_for = rules_for
+
+    assert not cache.observed
+    assert cache.get_rules() is None
+    assert cache.resolve((xml._Tag, str)) is xml.add_child
+
+    cache = dispatch.TypesCache(xml.add_child)
+    assert cache.observed
+
+    try:
+        peak.rules.core.rules_for = lambda generic: [object()]
+        assert cache.resolve((xml._Tag, str)) is xml.add_child
+    finally:
+        peak.rules.core.rules_for = rules_for
+
+    cache.actions_changed(None, None)
+    assert cache.resolve((xml._Tag, str)) is not xml.add_child
+
+    node = x.node()
+    cache(node, 'test')
+    assert node.write_xmlstring() == '<node>test</node>'
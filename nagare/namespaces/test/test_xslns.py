@@ -8,6 +8,8 @@
 # --
 
 import os
+import tempfile
+import threading
 
 from nagare.namespaces import xsl
 from nagare.namespaces import xml
@@ -65,3 +67,94 @@ def test2():
 
     assert r.xpath('//html/h1')[0].text == 'Hello'
     assert r.xpath('//html/h2')[0].text == 'World'
+
+
+def create_stylesheet(title):
+    x = xsl.Renderer()
+    x.namespaces = {'xsl': 'http://www.w3.org/1999/XSL/Transform'}
+    x.default_namespace = 'xsl'
+
+    return x.stylesheet(
+        x.param(name='name'),
+        x.param(name='nb'),
+        x.template(
+            x.element(x.text(title), x.value_of(select='$name'), x.text(' '), x.value_of(select='$nb + count(//h2)'), name='h1'),
+            match='/'
+        ),
+        version='1.0'
+    )
+
+
+def test3():
+    """ XSL namespace unit test - compiled stylesheets cache """
+    xml.clear_stylesheets()
+
+    styleSheet = create_stylesheet('Hello ')
+    compiled = xml.get_stylesheet(styleSheet)
+
+    assert xml.get_stylesheet(create_stylesheet('Hello ')) is compiled
+    assert xml.get_stylesheet(create_stylesheet('Goodbye ')) is not compiled
+
+    filename = tempfile.mktemp(suffix='.xsl')
+    try:
+        with open(filename, 'w') as f:
+            f.write(styleSheet.write_xmlstring())
+
+        compiled = xml.get_stylesheet(filename)
+        assert xml.get_stylesheet(filename) is compiled
+
+        os.utime(filename, (0, 0))
+        assert xml.get_stylesheet(filename) is not compiled
+    finally:
+        os.remove(filename)
+
+    # Only the most recently used stylesheets are kept
+    compiled = xml.get_stylesheet(create_stylesheet('Hello '))
+    for i in range(xml.MAX_STYLESHEETS):
+        xml.get_stylesheet(create_stylesheet('Hello %d ' % i))
+
+    assert len(xml._stylesheets) == xml.MAX_STYLESHEETS
+    assert xml.get_stylesheet(create_stylesheet('Hello ')) is not compiled
+
+
+def test3bis():
+    """ XSL namespace unit test - compiled stylesheets cache not locked while compiling """
+    xml.clear_stylesheets()
+
+    XSLT = xml.ET.XSLT
+    locked = []
+
+    def try_lock():
+        if xml._stylesheets.lock.acquire(False):
+            xml._stylesheets.lock.release()
+            locked.append(False)
+        else:
+            locked.append(True)
+
+    def compile_stylesheet(tree):
+        # An other thread can use the cache
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+
+        return XSLT(tree)
+
+    xml.ET.XSLT = compile_stylesheet
+    try:
+        xml.get_stylesheet(create_stylesheet('Hello '))
+    finally:
+        xml.ET.XSLT = XSLT
+
+    assert locked == [False]
+
+
+def test4():
+    """ XSL namespace unit test - transformation by the renderer, with parameters """
+    h = xhtml.Renderer()
+    page = h.html(h.h2('a'), h.h2('b'))
+
+    r = h.xslt(create_stylesheet('Hello '), page, name="'world' & co", nb=40)
+    assert r.write_xmlstring() == '<h1>Hello \'world\' &amp; co 42</h1>'
+
+    h << h.div(r)
+    assert h.root.write_htmlstring() == '<div><h1>Hello \'world\' &amp; co 42</h1></div>'
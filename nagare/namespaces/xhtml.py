@@ -21,7 +21,7 @@ from lxml import etree as ET
 import peak.rules
 import webob
 
-from nagare import security, ajax, presentation, partial
+from nagare import security, ajax, presentation, partial, callbacks
 
 from nagare.namespaces import xml
 from nagare.namespaces.xml import TagProp
@@ -130,9 +130,14 @@ class HeadRenderer(xhtml_base.HeadRenderer):
         self._css_url = {}           # CSS URLs
         self._named_javascript = {}  # Javascript code
         self._javascript_url = {}    # Javascript URLs
+        self._preload = {}           # URLs of the contents to preload
 
         self._order = 0              # Memorize the order of the javascript and css
 
+        self.bundles = None          # Bundles of the static css and javascript files
+        self.defer_scripts = False   # Defer the javascript URLs? (see ``blocking_scripts()``)
+        self.preload_links = False   # Send the HTTP ``Link`` header of the contents to preload?
+
     def css(self, name, style, **kw):
         """Memorize an in-line named css style
 
@@ -200,6 +205,35 @@ class HeadRenderer(xhtml_base.HeadRenderer):
         self._order += 1
         return ()
 
+    def preload(self, url, as_, **kw):
+        """Memorize a content to preload, as a font used by the css styles
+
+        In:
+          - ``url`` -- the URL of the content
+          - ``as_`` -- type of the content (``font``, ``image``, ``style``, ``script`` ...)
+          - ``kw`` -- attributes of the generated ``<link>`` tag
+
+        Return:
+          - ``()``
+        """
+        if as_ == 'font':
+            # The fonts are always fetched in CORS mode
+            kw.setdefault('crossorigin', 'anonymous')
+
+        self._preload.setdefault(absolute_url(url, self.static_url), (self._order, as_, kw))
+        self._order += 1
+        return ()
+
+    def blocking_scripts(self):
+        """The inline scripts or the javascript event handlers of the page use
+        the javascript URLs while the page is parsed: they are not deferred
+
+        Return:
+          - ``()``
+        """
+        self.defer_scripts = False
+        return ()
+
     def _style(self, append, tag, style):
         append(tag, style)
 
@@ -239,6 +273,80 @@ class HeadRenderer(xhtml_base.HeadRenderer):
         """
         return [(url, attributes) for (url, (order, attributes)) in sorted(self._javascript_url.items(), key=operator.itemgetter(1))]
 
+    def _get_preload(self):
+        """Return the list of the contents to preload, sorted by order of insertion
+
+        Return:
+          - list of (URL, type of the content, attributes)
+        """
+        return [(url, as_, attributes) for (url, (order, as_, attributes)) in sorted(self._preload.items(), key=operator.itemgetter(1))]
+
+    def _defer(self, javascript_urls):
+        """Defer the javascript URLs, when it's safe
+
+        The deferred scripts are run in order, once the page parsed. So a script
+        is only deferred if no blocking script comes after it: the inline named
+        javascript codes, or the URLs with attributes other than ``defer`` or
+        ``async``, can use all the previous scripts.
+
+        In:
+          - ``javascript_urls`` -- list of javascript (URLs, attributes)
+
+        Return:
+          - new list of javascript (URLs, attributes)
+        """
+        if self._named_javascript:
+            return javascript_urls
+
+        deferred = []
+        for url, attributes in reversed(javascript_urls):
+            if not attributes:
+                attributes = {'defer': 'defer'}
+            elif not {name.rstrip('_') for name in attributes} & {'defer', 'async'}:
+                # A blocking script
+                break
+
+            deferred.append((url, attributes))
+
+        return javascript_urls[:len(javascript_urls) - len(deferred)] + deferred[::-1]
+
+    def _get_urls(self):
+        """Return the css and javascript URLs, once bundled and deferred
+
+        Return:
+          - tuple (list of css (URLs, attributes), list of javascript (URLs, attributes))
+        """
+        css_urls = self._get_css_url()
+        javascript_urls = self._get_javascript_url()
+
+        if self.bundles is not None:
+            # Replace the static files by their bundles
+            css_urls = self.bundles.rewrite('css', css_urls)
+            javascript_urls = self.bundles.rewrite('js', javascript_urls)
+
+        if self.defer_scripts:
+            javascript_urls = self._defer(javascript_urls)
+
+        return css_urls, javascript_urls
+
+    def get_link_header(self):
+        """Return the HTTP ``Link`` header preloading the css, the javascript and
+        the contents to preload, before the browser receives the ``<head>``
+
+        Return:
+          - the value of the header (``None`` if nothing to preload)
+        """
+        css_urls, javascript_urls = self._get_urls()
+
+        links = [(url, 'style', {}) for url, attributes in css_urls]
+        links.extend((url, 'script', {}) for url, attributes in javascript_urls)
+        links.extend(self._get_preload())
+
+        return ', '.join(
+            '<%s>; rel=preload; as=%s%s' % (url, as_, '; crossorigin' if 'crossorigin' in attributes else '')
+            for url, as_, attributes in links
+        ) or None
+
 
 @presentation.render_for(HeadRenderer)
 def render(self, h, *args):
@@ -262,8 +370,11 @@ def render(self, h, *args):
     else:
         head = self.head(head)
 
-    head.extend(self.link(rel='stylesheet', type='text/css', href=url, **attributes) for (url, attributes) in self._get_css_url())
-    head.extend(self.script(type='text/javascript', src=url, **attributes) for (url, attributes) in self._get_javascript_url())
+    css_urls, javascript_urls = self._get_urls()
+
+    head.extend(self.link(rel='preload', href=url, as_=as_, **attributes) for (url, as_, attributes) in self._get_preload())
+    head.extend(self.link(rel='stylesheet', type='text/css', href=url, **attributes) for (url, attributes) in css_urls)
+    head.extend(self.script(type='text/javascript', src=url, **attributes) for (url, attributes) in javascript_urls)
 
     head.extend(self.style(css, type='text/css', **attributes) for (name, css, attributes) in self._get_named_css())
     head.extend(self.script(js, type='text/javascript', **attributes) for (name, js, attributes) in self._get_named_javascript())
@@ -293,10 +404,15 @@ class _HTMLActionTag(xhtml_base._HTMLTag):
         if isinstance(action, ajax.Update):
             self._async_action(self.renderer, action, with_request)
         else:
+            readonly = callbacks.is_readonly(action)
+
             # Wrap the ``action`` into a wrapper that will check the user permissions
             action = security.wrapper(action, permissions, subject or self.renderer.component())
             action = partial.Partial(action, *args, **kw)
 
+            if readonly:
+                action = callbacks.readonly(action)
+
             # Double dispatch with the renderer
             self.renderer.action(self, action, with_request)
 
@@ -805,7 +921,8 @@ class Img(_HTMLActionTag):
           - ``permissions`` -- permissions needed to execute the action
           - ``subject`` -- subject to test the permissions on
         """
-        f = partial.Partial(self._set_content_type, _action=action, with_request=with_request)
+        # The image generation doesn't modify the objects graph
+        f = callbacks.readonly(partial.Partial(self._set_content_type, _action=action, with_request=with_request))
         self.set('src', renderer.add_sessionid_in_url(sep=';') + ';' + renderer.register_callback(2, f, with_request=True))
     async_action = sync_action
 
@@ -888,6 +1005,7 @@ class Renderer(xhtml_base.Renderer):
     HTML_DOCTYPE = '<!DOCTYPE html PUBLIC "-//W3C//DTD HTML 4.01//EN" "http://www.w3.org/TR/html4/strict.dtd">'
 
     head_renderer_factory = HeadRenderer
+    light_children = True  # The session, request, response, URLs, component and model are the ones of the parent
 
     # Redefinition of the he HTML tags with actions
     # ---------------------------------------------
@@ -944,6 +1062,8 @@ class Renderer(xhtml_base.Renderer):
         cls._html_parser = ET.HTMLParser()
         cls._html_parser.setElementClassLookup(cls._custom_lookup)
 
+    fragments_url = None  # URL of the application, when the fragment views are included with ESI tags
+
     def __init__(self, parent=None, session=None, request=None, response=None, static_url='', static_path='', url='/'):
         """Renderer initialisation
 
@@ -974,6 +1094,7 @@ class Renderer(xhtml_base.Renderer):
             self.url = parent.url
             self.component = parent.component
             self.model = parent.model
+            self.fragments_url = parent.fragments_url
 
     def SyncRenderer(self, *args, **kw):
         """Create an associated synchronous HTML renderer
@@ -1266,6 +1387,7 @@ class AsyncRenderer(Renderer):
     """The XHTML asynchronous renderer
     """
     head_renderer_factory = AsyncHeadRenderer
+    light_children = True
 
     def __init__(self, parent=None, session=None, request=None, response=None, static_url='', static_path='', url='/', async_header=False):
         """Renderer initialisation
@@ -1288,6 +1410,17 @@ class AsyncRenderer(Renderer):
         self.async_root = True
         self.wrapper_to_generate = False  # Add a ``<div>`` around the rendering?
 
+    def init_child(self, parent):
+        """Initialize the own state of a child renderer created by copy
+
+        In:
+          - ``parent`` -- parent renderer
+        """
+        super(AsyncRenderer, self).init_child(parent)
+
+        self.async_root = True
+        self.wrapper_to_generate = False
+
     def SyncRenderer(self, *args, **kw):
         """Create an associated synchronous HTML renderer
 
@@ -14,9 +14,9 @@ Having not dependencies to the framework make it suitable to be used in others f
 """
 
 import cStringIO
-import urllib
 import peak
 
+import lxml.html
 from lxml import etree as ET
 
 from nagare.namespaces import xml
@@ -63,7 +63,7 @@ class _HTMLTag(xml._Tag):
           - the XHTML
         """
         if not pipeline:
-            for element in self.xpath('.//*[@meld:id]', namespaces={'meld': xml._MELD_NS}):
+            for element in xml._find_melds(self):
                 del element.attrib[xml._MELD_ID]
 
         return ET.tostring(self.decorate_error(), encoding=encoding, method='html', **kw)
@@ -144,6 +144,7 @@ class HeadRenderer(xml.XmlRenderer):
 
 class Renderer(xml.XmlRenderer):
     head_renderer_factory = HeadRenderer
+    light_children = True  # The head renderer is shared with the parent
 
     componentattrs = {'id', 'class', 'style', 'title'}
     i18nattrs = {'lang', 'dir'}
@@ -346,11 +347,14 @@ class Renderer(xml.XmlRenderer):
           - the root element of the parsed HTML, if ``fragment`` is ``False``
           - a list of HTML elements, if ``fragment`` is ``True``
         """
+        compact = isinstance(parser, ET.XMLParser) and getattr(getattr(self, 'response', None), 'compact_output', False)
+
         if isinstance(source, basestring):
-            if source.startswith(('http://', 'https://', 'ftp://')):
-                source = urllib.urlopen(source)
-            else:
-                source = open(source)
+            # The file or the URL is only parsed once, then copied
+            options = (self.__class__, parser.__class__, fragment, no_leading_text, compact, tuple(sorted(kw.items())))
+            template = xml.get_template(source, options, lambda source: self._parse_html(parser, source, fragment, no_leading_text, **kw))
+
+            return self.copy_template(template)
 
         if not fragment:
             # Parse a HTML file
@@ -359,6 +363,11 @@ class Renderer(xml.XmlRenderer):
             root = ET.parse(source, parser).getroot()
             source.close()
 
+            if compact:
+                # The XHTML namespace is removed once, not from each generated page
+                lxml.html.xhtml_to_html(root)
+                ET.cleanup_namespaces(root)
+
             # Attach the renderer to the root
             root._renderer = self
             return root
@@ -371,6 +380,10 @@ class Renderer(xml.XmlRenderer):
         source.close()
 
         body = ET.parse(html, parser).getroot()[0]
+        if compact:
+            lxml.html.xhtml_to_html(body)
+            ET.cleanup_namespaces(body)
+
         for e in body:
             if isinstance(e, _HTMLTag):
                 # Attach the renderer to each roots
@@ -9,16 +9,22 @@
 
 """XML renderer"""
 
+import os
+import time
 import types
 import copy
+import inspect
 import cStringIO
 import urllib
+import hashlib
 
 import peak.rules
 
 from lxml import etree as ET
 
+from nagare import dispatch
 from nagare.namespaces import common
+from nagare.sessions.lru_dict import ThreadSafeLRUDict
 
 CHECK_ATTRIBUTES = False
 
@@ -26,6 +32,169 @@ CHECK_ATTRIBUTES = False
 _MELD_NS = 'http://www.plope.com/software/meld3'
 _MELD_ID = '{%s}id' % _MELD_NS
 
+# Precompiled searches of the ``meld:id`` attributes
+_find_meld = ET.XPath('.//*[@meld:id=$id]', namespaces={'meld': _MELD_NS})
+_find_melds = ET.XPath('.//*[@meld:id]', namespaces={'meld': _MELD_NS})
+
+# The templates fetched from an URL are parsed again after this time, in seconds
+URL_TEMPLATES_TTL = 60
+
+# Parsed templates: (source, parsing options) -> (modification time, tree or fragment)
+_templates = {}
+
+# Maximum number of compiled XSL stylesheets kept in memory
+MAX_STYLESHEETS = 100
+
+# Compiled XSL stylesheets: filename, URL or digest of the tree -> (modification time, ``ET.XSLT`` object)
+_stylesheets = ThreadSafeLRUDict(MAX_STYLESHEETS)
+
+
+def get_stamp(source):
+    """Return the version of a file or URL, and the function to open it
+
+    In:
+      - ``source`` -- filename or URL
+
+    Return:
+      - tuple (modification time of the file or time slot of the URL, function to open it)
+    """
+    if source.startswith(('http://', 'https://', 'ftp://')):
+        return int(time.time() / URL_TEMPLATES_TTL), urllib.urlopen
+
+    return os.path.getmtime(source), open
+
+
+def index_melds(element):
+    """Index the ``meld:id`` values of the descendants of a tag
+
+    In:
+      - ``element`` -- the tag
+
+    Return:
+      - dictionary: ``meld:id`` value -> path of the first descendant with this
+        value, as the list of the children positions from ``element``
+    """
+    index = {}
+
+    for node in _find_melds(element):
+        id = node.get(_MELD_ID)
+        if id not in index:
+            path = []
+            while node is not element:
+                parent = node.getparent()
+                path.insert(0, parent.index(node))
+                node = parent
+
+            index[id] = path
+
+    return index
+
+
+def get_template(source, options, parse):
+    """Return a parsed template, only parsed again when its file is modified
+
+    In:
+      - ``source`` -- filename or URL of the template
+      - ``options`` -- the parsing options (hashable)
+      - ``parse`` -- function parsing the template from a file object
+
+    Return:
+      - the parsed tree or fragment, shared and never to be modified
+    """
+    stamp, open_source = get_stamp(source)
+
+    key = (source, options)
+
+    template = _templates.get(key)
+    if (template is None) or (template[0] != stamp):
+        template = parse(open_source(source))
+
+        # The shared template doesn't keep a reference to the renderer which parsed it
+        # and indexes its ``meld:id`` values once for all its copies
+        for e in template if isinstance(template, list) else (template,):
+            if isinstance(e, _Tag):
+                e._renderer = None
+                e._meld_index = index_melds(e)
+
+        template = _templates[key] = (stamp, template)
+
+    return template[1]
+
+
+def clear_templates():
+    """Forget all the parsed templates"""
+    _templates.clear()
+
+
+def get_stylesheet(stylesheet):
+    """Return a compiled XSL stylesheet, only compiled once by process
+
+    The ``ET.XSLT`` objects are shared by the threads: each transformation
+    has its own context. Only the ``MAX_STYLESHEETS`` most recently used
+    stylesheets are kept.
+
+    A stylesheet tree is still serialized at each call, to compute its digest:
+    prefer a filename for a large stylesheet
+
+    In:
+      - ``stylesheet`` -- filename or URL of the stylesheet, compiled again when the
+        file is modified, or stylesheet tree (as built by a ``xsl.Renderer``),
+        compiled again when its content changes
+
+    Return:
+      - the ``ET.XSLT`` object
+    """
+    if isinstance(stylesheet, basestring):
+        key = stylesheet
+        stamp, open_source = get_stamp(stylesheet)
+    else:
+        key = hashlib.md5(ET.tostring(stylesheet)).hexdigest()
+        stamp = open_source = None
+
+    try:
+        compiled = _stylesheets[key]
+    except KeyError:
+        compiled = None
+
+    if (compiled is None) or (compiled[0] != stamp):
+        # Compiled without lock: a new stylesheet can be compiled concurrently
+        # by several threads, the last compiled one is kept
+        tree = stylesheet if open_source is None else ET.parse(open_source(stylesheet))
+        compiled = (stamp, ET.XSLT(tree))
+        _stylesheets[key] = compiled
+
+    return compiled[1]
+
+
+def clear_stylesheets():
+    """Forget all the compiled stylesheets"""
+    with _stylesheets.lock:
+        _stylesheets.items.clear()
+
+
+def get_xslt_param(value):
+    """Convert a value to a XSL stylesheet parameter
+
+    In:
+      - ``value`` -- a string, a number, a boolean or an already converted parameter
+
+    Return:
+      - the XPath expression of the parameter
+    """
+    if isinstance(value, basestring):
+        return ET.XSLT.strparam(value)
+
+    if isinstance(value, bool):
+        return 'true()' if value else 'false()'
+
+    if isinstance(value, (int, long)):
+        return str(value)
+
+    if isinstance(value, float):
+        return repr(value)
+
+    return value
+
 
 # ---------------------------------------------------------------------------
 
@@ -62,7 +231,7 @@ class _Tag(ET.ElementBase):
           - the XML
         """
         if not pipeline:
-            for element in self.xpath('.//*[@meld:id]', namespaces={'meld': _MELD_NS}):
+            for element in _find_melds(self):
                 del element.attrib[_MELD_ID]
 
         return ET.tostring(self, encoding=encoding, method='xml', **kw)
@@ -88,13 +257,43 @@ class _Tag(ET.ElementBase):
         Return:
           - the tag found, else the ``default`` value
         """
-        nodes = self.xpath('.//*[@meld:id="%s"]' % id, namespaces={'meld': _MELD_NS})
+        node = self._find_indexed_meld(id)
+
+        if node is None:
+            nodes = _find_meld(self, id=id)
+            if len(nodes) != 0:
+                # Return only the first tag found
+                node = nodes[0]
+
+        if node is None:
+            return default
+
+        node._renderer = self.renderer
+        return node
+
+    def _find_indexed_meld(self, id):
+        """Find a tag with a given ``meld:id`` value from the index of the template
+
+        The tree can have been modified since it was indexed so the tag found is
+        checked and ``None`` is returned if it's not the expected one
+
+        In:
+          - ``id`` -- value of the ``meld:id`` attribute to search
+
+        Return:
+          - the tag found or ``None``
+        """
+        path = (getattr(self, '_meld_index', None) or {}).get(id)
+        if path is None:
+            return None
 
-        if len(nodes) != 0:
-            # Return only the first tag found
-            return nodes[0]
+        node = self
+        for i in path:
+            if i >= len(node):
+                return None
+            node = node[i]
 
-        return default
+        return node if node.get(_MELD_ID) == id else None
 
     def append_text(self, text):
         """Append a text to this tag
@@ -114,7 +313,7 @@ class _Tag(ET.ElementBase):
           - ``child`` -- child to add
         """
         # Forward the call to the generic method
-        add_child(self, child)
+        cached_add_child(self, child)
 
     def meld_id(self, id):
         """Set the value of the attribute ``meld:id`` of this tag
@@ -179,12 +378,17 @@ class _Tag(ET.ElementBase):
         else:
             element = self.findmeld(childname)
 
+        renderer = element.renderer
+        # All the clones share the same ``meld:id`` index
+        index = index_melds(element)
+
         parent = element.getparent()
         parent.remove(element)
 
         for thing in iterable:
             clone = copy.deepcopy(element)
-            clone._renderer = element.renderer
+            clone._renderer = renderer
+            clone._meld_index = index
             parent.append(clone)
 
             yield (clone, thing)
@@ -334,7 +538,7 @@ def add_child(self, d):
     Attribute name can end with a '_' which is removed
     """
     for name, value in d.iteritems():
-        add_attribute(self, name, value)
+        cached_add_attribute(self, name, value)
 
 
 # ---------------------------------------------------------------------------
@@ -350,7 +554,7 @@ def add_attribute(self, name, value):
       - ``name`` -- name of the attribute to add
       - ``value`` -- value of the attribute to add
     """
-    add_attribute(self, name, unicode(value))
+    cached_add_attribute(self, name, unicode(value))
 
 
 @peak.rules.when(add_attribute, (_Tag, basestring, basestring))
@@ -369,6 +573,12 @@ def add_attribute(self, name, value):
     self.text += (' %s="%s"' % (name, value))
 
 
+# The generic methods called for each child and each attribute are dispatched
+# through a per types cache
+cached_add_child = dispatch.TypesCache(add_child)
+cached_add_attribute = dispatch.TypesCache(add_attribute)
+
+
 # ---------------------------------------------------------------------------
 
 class TagProp(object):
@@ -440,6 +650,26 @@ class RendererMetaClass(type):
         return cls
 
 
+class LazyAttribute(object):
+    """Attribute computed the first time it is read, then kept into the object
+    """
+    def __init__(self, f):
+        """Initialization
+
+        In:
+          - ``f`` -- function receiving the object and computing the value
+        """
+        self.f = f
+        self.name = f.__name__
+
+    def __get__(self, o, cls):
+        if o is None:
+            return self
+
+        value = o.__dict__[self.name] = self.f(o)
+        return value
+
+
 # -----------------------------------------------------------------------
 
 class XmlRenderer(common.Renderer):
@@ -474,16 +704,83 @@ class XmlRenderer(common.Renderer):
             # This renderer use the same XML namespaces than its parent
             self.namespaces = parent.namespaces
             self._default_namespace = parent._default_namespace
+            self.profile = parent.profile
+
+        self.parent = parent
+        self._prefix = ''
+
+    # Can the children be created by copy? To set into each renderer class redefining ``__init__()``,
+    # once checked that its ``__init__()`` only copies its state from the parent or that ``init_child()`` resets it
+    light_children = True
+
+    # Classes of renderers -> can their children be created by copy?
+    _light_children = {}
+
+    @classmethod
+    def has_light_children(cls):
+        """Can the children of the renderers of this class be created by copy?
+
+        They can if each renderer class redefining ``__init__()`` also sets the
+        ``light_children`` flag into its own body
+
+        Return:
+          - a boolean
+        """
+        light = XmlRenderer._light_children.get(cls)
+        if light is None:
+            light = XmlRenderer._light_children[cls] = all(
+                ('__init__' not in klass.__dict__) or klass.__dict__.get('light_children', False)
+                for klass in inspect.getmro(cls) if issubclass(klass, XmlRenderer)
+            )
+
+        return light
+
+    def new(self):
+        """Create a child renderer, of the same class than this renderer
+
+        The child is a copy of this renderer, sharing its context (session,
+        request, head renderer ...), without the calls of the ``__init__()``
+        methods. So the attributes set on this renderer, even outside of
+        ``__init__()``, are inherited by the child
+
+        Return:
+          - the new renderer
+        """
+        if not self.has_light_children():
+            return super(XmlRenderer, self).new()
+
+        renderer = self.__class__.__new__(self.__class__)
+        renderer.__dict__ = self.__dict__.copy()
+        renderer.init_child(self)
+
+        return renderer
+
+    def init_child(self, parent):
+        """Initialize the own state of a child renderer created by copy
 
+        In:
+          - ``parent`` -- parent renderer
+        """
         self.parent = parent
         self._prefix = ''
 
-        # The stack, contening the last tag push by a ``with`` statement
-        # Initialized with a dummy root
-        self._stack = [self.makeelement('_renderer_root_')]
+        # The tags stack and the id are created on demand
+        attributes = self.__dict__
+        attributes.pop('_stack', None)
+        attributes.pop('id', None)
+
+    @LazyAttribute
+    def _stack(self):
+        """The stack, contening the last tag push by a ``with`` statement
 
-        # Each renderer created has a unique id
-        self.id = self.generate_id('id')
+        Initialized with a dummy root, created on demand
+        """
+        return [self.makeelement('_renderer_root_')]
+
+    @LazyAttribute
+    def id(self):
+        """Each renderer has a unique id, generated on demand"""
+        return self.generate_id('id')
 
     def _get_default_namespace(self):
         """Return the default_namespace
@@ -524,6 +821,10 @@ class XmlRenderer(common.Renderer):
         Return:
           - the tag(s)
         """
+        if '_stack' not in self.__dict__:
+            # Nothing was sent to this renderer
+            return ''
+
         children = self._stack[0].getchildren()
 
         text = self._stack[0].text
@@ -594,7 +895,7 @@ class XmlRenderer(common.Renderer):
         Return:
           - ``self``, the renderer
         """
-        add_child(self._stack[-1], current)
+        cached_add_child(self._stack[-1], current)
         return self
 
     def comment(self, text=''):
@@ -642,10 +943,11 @@ class XmlRenderer(common.Renderer):
           - a list of XML elements, if ``fragment`` is ``True``
         """
         if isinstance(source, basestring):
-            if source.startswith(('http://', 'https://', 'ftp://')):
-                source = urllib.urlopen(source)
-            else:
-                source = open(source)
+            # The file or the URL is only parsed once, then copied
+            options = (self.__class__, 'xml', fragment, no_leading_text, tuple(sorted(kw.items())))
+            template = get_template(source, options, lambda source: self.parse_xml(source, fragment, no_leading_text, **kw))
+
+            return self.copy_template(template)
 
         # Create a dedicated XML parser with the ``kw`` parameter
         parser = ET.XMLParser(**kw)
@@ -678,6 +980,55 @@ class XmlRenderer(common.Renderer):
         # Return the children of the dummy root
         return ([root.text] if root.text and not no_leading_text else []) + root[:]
 
+    def copy_template(self, template):
+        """Copy a parsed template
+
+        In:
+          - ``template`` -- the root element or the list of elements of the template
+
+        Return:
+          - the copy of the template, attached to this renderer
+        """
+        if not isinstance(template, list):
+            root = copy.deepcopy(template)
+            root._renderer = self
+            root._meld_index = getattr(template, '_meld_index', None)
+            return root
+
+        # Fragment: copy the parent of the elements to keep their tails and siblings
+        elements = [e for e in template if not isinstance(e, basestring)]
+        if not elements:
+            return template[:]
+
+        parent = copy.deepcopy(elements[0].getparent())
+        for e, original in zip(parent, elements):
+            if isinstance(e, _Tag):
+                e._renderer = self
+                e._meld_index = getattr(original, '_meld_index', None)
+
+        return template[:len(template) - len(elements)] + parent[:]
+
+    def xslt(self, stylesheet, tree, **params):
+        """Transform a tree by a XSL stylesheet
+
+        In:
+          - ``stylesheet`` -- filename or URL of the stylesheet, or stylesheet tree,
+            only compiled once (see ``get_stylesheet()``)
+          - ``tree`` -- the tree to transform
+          - ``params`` -- the stylesheet parameters (see ``get_xslt_param()``).
+            The strings are passed as literal strings, not as XPath expressions
+
+        Return:
+          - the root element of the transformed tree, or the transformed text
+            if the stylesheet has no XML output
+        """
+        params = {name: get_xslt_param(value) for name, value in params.items()}
+
+        result = get_stylesheet(stylesheet)(tree, **params)
+        root = result.getroot()
+
+        return str(result) if root is None else root
+
     def parse_xmlstring(self, text, fragment=False, no_leading_text=False, **kw):
         """Parse a XML string
 
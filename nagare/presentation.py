@@ -9,11 +9,21 @@
 
 """Generic methods to associate views and URLs to objects"""
 
+import sys
 import types
+import inspect
 
 from peak.rules import when
 from webob.exc import HTTPNotFound
 
+from nagare import dispatch
+
+# The views registered for a named model: view -> (class, name of the model)
+_named_views = {}
+
+# The routes registered with a condition: view -> (class, compiled condition, namespace of the condition)
+_routes = {}
+
 
 class ModelError(LookupError):
     pass
@@ -50,12 +60,22 @@ def render_for_cond(cond):
     return when(render, cond)
 
 
-def render_for(cls, model=None):
+def render_for(cls, model=None, cache=None, compiled=False, fragment=None, fragment_args=None):
     """Decorator helper to register a view for a class of objects
 
     In:
       - ``cls`` -- the class
       - ``model`` -- the name of the view
+      - ``cache`` -- function receiving the object and returning its version
+        or dependencies: the rendered view is cached while they don't change
+        (see ``nagare.views_cache``)
+
+      - ``compiled`` -- are the static subtrees of the view to be prebuilt?
+        (see ``nagare.views_compiler``)
+      - ``fragment`` -- time, in seconds, the view can be cached by an edge
+        server, as a fragment included with an ESI tag (see ``nagare.fragments``)
+      - ``fragment_args`` -- function receiving the object and returning the
+        arguments to recreate it from the URL of the fragment
 
     Return:
       - a closure
@@ -66,7 +86,33 @@ def render_for(cls, model=None):
         # No name give, dispatch only on the arguments type
         cond = (cls, object, object, types.NoneType)
 
-    return render_for_cond(cond)
+    register = render_for_cond(cond)
+    if (cache is None) and (model is None) and not compiled and (fragment is None):
+        return register
+
+    if cache is not None:
+        if not callable(cache):
+            raise TypeError('The cache parameter must be a function returning the dependencies of the view')
+
+        from nagare import views_cache  # Lazy import to prevent circular references
+
+    if compiled:
+        from nagare import views_compiler  # Lazy import to prevent circular references
+
+    if fragment is not None:
+        from nagare import fragments  # Lazy import to prevent circular references
+
+    def decorate(view):
+        body = views_compiler.compile_view(view) if compiled else view
+        body = body if cache is None else views_cache.cached(body, cache)
+        body = body if fragment is None else fragments.fragment_view(body, cls, model, fragment, fragment_args)
+        if model is not None:
+            _named_views[body] = (cls, model)
+
+        registered = register(body)
+        return registered if (cache is None) and (fragment is None) else view
+
+    return decorate
 
 
 @when(render, (object, object, object, int))
@@ -74,6 +120,46 @@ def render(self, renderer, comp, model):
     return render(self, renderer, comp, None)
 
 
+ANY_MODEL = object()  # Model of the rules not registered for a named model
+
+
+class ViewsCache(dispatch.TypesCache):
+    """``render()`` called through a per types and model cache of its views
+
+    The rules registered by ``render_for()`` for a named model are resolved
+    from the class and the name of the model. The ``render()`` generic method
+    is directly called if rules with other conditions were registered
+    (``render_for_cond()``)
+    """
+    def get_key(self, args):
+        o, renderer, comp, model = args
+        return (getattr(o, '__class__', type(o)), type(renderer), type(comp), model)
+
+    def parse_rule(self, predicate, method):
+        named_view = _named_views.get(method)
+        if named_view is None:
+            signature = dispatch.get_signature(predicate)
+            return None if signature is None else (signature, ANY_MODEL)
+
+        cls, model = named_view
+        return ((cls,), (object,), (object,), (type(model),)), model
+
+    def matches(self, signature, key):
+        types_, model = signature
+        if model is ANY_MODEL:
+            return super(ViewsCache, self).matches(types_, key[:3] + (type(key[3]),))
+
+        return super(ViewsCache, self).matches(types_[:3], key) and (key[3] == model)
+
+    def implies(self, signature1, signature2):
+        (types1, model1), (types2, model2) = signature1, signature2
+        return dispatch.implies(types1, types2) and ((model2 is ANY_MODEL) or (model1 == model2))
+
+
+# The components are rendered through a per types and model cache of the views
+cached_render = ViewsCache(render)
+
+
 # ---------------------------------------------------------------------------
 
 def init(self, url, comp, http_method, request):
@@ -99,10 +185,142 @@ def init_for(cls, cond=None):
     Return:
       - a closure
     """
-    if cond is not None:
-        cond = "isinstance(self, %s) and (%s)" % (cls.__name__, cond)
-    else:
+    if cond is None:
         # No condition given, dispatch on the class
-        cond = (cls,)
+        return when(init, (cls,))
+
+    register = when(init, "isinstance(self, %s) and (%s)" % (cls.__name__, cond))
+    code = compile(cond, '<init_for %s>' % cls.__name__, 'eval')
+
+    # The names of the condition are the names of the scope where the route is declared
+    frame = sys._getframe(1)
+    namespace = frame.f_globals
+    if frame.f_locals is not namespace:
+        namespace = dict(namespace)
+        namespace.update(frame.f_locals)
+
+    def decorate(view):
+        _routes[view] = (cls, code, namespace)
+        return register(view)
+
+    return decorate
+
+
+class RoutesTable(object):
+    """``init()`` called through a precompiled routes table
+
+    For each class of objects, the routes registered with ``init_for()`` are
+    sorted from the most specific to the most general one and their conditions
+    are compiled once.
+
+    The ``init()`` generic method is directly called if rules with other
+    conditions were registered, if the rules can't be read from ``peak.rules``
+    or if the matching routes are ambiguous
+    """
+    def __init__(self, generic):
+        """Initialization
+
+        In:
+          - ``generic`` -- the ``init()`` generic method
+        """
+        self.generic = generic
+        self.tables = {}  # Class of the objects -> routes
+        self.routes = None
+
+        # Be notified when rules are added or removed
+        self.observed = dispatch.subscribe(generic, self)
+
+    def actions_changed(self, added, removed):
+        """The rules of the generic method changed
+
+        In:
+          - ``added`` -- the new rules
+          - ``removed`` -- the removed rules
+        """
+        self.routes = None
+        self.tables.clear()
+
+    def get_routes(self):
+        """Return all the routes
+
+        Return:
+          - list of tuples (class, compiled condition or ``None``, namespace of the condition, view)
+            (``None`` if the rules can't be resolved)
+        """
+        if not self.observed:
+            # The tables couldn't be cleared when the rules change
+            return None
+
+        if self.routes is None:
+            rules = dispatch.get_rules(self.generic)
+            routes = [] if rules is not None else None
+
+            for predicate, view, next_method in rules or ():
+                if next_method:
+                    routes = None
+                    break
+
+                route = _routes.get(view)
+                if route is not None:
+                    routes.append(route + (view,))
+                    continue
+
+                signature = dispatch.get_signature(predicate)
+                if (signature is None) or (len(signature) > 1) or (signature and (len(signature[0]) != 1)):
+                    routes = None
+                    break
+
+                routes.append((signature[0][0] if signature else object, None, None, view))
+
+            self.routes = routes
+
+        return self.routes
+
+    def get_table(self, cls):
+        """Return the routes for a class of objects
+
+        In:
+          - ``cls`` -- the class
+
+        Return:
+          - the routes, from the most specific to the most general (``None`` if they can't be resolved)
+        """
+        routes = self.get_routes()
+        if routes is None:
+            return None
+
+        mro = inspect.getmro(cls)
+        routes = [route for route in routes if dispatch.is_subclass(cls, (route[0],))]
+
+        # For a same class, the routes with a condition are the most specific
+        routes.sort(key=lambda route: (mro.index(route[0]) if route[0] in mro else len(mro), route[1] is None))
+
+        return routes
+
+    def __call__(self, o, url, comp, http_method, request):
+        cls = getattr(o, '__class__', type(o))
+
+        try:
+            table = self.tables[cls]
+        except KeyError:
+            table = self.tables[cls] = self.get_table(cls)
+
+        if table is None:
+            return self.generic(o, url, comp, http_method, request)
+
+        env = {'self': o, 'url': url, 'comp': comp, 'http_method': http_method, 'request': request}
+        matching = [route for route in table if (route[1] is None) or eval(route[1], route[2], env)]
+        if not matching:
+            return self.generic(o, url, comp, http_method, request)
+
+        # The first matching route must be more specific than all the others
+        cls, code, _, view = matching[0]
+        for other_cls, other_code, _, _ in matching[1:]:
+            if not dispatch.is_subclass(cls, (other_cls,)) or ((cls is other_cls) and ((code is None) or (other_code is not None))):
+                return self.generic(o, url, comp, http_method, request)
+
+        return view(o, url, comp, http_method, request)
+
 
-    return when(init, cond)
+# The URLs are resolved through a precompiled routes table
+cached_init = RoutesTable(init)
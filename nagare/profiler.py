@@ -0,0 +1,185 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Profile of the rendering of the components views
+
+When a renderer has a ``Profile`` object, each component rendered records, for
+its class and the model of its view:
+
+  - the rendering time, including the views of its inner components (total)
+    and without them (exclusive)
+  - the number of tags generated by the view, without the tags of its inner
+    components
+  - the number of callbacks registered by the view, without the ones of its
+    inner components
+
+The profiles of the requests are aggregated by the ``Statistics`` object of
+the application (``profile_views`` parameter), displayed into the
+administrative interface, or sent into the ``X-Nagare-Profile`` header to the
+requests with this header (``profile_header`` parameter)
+"""
+
+import threading
+from timeit import default_timer
+
+from lxml import etree as ET
+
+from nagare.namespaces import stringbuilder
+
+# Name of the HTTP header requesting, and receiving, the profile of a request
+HEADER = 'X-Nagare-Profile'
+
+
+def count_tags(output):
+    """Return the number of tags of a rendered tree
+
+    In:
+      - ``output`` -- the rendered tree
+
+    Return:
+      - the number of tags
+    """
+    if isinstance(output, ET._Element):
+        return sum(1 for _ in output.iter(tag=ET.Element))
+
+    if isinstance(output, stringbuilder.Tag):
+        # Light tag of the string builder renderer
+        return count_tags(output._element) if output._element is not None else 1 + count_tags(output._children)
+
+    if isinstance(output, (list, tuple)):
+        return sum(count_tags(child) for child in output)
+
+    return 0
+
+
+def get_name(o, model):
+    """Return the name of a view
+
+    In:
+      - ``o`` -- the rendered object
+      - ``model`` -- the model of the view
+
+    Return:
+      - ``<module>.<class>`` for the default view, else ``<module>.<class>:<model>``
+    """
+    cls = getattr(o, '__class__', type(o))
+    name = cls.__module__ + '.' + cls.__name__
+
+    # The ``0`` model of a component is its default view
+    return name if model in (None, 0) else '%s:%s' % (name, model)
+
+
+class Profile(object):
+    """Profile of the components rendered during a request
+    """
+    def __init__(self):
+        self.views = {}  # View name -> [number of renderings, total time, exclusive time, tags, callbacks]
+        self.callbacks = []  # Ids of the registered callbacks
+        self.frames = []  # For each component being rendered: [start time, children time, children tags, children callbacks, number of callbacks]
+
+    def start(self):
+        """A component starts to be rendered
+        """
+        self.frames.append([default_timer(), 0., 0, 0, len(self.callbacks)])
+
+    def abort(self):
+        """The rendering of a component failed
+
+        Its frame is discarded: the time spent stays into the exclusive time of its parent
+        """
+        self.frames.pop()
+
+    def stop(self, o, model, output):
+        """A component was rendered
+
+        In:
+          - ``o`` -- the rendered object
+          - ``model`` -- the model of the view
+          - ``output`` -- the rendered tree
+        """
+        start, children_time, children_tags, children_callbacks, nb_callbacks = self.frames.pop()
+        total = default_timer() - start
+
+        # The tree of a view includes the trees of its inner components
+        tags = count_tags(output)
+        callbacks = len(self.callbacks) - nb_callbacks
+
+        if self.frames:
+            frame = self.frames[-1]
+            frame[1] += default_timer() - start
+            frame[2] += tags
+            frame[3] += callbacks
+
+        name = get_name(o, model)
+        view = self.views.get(name)
+        if view is None:
+            view = self.views[name] = [0, 0., 0., 0, 0]
+
+        view[0] += 1
+        view[1] += total
+        view[2] += total - children_time
+        view[3] += tags - children_tags
+        view[4] += callbacks - children_callbacks
+
+    def format(self):
+        """Format the profile for the HTTP header
+
+        Return:
+          - the views, sorted by decreasing exclusive time, with their times in milliseconds
+        """
+        views = sorted(self.views.items(), key=lambda view: -view[1][2])
+
+        return ', '.join(
+            '%s; nb=%d; total=%.3f; exclusive=%.3f; tags=%d; callbacks=%d' % (name, nb, total * 1000, exclusive * 1000, tags, callbacks)
+            for name, (nb, total, exclusive, tags, callbacks) in views
+        )
+
+
+class Statistics(object):
+    """Profiles of the views aggregated over the requests
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Forget all the profiles"""
+        with self.lock:
+            self.nb_requests = 0
+            self.views = {}  # View name -> [number of renderings, total time, exclusive time, tags, callbacks]
+
+    def add(self, profile):
+        """Aggregate the profile of a request
+
+        In:
+          - ``profile`` -- the ``Profile`` object
+        """
+        with self.lock:
+            self.nb_requests += 1
+
+            for name, values in profile.views.items():
+                view = self.views.get(name)
+                if view is None:
+                    self.views[name] = values[:]
+                else:
+                    view[:] = [value1 + value2 for value1, value2 in zip(view, values)]
+
+    def get_views(self):
+        """Return the aggregated profiles of the views
+
+        Return:
+          - tuple (number of requests, list of tuples (view name, number of renderings,
+            total time, exclusive time, tags, callbacks), sorted by decreasing exclusive time)
+        """
+        with self.lock:
+            views = [(name,) + tuple(values) for name, values in self.views.items()]
+            nb_requests = self.nb_requests
+
+        views.sort(key=lambda view: -view[3])
+        return nb_requests, views
@@ -11,22 +11,11 @@
 
 import random
 
-from paste import fileapp, httpexceptions, urlmap
+from paste import urlmap
 import configobj
 
 from nagare import config
-
-
-def serve_file(filename):
-    """Create a WSGI application that return a static file
-
-   In:
-     - ``filename`` -- path of the file to serve
-
-   Return:
-     - a WSGI application
-   """
-    return httpexceptions.HTTPNotFound() if filename is None else fileapp.FileApp(filename)
+from nagare.publishers import static
 
 
 class Publisher(object):
@@ -61,18 +50,19 @@ class Publisher(object):
        """
         return [(app, app_path, app_urls) for app, (app_path, app_urls) in self.apps.iteritems()]
 
-    def register_static(self, name, get_file):
+    def register_static(self, name, get_file, max_age=None):
         """Register a WSGI application to serve static contents
 
        In:
          - ``name`` -- the URL of the contents will be prefix by ``/static/<name>/``
          - ``get_file`` -- function that will received the URL of the static content
            and will return its filename
+         - ``max_age`` -- expiration time of the contents, in seconds (``None``: no expiration)
 
        Return:
          - URL prefix (``/static/<name>/``)
        """
-        self.urls['/static/' + name] = lambda environ, start_response: serve_file(get_file(environ['PATH_INFO']))(environ, start_response)
+        self.urls['/static/' + name] = static.StaticFiles(get_file, max_age)
 
         return '/static/' + name + '/'
 
@@ -56,13 +56,14 @@ class Publisher(common.Publisher, fcgi_fork.WSGIServer):
         self.on_new_process()
         super(Publisher, self)._child(sock, parent)
 
-    def register_static(self, name, get_file):
+    def register_static(self, name, get_file, max_age=None):
         """Register a WSGI application to serve static contents
 
         In:
           - ``name`` -- the URL of the contents will be prefix by ``/static/<name>/``
           - ``get_file`` -- function that will received the URL of the static content
             and will return its filename
+          - ``max_age`` -- expiration time of the contents, in seconds (``None``: no expiration)
 
         Return:
           - URL prefix (``/static/<name>/``)
@@ -0,0 +1,324 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""WSGI application serving the static contents
+
+  - an in-memory index keeps the metadata of the files, and the content of
+    the small ones. An entry is checked again, at most each ``check_interval``
+    seconds, and discarded when its file is modified
+  - the ``Last-Modified`` and ``ETag`` headers are sent and the conditional
+    requests are answered by a "304 Not Modified"
+  - the single byte ranges requests are answered by a "206 Partial Content"
+  - the precompressed ``.gz`` sibling of a file is sent if the browser accepts
+    the ``gzip`` encoding
+  - the large files are sent through the ``wsgi.file_wrapper`` of the
+    publisher (``sendfile()`` for the publishers supporting it)
+"""
+
+import os
+import time
+import mimetypes
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+from nagare.etags import etag_matches
+from nagare.compression import negotiate_encoding
+from nagare.sessions.lru_dict import ThreadSafeLRUDict
+
+# Size of the blocks read from the large files
+BLOCK_SIZE = 64 * 1024
+
+
+def parse_range(range_, size):
+    """Parse the ``Range`` header of a request
+
+    In:
+      - ``range_`` -- value of the ``Range`` header
+      - ``size`` -- size of the file
+
+    Return:
+      - tuple (first byte, last byte excluded) (``None`` if not a valid single bytes
+        range, ``False`` if the range can't be satisfied)
+    """
+    unit, _, byte_range = range_.partition('=')
+    if (unit.strip().lower() != 'bytes') or (',' in byte_range):
+        return None
+
+    start, dash, end = byte_range.strip().partition('-')
+    if not dash:
+        return None
+
+    try:
+        if not start:
+            # The last bytes
+            length = int(end)
+            return (max(size - length, 0), size) if length and size else False
+
+        start = int(start)
+        end = (int(end) + 1) if end else size
+    except ValueError:
+        return None
+
+    if start >= size:
+        return False
+
+    return (start, min(end, size)) if end > start else None
+
+
+def read_file(f, length):
+    """Generate the content of a file, block by block
+
+    In:
+      - ``f`` -- the file, at the position of its first byte to send
+      - ``length`` -- number of bytes to send
+
+    Return:
+      - generator of the blocks of the file
+    """
+    try:
+        while length > 0:
+            block = f.read(min(length, BLOCK_SIZE))
+            if not block:
+                break
+
+            length -= len(block)
+            yield block
+    finally:
+        f.close()
+
+
+class StaticFile(object):
+    """Metadata, and content of the small ones, of a static file
+    """
+    def __init__(self, filename, max_size, with_variants=True):
+        """Initialization
+
+        In:
+          - ``filename`` -- path of the file
+          - ``max_size`` -- the files smaller than this size, in bytes, are kept in memory
+          - ``with_variants`` -- look for the precompressed sibling of the file?
+        """
+        stat = os.stat(filename)
+
+        self.filename = filename
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+        self.checked = time.time()
+
+        self.content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.etag = '"%x-%x"' % (int(self.mtime * 1000), self.size)
+
+        self.content = None
+        if self.size <= max_size:
+            with open(filename, 'rb') as f:
+                self.content = f.read()
+
+        self.gzip = None
+        if with_variants and self.has_gzip_variant():
+            self.gzip = StaticFile(filename + '.gz', max_size, False)
+            self.gzip.content_type = self.content_type
+
+    def has_gzip_variant(self):
+        """Has the file an up-to-date precompressed sibling?
+
+        Return:
+          - a boolean
+        """
+        filename = self.filename + '.gz'
+        return os.path.isfile(filename) and (os.path.getmtime(filename) >= self.mtime)
+
+    def is_valid(self):
+        """Is this entry always valid?
+
+        Return:
+          - a boolean, ``False`` if the file or its precompressed sibling were
+            modified, created or deleted
+        """
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+
+        if (stat.st_mtime != self.mtime) or (stat.st_size != self.size):
+            return False
+
+        return self.gzip.is_valid() if self.gzip is not None else not self.has_gzip_variant()
+
+    def get_content(self, start, end, file_wrapper=None):
+        """Return the content of the file
+
+        In:
+          - ``start`` -- first byte to send
+          - ``end`` -- last byte to send, excluded
+          - ``file_wrapper`` -- the ``wsgi.file_wrapper`` of the publisher
+
+        Return:
+          - iterable of the blocks of the content
+        """
+        if self.content is not None:
+            return [self.content[start:end]]
+
+        f = open(self.filename, 'rb')
+        if (file_wrapper is not None) and (start == 0) and (end == self.size):
+            return file_wrapper(f, BLOCK_SIZE)
+
+        f.seek(start)
+        return read_file(f, end - start)
+
+
+class StaticFiles(object):
+    """WSGI application serving static files
+    """
+    def __init__(self, get_file, max_age=None, max_size=32 * 1024, max_files=1000, check_interval=1.):
+        """Initialization
+
+        In:
+          - ``get_file`` -- function that will received the URL of the static content
+            and will return its filename
+          - ``max_age`` -- expiration time of the files, in seconds (``None``: no expiration)
+          - ``max_size`` -- the files smaller than this size, in bytes, are kept in memory
+          - ``max_files`` -- maximum number of files into the index
+          - ``check_interval`` -- time, in seconds, during which a file is not checked again
+        """
+        self.get_file = get_file
+        self.max_age = max_age
+        self.max_size = max_size
+        self.check_interval = check_interval
+
+        self.files = ThreadSafeLRUDict(max_files)  # URL -> ``StaticFile``
+
+    def get(self, path):
+        """Return the index entry of a file
+
+        In:
+          - ``path`` -- URL of the file
+
+        Return:
+          - the ``StaticFile`` object (``None`` if not found)
+        """
+        try:
+            entry = self.files[path]
+        except KeyError:
+            entry = None
+
+        now = time.time()
+        if (entry is not None) and (((now - entry.checked) < self.check_interval) or entry.is_valid()):
+            entry.checked = now
+            return entry
+
+        filename = self.get_file(path)
+        try:
+            entry = None if filename is None else StaticFile(filename, self.max_size)
+        except (IOError, OSError):
+            entry = None
+
+        if entry is not None:
+            self.files[path] = entry
+        elif path in self.files:
+            del self.files[path]
+
+        return entry
+
+    @staticmethod
+    def not_modified(environ, entry):
+        """Has the browser an up-to-date copy of the file?
+
+        In:
+          - ``environ`` -- dictionary of the received elements
+          - ``entry`` -- the ``StaticFile`` object
+
+        Return:
+          - a boolean
+        """
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return etag_matches(entry.etag, if_none_match)
+
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            date = parsedate_tz(if_modified_since.split(';')[0])
+            return (date is not None) and (int(entry.mtime) <= mktime_tz(date))
+
+        return False
+
+    @staticmethod
+    def error(start_response, status, headers=()):
+        """Send an error response
+
+        In:
+          - ``start_response`` -- callback to send the headers to the browser
+          - ``status`` -- the HTTP status
+          - ``headers`` -- additional headers
+
+        Return:
+          - the content to send back to the browser
+        """
+        start_response(status, [('Content-Type', 'text/plain'), ('Content-Length', str(len(status)))] + list(headers))
+        return [status]
+
+    def __call__(self, environ, start_response):
+        """WSGI interface
+
+        In:
+          - ``environ`` -- dictionary of the received elements
+          - ``start_response`` -- callback to send the headers to the browser
+
+        Return:
+          - the content to send back to the browser
+        """
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            return self.error(start_response, '405 Method Not Allowed', [('Allow', 'GET, HEAD')])
+
+        entry = self.get(environ.get('PATH_INFO', ''))
+        if entry is None:
+            return self.error(start_response, '404 Not Found')
+
+        headers = [('Accept-Ranges', 'bytes')]
+        if self.max_age is not None:
+            headers.append(('Cache-Control', 'public, max-age=%d' % self.max_age))
+
+        range_ = environ.get('HTTP_RANGE')
+
+        if entry.gzip is not None:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+            # The byte ranges are always relative to the uncompressed file
+            encoding = negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+            if not range_ and encoding and (encoding[0] == 'gzip'):
+                entry = entry.gzip
+                headers.append(('Content-Encoding', 'gzip'))
+
+        headers.extend((('Last-Modified', entry.last_modified), ('ETag', entry.etag)))
+
+        if self.not_modified(environ, entry):
+            start_response('304 Not Modified', headers)
+            return []
+
+        status = '200 OK'
+        start, end = 0, entry.size
+
+        if_range = environ.get('HTTP_IF_RANGE')
+        if range_ and (not if_range or (if_range in (entry.etag, entry.last_modified))):
+            byte_range = parse_range(range_, entry.size)
+
+            if byte_range is False:
+                headers.extend((('Content-Range', 'bytes */%d' % entry.size), ('Content-Length', '0')))
+                start_response('416 Requested Range Not Satisfiable', headers)
+                return []
+
+            if byte_range is not None:
+                status = '206 Partial Content'
+                start, end = byte_range
+                headers.append(('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, entry.size)))
+
+        headers.extend((('Content-Type', entry.content_type), ('Content-Length', str(end - start))))
+        start_response(status, headers)
+
+        return [] if method == 'HEAD' else entry.get_content(start, end, environ.get('wsgi.file_wrapper'))
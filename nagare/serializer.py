@@ -14,8 +14,29 @@ from lxml import etree
 import peak.rules
 import lxml.html
 
+from nagare import dispatch
 from nagare.namespaces import xml, xhtml_base
 
+CHUNK_SIZE = 16384  # Minimum size of the chunks of a streamed content
+STREAM_DEPTH = 6    # The subtrees below this depth are serialized in one chunk
+
+
+def is_compact(output):
+    """Is a tree to be serialized in compact HTML?
+
+    In compact HTML, the tree is not indented and the XHTML namespace is not
+    removed (the renderers build trees without namespace and the XHTML
+    templates are cleaned once when parsed)
+
+    In:
+      - ``output`` -- the tree
+
+    Return:
+      - boolean (the ``compact_output`` attribute of the response)
+    """
+    response = getattr(getattr(output, 'renderer', None), 'response', None)
+    return getattr(response, 'compact_output', False)
+
 
 @peak.rules.abstract
 def serialize(output, content_type, doctype, declaration):
@@ -53,6 +74,9 @@ def serialize(next_method, output, content_type, doctype, declaration):
     if content_type == 'application/xhtml+xml':
         # The browser accepts XHTML
         output = next_method(output, content_type, doctype, declaration)[1]
+    elif is_compact(output):
+        # The browser only accepts HTML, generated without indentation
+        output = output.write_htmlstring(doctype=doctype if declaration else None)
     else:
         # The browser only accepts HTML
         lxml.html.xhtml_to_html(output)
@@ -142,7 +166,7 @@ def serialize(output, content_type, doctype, declaration):
     Return:
       - a tuple (content_type, content)
     """
-    return serialize(output.encode('utf-8'), content_type, doctype, declaration)
+    return cached_serialize(output.encode('utf-8'), content_type, doctype, declaration)
 
 
 @peak.rules.when(serialize, ((list, tuple),))
@@ -161,7 +185,129 @@ def serialize(output, content_type, doctype, declaration):
     if not output:
         return content_type, ''
 
-    first = serialize(output[0], content_type, doctype, declaration)[1]
-    second = ''.join(serialize(e, content_type, doctype, False)[1] for e in output[1:])
+    contents = [cached_serialize(output[0], content_type, doctype, declaration)[1]]
+    contents.extend(cached_serialize(e, content_type, doctype, False)[1] for e in output[1:])
+
+    return content_type, ''.join(contents)
+
+
+# The pages are serialized through a per types cache of the generic method
+cached_serialize = dispatch.TypesCache(serialize)
+
+
+# ---------------------------------------------------------------------------
+
+def serialize_stream(output, content_type, doctype, declaration):
+    """Generic method to generate the content for the browser, as chunks
+
+    This default implementation returns the whole content in one chunk
+
+    In:
+      - ``output`` -- the rendered content
+      - ``content_type`` -- the rendered content type
+      - ``doctype`` -- the (optional) doctype
+      - ``declaration`` -- is the XML declaration to be outputed?
+
+    Return:
+      - a tuple (content_type, iterable of the chunks of content)
+    """
+    content_type, content = cached_serialize(output, content_type, doctype, declaration)
+    return content_type, [content]
+
+
+@peak.rules.when(serialize_stream, (xhtml_base._HTMLTag,))
+def serialize_stream(next_method, output, content_type, doctype, declaration):
+    """Generic method to generate a HTML text from a tree, as chunks
+
+    In:
+      - ``output`` -- the rendered content
+      - ``content_type`` -- the rendered content type
+      - ``doctype`` -- the (optional) doctype
+      - ``declaration`` -- is the XML declaration to be outputed?
+
+    Return:
+      - a tuple (content_type, generator of the chunks of content)
+    """
+    if content_type == 'application/xhtml+xml':
+        # The XHTML is not streamed
+        return next_method(output, content_type, doctype, declaration)
+
+    if 'xmlns' in output.attrib:
+        # Let ``lxml`` generate the correct namespaces
+        del output.attrib['xmlns']
+
+    if not is_compact(output):
+        lxml.html.xhtml_to_html(output)
+
+    return content_type, stream_html(output.decorate_error(), doctype if declaration else None)
+
+
+class _Chunks(list):
+    """File-like object collecting the serialized content"""
+    size = 0
+
+    def write(self, data):
+        self.append(data)
+        self.size += len(data)
+
+    def pop_chunk(self):
+        chunk = ''.join(self)
+
+        del self[:]
+        self.size = 0
+
+        return chunk
+
+
+def _write_html(f, element, depth):
+    """Incrementally write a tree
+
+    In:
+      - ``f`` -- the ``lxml`` incremental HTML writer
+      - ``element`` -- the root of the tree
+      - ``depth`` -- depth under which the subtrees are written in one step
+
+    Return:
+      - generator, iterating after each written subtree
+    """
+    tag = element.tag
+    if depth and len(element) and isinstance(tag, basestring) and not tag.startswith('{'):
+        with f.element(tag, dict(element.attrib)):
+            if element.text:
+                f.write(element.text)
+
+            for child in element:
+                for _ in _write_html(f, child, depth - 1):
+                    yield
+
+        if element.tail:
+            f.write(element.tail)
+    else:
+        # Comments, processing instructions, namespaced or small trees
+        f.write(element)
+
+    yield
+
+
+def stream_html(output, doctype):
+    """Generate a HTML text from a tree, by chunks of at least ``CHUNK_SIZE`` bytes
+
+    In:
+      - ``output`` -- the tree
+      - ``doctype`` -- the (optional) doctype
+
+    Return:
+      - generator of the chunks of HTML
+    """
+    chunks = _Chunks()
+
+    with etree.htmlfile(chunks, encoding='utf-8', buffered=False) as f:
+        if doctype:
+            f.write_doctype(doctype)
+
+        for _ in _write_html(f, output, STREAM_DEPTH):
+            if chunks.size >= CHUNK_SIZE:
+                yield chunks.pop_chunk()
 
-    return content_type, first + second
+    if chunks:
+        yield chunks.pop_chunk()
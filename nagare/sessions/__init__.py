@@ -18,3 +18,10 @@ class SessionSecurityError(LookupError):
     """Raised when the secure id of a session is not valid
     """
     pass
+
+
+class SessionBusyError(Exception):
+    """Raised when the lock of a session can't be acquired in time or when
+    too many requests are already waiting for it
+    """
+    pass
@@ -9,13 +9,15 @@
 
 """Base classes for the sessions management"""
 
+import time
 import random
+import threading
 
 import configobj
 
 from nagare import config
 from nagare.admin import reference
-from nagare.sessions import SessionSecurityError, serializer
+from nagare.sessions import SessionSecurityError, SessionBusyError, serializer
 
 
 class State(object):
@@ -39,6 +41,24 @@ class State(object):
 
         self.back_used = False  # Is this state a snapshot of a previous objects graph?
         self.lock = (sessions_manager.create_lock if state_id is None else sessions_manager.get_lock)(self.session_id)
+        self.locked = False
+        self.shared = False  # Is the state concurrently accessed by read-only requests?
+        self.lock_wait_time = 0.  # Time waited to acquire the lock, in seconds
+
+        # A new session is only created when its first state is stored
+        self.is_new = state_id is None
+        self.referenced = False  # Were the session and state ids sent to the client?
+        self.security_cookie = None  # (request, response) to set the security cookie of a new session
+        self.callbacks = {}  # Callbacks of the objects graph of this state
+        self.placeholders = None  # (session id, state id) rendered instead of the real ids (see ``nagare.views_cache``)
+
+    def get_rendered_ids(self):
+        """Return the session and state ids to render into the links and the forms
+
+        Return:
+          - tuple (session id, state id)
+        """
+        return self.placeholders or (self.session_id, self.state_id)
 
     def sessionid_in_url(self, request, response):
         """Return the session and states ids to put into an URL
@@ -51,7 +71,9 @@ class State(object):
           - session id parameter
           - state id parameter
         """
-        return self.sessions_manager.sessionid_in_url(self.session_id, self.state_id, request, response)
+        self.referenced = True
+        session_id, state_id = self.get_rendered_ids()
+        return self.sessions_manager.sessionid_in_url(session_id, state_id, request, response)
 
     def sessionid_in_form(self, h, request, response):
         """Return the DOM tree to merge into a form, to add the session and state hidden ids
@@ -64,17 +86,38 @@ class State(object):
         Return:
           - the DOM tree
         """
-        return self.sessions_manager.sessionid_in_form(self.session_id, self.state_id, h, request, response)
+        self.referenced = True
+        session_id, state_id = self.get_rendered_ids()
+        return self.sessions_manager.sessionid_in_form(session_id, state_id, h, request, response)
 
-    def acquire(self):
+    def acquire(self, shared=False):
         """Lock the state
+
+        The session of a new state is not yet known by anybody so it's not locked
+
+        Raise ``SessionBusyError`` if the lock can't be acquired
+
+        In:
+          - ``shared`` -- can the session be shared with the other read-only requests?
+            Only possible if the lock and the serializer of the session manager allow it
         """
-        self.lock.acquire()  # Lock the session
+        if self.is_new:
+            return
+
+        self.shared = shared and self.sessions_manager.is_shared_access_allowed(self.lock)
+        self.lock_wait_time = self.sessions_manager.acquire_lock(self.lock, self.shared)
+        self.locked = True
 
     def release(self):
         """Release the state
         """
-        self.lock.release()  # Release the session
+        if self.locked:
+            if self.shared:
+                self.lock.release_shared()
+            else:
+                self.lock.release()  # Release the session
+
+            self.locked = False
 
     def get_root(self):
         """Retrieve the objects graph of this state
@@ -84,7 +127,6 @@ class State(object):
         """
         if self.state_id is None:
             # New state
-            self.sessions_manager.create(self.session_id, self.secure_id, self.lock)
             self.state_id = 0
             data = None
         else:
@@ -97,6 +139,12 @@ class State(object):
                 self.back_used = (self.state_id != new_state_id - 1)
                 self.state_id = new_state_id
 
+            if self.shared:
+                # Each concurrent read-only request stores its objects graph into its own new state
+                self.state_id = self.sessions_manager.reserve_state_id(self.session_id)
+
+            self.callbacks = data[1]
+
         return data
 
     def set_root(self, use_same_state, data):
@@ -106,18 +154,60 @@ class State(object):
           - ``use_same_state`` -- is the objects graph to be stored in this state or in a new one?
           - ``data`` -- the objects graph
         """
-        self.sessions_manager.set_root(self.session_id, self.state_id, self.secure_id, self.use_same_state or use_same_state, data)
+        if self.is_new:
+            # First stored state of a new session
+            self.sessions_manager.create(self.session_id, self.secure_id, self.lock)
+            self.is_new = False
+
+            if self.security_cookie:
+                self.sessions_manager.set_security_cookie(self.secure_id, *self.security_cookie)
+
+        # A reserved state is used as-is
+        use_same_state = self.use_same_state or use_same_state or self.shared
+        self.sessions_manager.set_root(self.session_id, self.state_id, self.secure_id, use_same_state, data)
 
     def delete(self):
         """Delete the session of this state
         """
-        self.sessions_manager.delete(self.session_id)
+        if not self.is_new:
+            self.sessions_manager.delete(self.session_id)
+
+
+class LockStatistics(object):
+    """Wait times to acquire the sessions locks
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.nb = 0  # Number of acquired locks
+        self.nb_busy = 0  # Number of rejected requests
+        self.total_wait_time = 0.
+        self.max_wait_time = 0.
+
+    def add(self, wait_time, acquired):
+        """Record a lock acquisition
+
+        In:
+          - ``wait_time`` -- time waited, in seconds
+          - ``acquired`` -- was the lock acquired?
+        """
+        with self.lock:
+            if acquired:
+                self.nb += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            else:
+                self.nb_busy += 1
 
 
 class Sessions(object):
     """The sessions managers
     """
     spec = {
+        'lock_max_wait_time': 'float(default=0.)',
+        'lock_max_waiters': 'integer(default=0)',
         'security_cookie_httponly': 'boolean(default=True)',
         'security_cookie_name': 'string(default="_nagare")',
         'security_cookie_secure': 'boolean(default=False)',
@@ -133,12 +223,15 @@ class Sessions(object):
         security_cookie_httponly=True,
         security_cookie_name='_nagare',
         security_cookie_secure=False,
-        serializer=serializer.Dummy, pickler=None, unpickler=None
+        serializer=serializer.Dummy, pickler=None, unpickler=None,
+        lock_max_wait_time=0, lock_max_waiters=0
     ):
         """Initialization
 
         In:
           - ``states_history`` -- are all the states kept or only the latest?
+          - ``lock_max_wait_time`` -- maximum time to wait to acquire a session lock, in seconds (0 = no limit)
+          - ``lock_max_waiters`` -- maximum number of requests waiting for a session lock (0 = no limit)
           - ``security_cookie_name`` -- name of the cookie where the session secure id is stored
           - ``serializer`` -- serializer / deserializer of the states
           - ``pickler`` -- pickler used by the serializer
@@ -149,6 +242,9 @@ class Sessions(object):
         self.security_cookie_name = security_cookie_name
         self.security_cookie_secure = security_cookie_secure
         self.serializer = serializer(pickler, unpickler)
+        self.lock_max_wait_time = lock_max_wait_time
+        self.lock_max_waiters = lock_max_waiters
+        self.lock_statistics = LockStatistics()
 
     def set_config(self, filename, conf, error):
         """Read the configuration parameters
@@ -164,6 +260,8 @@ class Sessions(object):
 
         self.states_history = conf['states_history']
         self.security_cookie_name = conf['security_cookie_name']
+        self.lock_max_wait_time = conf['lock_max_wait_time']
+        self.lock_max_waiters = conf['lock_max_waiters']
 
         pickler = reference.load_object(conf['pickler'])[0]
         unpickler = reference.load_object(conf['unpickler'])[0]
@@ -255,17 +353,36 @@ class Sessions(object):
                     break
 
         secure_id = None
+        security_cookie = None
         if self.security_cookie_name:
             secure_id = request.cookies.get(self.security_cookie_name)
             if not secure_id:
                 secure_id = str(random.randint(1000000000000000, 9999999999999999))
-                response.set_cookie(
-                    self.security_cookie_name, secure_id, path=request.script_name + '/',
-                    secure=self.security_cookie_secure,
-                    httponly=self.security_cookie_httponly
-                )
 
-        return State(self, session_id, state_id, secure_id, use_same_state or not self.states_history)
+                if state_id is None:
+                    # The cookie will be set only if the new session is created
+                    security_cookie = (request, response)
+                else:
+                    self.set_security_cookie(secure_id, request, response)
+
+        state = State(self, session_id, state_id, secure_id, use_same_state or not self.states_history)
+        state.security_cookie = security_cookie
+
+        return state
+
+    def set_security_cookie(self, secure_id, request, response):
+        """Send the secure id of a session into a cookie
+
+        In:
+          - ``secure_id`` -- the secure number associated to the session
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+        """
+        response.set_cookie(
+            self.security_cookie_name, secure_id, path=request.script_name + '/',
+            secure=self.security_cookie_secure,
+            httponly=self.security_cookie_httponly
+        )
 
     def get_root(self, session_id, state_id):
         """Retrieve the objects graph of a state
@@ -319,6 +436,54 @@ class Sessions(object):
         """
         raise NotImplementedError()
 
+    def acquire_lock(self, lock, shared):
+        """Acquire the lock of a session
+
+        A lock can reject the request (``acquire()`` returning ``False``) if it
+        can't be acquired in time or if too many requests are waiting for it
+
+        In:
+          - ``lock`` -- the lock of the session
+          - ``shared`` -- acquire the lock for a shared access?
+
+        Return:
+          - the time waited, in seconds
+        """
+        t0 = time.time()
+        acquired = (lock.acquire_shared if shared else lock.acquire)() is not False
+        wait_time = time.time() - t0
+
+        self.lock_statistics.add(wait_time, acquired)
+        if not acquired:
+            raise SessionBusyError()
+
+        return wait_time
+
+    def is_shared_access_allowed(self, lock):
+        """Can the read-only requests concurrently access a session?
+
+        The lock must have ``acquire_shared()`` and ``release_shared()`` methods
+        and each request must work on its own copy of the objects graph
+
+        In:
+          - ``lock`` -- the lock of the session
+
+        Return:
+          - a boolean
+        """
+        return self.serializer.copies and hasattr(lock, 'acquire_shared')
+
+    def reserve_state_id(self, session_id):
+        """Atomically allocate the id of a new state
+
+        In:
+          - ``session_id`` -- session id
+
+        Return:
+          - the new state id
+        """
+        raise NotImplementedError()
+
     def create(self, session_id, secure_id, lock):
         """Create a new session
 
@@ -337,6 +502,30 @@ class Sessions(object):
         """
         raise NotImplementedError()
 
+    def sample_sessions(self, nb):
+        """Return a random sample of the sessions ids
+
+        In:
+          - ``nb`` -- maximum number of sessions ids to return
+
+        Return:
+          - total number of sessions
+          - list of sessions ids
+        """
+        raise NotImplementedError()
+
+    def get_session_states(self, session_id):
+        """Return the raw data of a session, without locking the session
+
+        In:
+          - ``session_id`` -- id of the session
+
+        Return:
+          - data kept into the session
+          - list of the (state id, data kept into the state)
+        """
+        raise NotImplementedError()
+
     def fetch_state(self, session_id, state_id):
         """Retrieve a state with its associated objects graph
 
@@ -78,6 +78,29 @@ class LRUDict(object):
         """
         del self.items[k]
 
+    def __len__(self):
+        return len(self.items)
+
+    def keys(self):
+        """Return the keys, from the last to the most recently used
+
+        Return:
+          - list of the keys
+        """
+        return self.items.keys()
+
+    def peek(self, k, default=None):
+        """Return the value of a key without changing its usage order
+
+        In:
+          - ``k`` -- the key
+          - ``default`` -- value returned if the key doesn't exist
+
+        Return:
+          - the value
+        """
+        return self.items.get(k, default)
+
     def __repr__(self):
         return repr(self.items)
 
@@ -113,6 +136,14 @@ class ThreadSafeLRUDict(LRUDict):
         with self.lock:
             super(ThreadSafeLRUDict, self).__delitem__(k)
 
+    def keys(self):
+        with self.lock:
+            return super(ThreadSafeLRUDict, self).keys()
+
+    def peek(self, k, default=None):
+        with self.lock:
+            return super(ThreadSafeLRUDict, self).peek(k, default)
+
 
 # ----------------------------------------------------------------------------
 
@@ -19,33 +19,127 @@ KEY_PREFIX = 'nagare_%d_'
 
 
 class Lock(object):
-    def __init__(self, connection, lock_id, ttl, poll_time, max_wait_time):
+    def __init__(self, connection, lock_id, ttl, poll_time, max_wait_time, max_waiters=0):
         """Distributed lock in memcache
 
         In:
           - ``connection`` -- connection object to the memcache server
           - ``lock_id`` -- unique lock identifier
-          - ``ttl`` -- session locks timeout, in seconds (0 = no timeout)
+          - ``ttl`` -- session locks timeout, in seconds (0 = no timeout: a request
+            not acquiring the lock in time goes ahead without it)
           - ``poll_time`` -- wait time between two lock acquisition tries, in seconds
-          - ``max_wait_time`` -- maximum time to wait to acquire the lock, in seconds
+          - ``max_wait_time`` -- maximum time to wait to acquire the lock, in seconds (0 = no limit)
+          - ``max_waiters`` -- maximum number of requests waiting for the lock (0 = no limit)
         """
         self.connection = connection
         self.lock = (KEY_PREFIX + 'lock') % lock_id
+        self.readers = (KEY_PREFIX + 'readers') % lock_id
+        self.waiters = (KEY_PREFIX + 'waiters') % lock_id
         self.ttl = ttl
         self.poll_time = poll_time
         self.max_wait_time = max_wait_time
+        self.max_waiters = max_waiters
+
+        self.owned = False  # Was the exclusive access acquired?
+        self.shared = False  # Was a shared access acquired?
+
+    def _wait(self, try_acquire, max_wait_time=None):
+        """Poll the lock until it's acquired
+
+        In:
+          - ``try_acquire`` -- function returning ``True`` when the lock is acquired
+          - ``max_wait_time`` -- maximum time to wait, in seconds (``None``: the one of the lock)
+
+        Return:
+          - was the lock acquired?
+        """
+        if max_wait_time is None:
+            max_wait_time = self.max_wait_time
+
+        if try_acquire():
+            return True
+
+        if self.max_waiters:
+            self.connection.add(self.waiters, 0, self.ttl)
+            if self.connection.incr(self.waiters) > self.max_waiters:
+                self.connection.decr(self.waiters)
+                return False
+
+        try:
+            t0 = time.time()
+            while not max_wait_time or (time.time() < (t0 + max_wait_time)):
+                time.sleep(self.poll_time)
+                if try_acquire():
+                    return True
+
+            return False
+        finally:
+            if self.max_waiters:
+                self.connection.decr(self.waiters)
 
     def acquire(self):
-        """Acquire the lock
+        """Acquire the lock for an exclusive access
+
+        Return:
+          - was the lock acquired?
         """
-        t0 = time.time()
-        while not self.connection.add(self.lock, 1, self.ttl) and (time.time() < (t0 + self.max_wait_time)):
-            time.sleep(self.poll_time)
+        self.owned = self._wait(lambda: self.connection.add(self.lock, 1, self.ttl))
+        if self.owned:
+            # The new readers are blocked by the lock. Then wait for the current ones to finish
+            if self._wait(lambda: not self.connection.get(self.readers)):
+                return True
+
+            self.release()
+
+        # Without timeout, the lock of a crashed request would be kept forever:
+        # the request goes ahead as before the bounded waits
+        return not self.ttl
 
     def release(self):
-        """Release the lock
+        """Release the exclusive access
+
+        The lock is only deleted if owned by this request
         """
-        self.connection.delete(self.lock)
+        if self.owned:
+            self.connection.delete(self.lock)
+            self.owned = False
+
+    def _try_acquire_shared(self):
+        if self.connection.get(self.lock):
+            return False
+
+        # The counter of the readers expires ``ttl`` seconds after the last reader entered,
+        # not to block the writers forever if a reader crashed
+        self.connection.add(self.readers, 0, self.ttl)
+        self.connection.incr(self.readers)
+        if self.ttl:
+            self.connection.touch(self.readers, self.ttl)
+
+        if not self.connection.get(self.lock):
+            return True
+
+        # A writer acquired the lock in the meantime
+        self.connection.decr(self.readers)
+        return False
+
+    def acquire_shared(self, max_wait_time=None):
+        """Acquire the lock for a shared access
+
+        In:
+          - ``max_wait_time`` -- maximum time to wait, in seconds (``None``: the one of the lock)
+
+        Return:
+          - was the lock acquired?
+        """
+        self.shared = self._wait(self._try_acquire_shared, max_wait_time)
+        return self.shared or not self.ttl
+
+    def release_shared(self):
+        """Release a shared access
+        """
+        if self.shared:
+            self.connection.decr(self.readers)
+            self.shared = False
 
 
 class Sessions(common.Sessions):
@@ -56,7 +150,7 @@ class Sessions(common.Sessions):
         host='string(default="127.0.0.1")',
         port='integer(default=11211)',
         ttl='integer(default=0)',
-        lock_ttl='float(default=0.)',
+        lock_ttl='float(default=60.)',
         lock_poll_time='float(default=0.1)',
         lock_max_wait_time='float(default=5.)',
         min_compress_len='integer(default=0)',
@@ -69,7 +163,7 @@ class Sessions(common.Sessions):
         self,
         host='127.0.0.1', port=11211,
         ttl=0,
-        lock_ttl=0, lock_poll_time=0.1, lock_max_wait_time=5,
+        lock_ttl=60, lock_poll_time=0.1, lock_max_wait_time=5,
         min_compress_len=0,
         reset=False,
         debug=True,
@@ -82,21 +176,21 @@ class Sessions(common.Sessions):
           - ``host`` -- address of the memcache server
           - ``port`` -- port of the memcache server
           - ``ttl`` -- sessions and continuations timeout, in seconds (0 = no timeout)
-          - ``lock_ttl`` -- session locks timeout, in seconds (0 = no timeout)
+          - ``lock_ttl`` -- session locks timeout, in seconds (0 = no timeout: the
+            requests not acquiring the lock in time go ahead without it)
           - ``lock_poll_time`` -- wait time between two lock acquisition tries, in seconds
-          - ``lock_max_wait_time`` -- maximum time to wait to acquire the lock, in seconds
+          - ``lock_max_wait_time`` -- maximum time to wait to acquire the lock, in seconds (0 = no limit)
           - ``min_compress_len`` -- data longer than this value are sent compressed
           - ``reset`` -- do a reset of all the sessions on startup ?
           - ``debug`` -- display the memcache requests / responses
           - ``serializer`` -- serializer / deserializer of the states
         """
-        super(Sessions, self).__init__(serializer or Pickle, **kw)
+        super(Sessions, self).__init__(serializer=serializer or Pickle, lock_max_wait_time=lock_max_wait_time, **kw)
 
         self.host = ['%s:%d' % (host, port)]
         self.ttl = ttl
         self.lock_ttl = lock_ttl
         self.lock_poll_time = lock_poll_time
-        self.lock_max_wait_time = lock_max_wait_time
         self.min_compress_len = min_compress_len
         self.debug = debug
 
@@ -117,7 +211,7 @@ class Sessions(common.Sessions):
         self.host = ['%s:%d' % (conf['host'], conf['port'])]
 
         for arg_name in (
-            'ttl', 'lock_ttl', 'lock_poll_time', 'lock_max_wait_time',
+            'ttl', 'lock_ttl', 'lock_poll_time',
             'min_compress_len', 'debug'
         ):
             setattr(self, arg_name, conf[arg_name])
@@ -158,7 +252,22 @@ class Sessions(common.Sessions):
           - the lock
         """
         connection = self._get_connection()
-        return Lock(connection, session_id, self.lock_ttl, self.lock_poll_time, self.lock_max_wait_time)
+        return Lock(connection, session_id, self.lock_ttl, self.lock_poll_time, self.lock_max_wait_time, self.lock_max_waiters)
+
+    def reserve_state_id(self, session_id):
+        """Atomically allocate the id of a new state
+
+        In:
+          - ``session_id`` -- session id
+
+        Return:
+          - the new state id
+        """
+        state_id = self._get_connection().incr((KEY_PREFIX + 'state') % session_id)
+        if state_id is None:
+            raise ExpirationError()
+
+        return state_id - 1
 
     def create(self, session_id, secure_id, lock):
         """Create a new session
@@ -14,6 +14,8 @@ These sessions managers keep:
   - for each session, the last recently used ``DEFAULT_NB_STATES`` states
 """
 
+import random
+
 from nagare import local
 from nagare.sessions import ExpirationError, common, lru_dict
 from nagare.sessions.serializer import Pickle
@@ -79,7 +81,7 @@ class Sessions(common.Sessions):
         Return:
           - the lock
         """
-        return local.worker.create_lock()
+        return local.worker.create_lock(self.lock_max_wait_time, self.lock_max_waiters)
 
     def get_lock(self, session_id):
         """Retrieve the lock of a session
@@ -95,6 +97,23 @@ class Sessions(common.Sessions):
         except KeyError:
             raise ExpirationError()
 
+    def reserve_state_id(self, session_id):
+        """Atomically allocate the id of a new state
+
+        In:
+          - ``session_id`` -- session id
+
+        Return:
+          - the new state id
+        """
+        with self._sessions.lock:
+            session = self._sessions.peek(session_id)
+            if session is None:
+                raise ExpirationError()
+
+            session[0] += 1
+            return session[0] - 1
+
     def create(self, session_id, secure_id, lock):
         """Create a new session
 
@@ -113,6 +132,41 @@ class Sessions(common.Sessions):
         """
         del self._sessions[session_id]
 
+    def sample_sessions(self, nb):
+        """Return a random sample of the sessions ids
+
+        In:
+          - ``nb`` -- maximum number of sessions ids to return
+
+        Return:
+          - total number of sessions
+          - list of sessions ids
+        """
+        ids = self._sessions.keys()
+        return len(ids), random.sample(ids, min(nb, len(ids)))
+
+    def get_session_states(self, session_id):
+        """Return the raw data of a session
+
+        The list of the states is copied under the sessions lock but, if the
+        states are not serialized, the session lock must be held while their
+        objects graphs are read
+
+        In:
+          - ``session_id`` -- id of the session
+
+        Return:
+          - data kept into the session
+          - list of the (state id, data kept into the state)
+        """
+        with self._sessions.lock:
+            session = self._sessions.peek(session_id)
+            if session is None:
+                raise ExpirationError()
+
+            states = session[4]
+            return session[3], [(state_id, states.peek(state_id)) for state_id in states.keys()]
+
     def fetch_state(self, session_id, state_id):
         """Retrieve a state with its associated objects graph
 
@@ -126,11 +180,13 @@ class Sessions(common.Sessions):
           - data kept into the session
           - data kept into the state
         """
-        try:
-            last_state_id, _, secure_id, session_data, states = self._sessions[session_id]
-            state_data = states[state_id]
-        except KeyError:
-            raise ExpirationError()
+        # The states of a session can be concurrently accessed by read-only requests
+        with self._sessions.lock:
+            try:
+                last_state_id, _, secure_id, session_data, states = self._sessions[session_id]
+                state_data = states[state_id]
+            except KeyError:
+                raise ExpirationError()
 
         return last_state_id, secure_id, session_data, state_data
 
@@ -145,13 +201,14 @@ class Sessions(common.Sessions):
           - ``session_data`` -- data to keep into the session
           - ``state_data`` -- data to keep into the state
         """
-        session = self._sessions[session_id]
+        with self._sessions.lock:
+            session = self._sessions[session_id]
 
-        if not use_same_state:
-            session[0] += 1
+            if not use_same_state:
+                session[0] += 1
 
-        session[3] = session_data
-        session[4][state_id] = state_data
+            session[3] = session_data
+            session[4][state_id] = state_data
 
 
 class SessionsWithPickledStates(Sessions):
@@ -7,17 +7,50 @@
 # this distribution.
 # --
 
+import types
 import cStringIO
 import cPickle
 
+from nagare import state
 from nagare.continuation import Tasklet
 from nagare.component import Component
 
+# Prefix of the persistent ids of the process-global shared objects
+SHARED_PREFIX = '@'
 
-def persistent_id(o, clean_callbacks, callbacks, session_data, tasklets):
+
+def shared_persistent_id(o, transients):
+    """A process-global shared object is only stored by its name
+
+    In:
+      - ``o`` -- object to check
+
+    Out:
+      - ``transients`` -- list of the (object dictionary, name, value) transient
+        attributes removed from the objects
+
+    Return:
+      - the persistent id or ``None``
+    """
+    name = state.get_shared_name(o)
+    if name is not None:
+        return SHARED_PREFIX + name
+
+    # The transient attributes are removed before the object is pickled
+    names = state.transient_attributes(getattr(o, '__class__', type(o)))
+    if names:
+        d = getattr(o, '__dict__', {})
+        transients.extend((d, name, d.pop(name)) for name in names.intersection(d))
+
+    return None
+
+
+def persistent_id(o, clean_callbacks, callbacks, session_data, tasklets, transients):
     """An object with a ``_persistent_id`` attribute is stored into the session
     not into the state snapshot
 
+    A process-global shared object is only stored by its name
+
     In:
       - ``o`` -- object to check
       - ``clean_callbacks`` -- do we have to forget the old callbacks?
@@ -26,11 +59,15 @@ def persistent_id(o, clean_callbacks, callbacks, session_data, tasklets):
       - ``callbacks`` -- merge of the callbacks from all the components
       - ``session_data`` -- dict persistent_id -> object of the objects to store into the session
       - ``tasklets`` -- set of the serialized tasklets
+      - ``transients`` -- list of the (object dictionary, name, value) transient
+        attributes removed from the objects
 
     Return:
       - the persistent id or ``None``
     """
-    r = None
+    r = shared_persistent_id(o, transients)
+    if r is not None:
+        return r
 
     id_ = getattr(o, '_persistent_id', None)
     if id_ is not None:
@@ -46,13 +83,188 @@ def persistent_id(o, clean_callbacks, callbacks, session_data, tasklets):
     return r
 
 
+def persistent_load(id_, session_data):
+    """Retrieve an object not stored into the state snapshot
+
+    In:
+      - ``id_`` -- persistent id of the object
+      - ``session_data`` -- dict persistent_id -> object of the objects stored into the session
+
+    Return:
+      - the object
+    """
+    if id_.startswith(SHARED_PREFIX):
+        return state.get_shared(id_[len(SHARED_PREFIX):])
+
+    return (session_data or {}).get(int(id_))
+
+
+def restore_transients(transients):
+    """Put back the transient attributes removed during a serialization
+
+    The transient attributes are only excluded from the serialized graph,
+    the objects keep them
+
+    In:
+      - ``transients`` -- list of the (object dictionary, name, value) transient
+        attributes removed from the objects
+    """
+    for d, name, value in transients:
+        d[name] = value
+
+
 def set_persistent_id(pickler, persistent_id):
-    if 'inst_persistent_id' in dir(pickler):
+    """Set the persistent id hook of a pickler
+
+    The faster ``inst_persistent_id`` hook of ``cPickle`` is not called for the
+    objects of builtin types, so it's not used when such objects are shared
+
+    In:
+      - ``pickler`` -- the pickler
+      - ``persistent_id`` -- the hook
+    """
+    if ('inst_persistent_id' in dir(pickler)) and not state.has_shared_builtins() and (getattr(pickler, 'persistent_id', None) is None):
         pickler.inst_persistent_id = persistent_id
     else:
         pickler.persistent_id = persistent_id
 
 
+def template_dumps(data):
+    """Serialize an objects graph used as a template
+
+    Contrary to a state, all the objects of a template, even the stateless ones,
+    are copied each time the template is deserialized
+
+    In:
+      - ``data`` -- the objects graph
+
+    Return:
+      - the serialized objects graph
+    """
+    f = cStringIO.StringIO()
+    pickler = cPickle.Pickler(f, protocol=-1)
+
+    transients = []
+    set_persistent_id(pickler, lambda o: shared_persistent_id(o, transients))
+    try:
+        pickler.dump(data)
+    finally:
+        restore_transients(transients)
+
+    return f.getvalue()
+
+
+def template_loads(data):
+    """Create a new objects graph from a template
+
+    In:
+      - ``data`` -- the serialized objects graph
+
+    Return:
+      - the new objects graph
+    """
+    p = cPickle.Unpickler(cStringIO.StringIO(data))
+    p.persistent_load = lambda i: persistent_load(i, None)
+
+    return p.load()
+
+
+def pickled_size(data):
+    """Return the size of a pickled objects graph
+
+    In:
+      - ``data`` -- the objects graph or its pickled string
+
+    Return:
+      - the number of bytes (``None`` if the objects graph can't be pickled)
+    """
+    if isinstance(data, str):
+        return len(data)
+
+    try:
+        return len(cPickle.dumps(data, protocol=-1))
+    except (TypeError, cPickle.PicklingError):
+        return None
+
+
+def _is_instance(o):
+    return hasattr(o, '__dict__') and not isinstance(o, (
+        type, types.ClassType, types.ModuleType,
+        types.FunctionType, types.MethodType, types.BuiltinFunctionType
+    ))
+
+
+def _pickled_size(data, objects):
+    """Return the size of a pickled value, without the objects it references
+
+    In:
+      - ``data`` -- the value
+
+    Out:
+      - ``objects`` -- list of the referenced objects
+
+    Return:
+      - the number of bytes
+    """
+    def persistent_id(o):
+        if not _is_instance(o):
+            return None
+
+        # The shared objects and the objects kept into the session are not
+        # part of the state
+        if (state.get_shared_name(o) is None) and (getattr(o, '_persistent_id', None) is None):
+            objects.append(o)
+
+        return '0'
+
+    f = cStringIO.StringIO()
+    pickler = cPickle.Pickler(f, protocol=-1)
+    pickler.persistent_id = persistent_id
+
+    try:
+        pickler.dump(data)
+    except (TypeError, cPickle.PicklingError):
+        return 0
+
+    return len(f.getvalue())
+
+
+def pickled_sizes(data):
+    """Break the pickled size of an objects graph down by class and attribute
+
+    Each attribute is only charged for the data it directly holds. The
+    objects it references are charged to their own classes
+
+    In:
+      - ``data`` -- the objects graph
+
+    Return:
+      - dict (class name, attribute name) -> (number of instances, number of bytes)
+    """
+    sizes = {}
+
+    objects = []
+    _pickled_size(data, objects)
+
+    seen = set()
+    while objects:
+        o = objects.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+
+        cls = o.__class__
+        class_name = cls.__module__ + '.' + cls.__name__
+        transients = state.transient_attributes(cls)
+
+        for name, value in o.__dict__.items():
+            if name not in transients:
+                nb, size = sizes.get((class_name, name), (0, 0))
+                sizes[(class_name, name)] = (nb + 1, size + _pickled_size(value, objects))
+
+    return sizes
+
+
 class DummyFile(object):
     """A write-only file that does nothing"""
     def write(self, data):
@@ -60,6 +272,8 @@ class DummyFile(object):
 
 
 class Dummy(object):
+    copies = False  # Does each deserialization create a new objects graph?
+
     def __init__(self, pickler=None, unpickler=None):
         """Initialization
 
@@ -84,10 +298,14 @@ class Dummy(object):
         session_data = {}
         tasklets = set()
         callbacks = {}
+        transients = []
 
         # Serialize the objects graph and extract all the callbacks
-        set_persistent_id(pickler, lambda o: persistent_id(o, clean_callbacks, callbacks, session_data, tasklets))
-        pickler.dump(data)
+        set_persistent_id(pickler, lambda o: persistent_id(o, clean_callbacks, callbacks, session_data, tasklets, transients))
+        try:
+            pickler.dump(data)
+        finally:
+            restore_transients(transients)
 
         return session_data, callbacks, tasklets
 
@@ -123,6 +341,8 @@ class Dummy(object):
 
 
 class Pickle(Dummy):
+    copies = True
+
     def dumps(self, data, clean_callbacks):
         """Serialize an objects graph
 
@@ -162,7 +382,6 @@ class Pickle(Dummy):
           - the callbacks
         """
         p = self.unpickler(cStringIO.StringIO(state_data))
-        if session_data:
-            p.persistent_load = lambda i: session_data.get(int(i))
+        p.persistent_load = lambda i: persistent_load(i, session_data)
 
         return p.load(), p.load()
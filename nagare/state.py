@@ -7,9 +7,15 @@
 # this distribution.
 # --
 
-"""Helper to mark an object as stateless"""
+"""Helpers to control what is kept into the states
+
+  - an object can be marked as stateless
+  - an object can be registered as a process-global shared object
+  - attributes of an object can be declared as transient
+"""
 
 import random
+import inspect
 
 
 def stateless(o):
@@ -41,3 +47,180 @@ def stateful(o):
         del o._persistent_id
 
     return o
+
+
+# ---------------------------------------------------------------------------
+
+# Registry of the process-global shared objects
+_shared_names = {}  # id of the object -> name
+_shared_objects = {}  # name -> object
+_shared_builtins = set()  # Names of the shared objects of builtin types (dict, list, tuple, str ...)
+
+
+def shared(o, name):
+    """Register a process-global shared object
+
+    A shared object is never stored, neither into the states nor into the
+    sessions. Only its name is kept and the object is retrieved from the
+    registry of the current process when a state is restored. So a shared
+    object must be registered, under the same name, by all the processes:
+
+    .. code-block:: python
+
+        RULES = state.shared(compile_rules(), 'myapp.rules')
+
+    In:
+      - ``o`` -- the object
+      - ``name`` -- unique name of the object
+
+    Return:
+      - ``o``
+    """
+    previous_name = _shared_names.get(id(o))
+    if (previous_name is not None) and (previous_name != name):
+        raise ValueError('Object already shared as "%s", can\'t be shared as "%s"' % (previous_name, name))
+
+    unshared(name)
+
+    _shared_names[id(o)] = name
+    _shared_objects[name] = o
+
+    if type(o).__module__ == '__builtin__':
+        _shared_builtins.add(name)
+
+    return o
+
+
+def unshared(name):
+    """Unregister a process-global shared object
+
+    In:
+      - ``name`` -- name of the object
+    """
+    if name in _shared_objects:
+        del _shared_names[id(_shared_objects.pop(name))]
+
+    _shared_builtins.discard(name)
+
+
+def get_shared_name(o):
+    """Return the name of a shared object
+
+    In:
+      - ``o`` -- the object
+
+    Return:
+      - the name of the object or ``None`` if the object is not shared
+    """
+    return _shared_names.get(id(o))
+
+
+def has_shared_builtins():
+    """Are objects of builtin types (dict, list, tuple, str ...) shared?
+
+    Return:
+      - a boolean
+    """
+    return bool(_shared_builtins)
+
+
+def get_shared(name):
+    """Return a shared object
+
+    In:
+      - ``name`` -- name of the object
+
+    Return:
+      - the object
+    """
+    try:
+        return _shared_objects[name]
+    except KeyError:
+        raise LookupError('No shared object registered as "%s"' % name)
+
+
+# ---------------------------------------------------------------------------
+
+class transient(object):
+    """Decorator to declare a derived attribute
+
+    The decorated method is called to compute the value of the attribute on its
+    first access. The value is then cached into the object but is never kept
+    into the states: it's dropped when the state is serialized and computed
+    again on the first access after the state is restored.
+
+    .. code-block:: python
+
+        class Catalog(object):
+            def __init__(self, category):
+                self.category = category
+
+            @state.transient
+            def products(self):
+                return Product.query.filter_by(category=self.category).all()
+    """
+    def __init__(self, f):
+        """Initialization
+
+        In:
+          - ``f`` -- method computing the value of the attribute
+        """
+        self.f = f
+        self.name = f.__name__
+        self.__doc__ = f.__doc__
+
+    def __get__(self, o, cls):
+        """Compute and cache the value of the attribute
+
+        In:
+          - ``o`` -- the object
+          - ``cls`` -- *not used*
+
+        Return:
+          - the value of the attribute
+        """
+        if o is None:
+            return self
+
+        # As this descriptor is a non-data descriptor, the cached value now
+        # shadows it until it's dropped from the object dictionary
+        v = o.__dict__[self.name] = self.f(o)
+        return v
+
+
+# Cache of the transient attributes names
+# dictionary: class -> frozenset of the attributes names
+_transient_attributes = {}
+
+
+def transient_attributes(cls):
+    """Return the names of the attributes, of a class, not to keep into the states
+
+    These attributes are declared with the ``transient`` decorator or listed
+    into a ``__transient__`` class attribute:
+
+    .. code-block:: python
+
+        class Document(object):
+            __transient__ = ('parsed', 'layout')
+
+    In:
+      - ``cls`` -- the class
+
+    Return:
+      - the names of the transient attributes
+    """
+    names = _transient_attributes.get(cls)
+
+    if names is None:
+        names = set()
+
+        for klass in inspect.getmro(cls):
+            ns = vars(klass)
+
+            names.update(ns.get('__transient__', ()))
+            names.update(v.name for v in ns.itervalues() if isinstance(v, transient))
+
+        names = _transient_attributes[cls] = frozenset(names)
+
+    return names
@@ -33,7 +33,9 @@ def search_element(element_name, l):
         if isinstance(element, (etree._Comment, etree._ProcessingInstruction)):
             continue
 
-        if isinstance(element, etree._Element) and element.tag.endswith(element_name):
+        # The light tags of the ``stringbuilder`` renderer have a ``tag`` too
+        tag = getattr(element, 'tag', None)
+        if isinstance(tag, basestring) and tag.endswith(element_name):
             return i + 1, element
 
     return 0, None
@@ -81,6 +83,12 @@ def wrap(content_type, h, content):
 
     head1 = presentation.render(h.head, None, None, None)  # The automatically generated ``<head>``
 
+    if getattr(h.head, 'preload_links', False):
+        # The browser starts to fetch the contents before receiving the ``<head>``
+        link = h.head.get_link_header()
+        if link:
+            h.response.headers.add('Link', link)
+
     url = h.request.upath_info.strip('/')
     if url and not head1.xpath('./link[@rel="canonical"]'):
         head1.append(h.head.link(rel='canonical', href=h.request.uscript_name + '/' + url))
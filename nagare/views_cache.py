@@ -0,0 +1,297 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Cache of the rendered views
+
+A cached view is declared with ``presentation.render_for(cls, model, cache=...)``.
+Its rendered tree is reused as long as the component, the view, the locale and
+the version of the object don't change. ``cache`` is a function
+receiving the object and returning its version or its dependencies, as a
+hashable value. The objects are not tracked: all the data displayed by the view
+must be part of these dependencies
+
+The callbacks registered by a cached view are re-bound to the objects graph of
+the current state. The view is rendered with unique placeholders instead of the
+session and state ids, replaced by the current ids into the links and the forms
+each time the tree is reused
+"""
+
+import copy
+import random
+
+from nagare import local, callbacks
+from nagare.sessions import lru_dict
+from nagare.namespaces import xml
+
+CACHE_ID = '_view_cache_id'  # Attribute where the id of a component is kept
+
+# Maximum number of rendered trees kept in memory
+MAX_VIEWS = 1000
+
+# Placeholders of the session and state ids: random numbers of this number of digits
+PLACEHOLDERS_DIGITS = 18
+
+# Process-global cache: key -> (tree, callbacks ids, rendered placeholders, head declarations)
+cache = lru_dict.ThreadSafeLRUDict(MAX_VIEWS)
+
+
+def clear():
+    """Forget all the cached views"""
+    with cache.lock:
+        cache.items.clear()
+
+
+def get_key(o, renderer, comp, model, version):
+    """Return the cache key of a view
+
+    In:
+      - ``o`` -- the rendered object
+      - ``renderer`` -- the renderer
+      - ``comp`` -- the component
+      - ``model`` -- name of the view
+      - ``version`` -- version or dependencies of the object
+
+    Return:
+      - the key (``None`` if the view can't be cached)
+    """
+    state = getattr(renderer, 'session', None)
+    if not state or (comp is None) or (local.request is None):
+        return None
+
+    from nagare import i18n  # Lazy import to prevent circular references
+
+    locale = i18n.get_locale()
+
+    return (
+        comp.__dict__.setdefault(CACHE_ID, random.getrandbits(64)),
+        model,
+        (getattr(locale, 'language', None), getattr(locale, 'territory', None)),
+        version,
+        getattr(renderer, 'url', None),
+        renderer.__class__,
+        o.__class__
+    )
+
+
+def create_placeholders():
+    """Create the placeholders of the session and state ids
+
+    Return:
+      - tuple (session id placeholder, state id placeholder)
+    """
+    return tuple(random.randrange(10 ** (PLACEHOLDERS_DIGITS - 1), 10 ** PLACEHOLDERS_DIGITS) for i in range(2))
+
+
+def get_ids(renderer, session_id, state_id):
+    """Return the session and state ids put into the links and the forms
+
+    In:
+      - ``renderer`` -- the renderer
+      - ``session_id`` -- the session id
+      - ``state_id`` -- the state id
+
+    Return:
+      - tuple of the ids put into the URLs then of the values put into the forms
+    """
+    state = renderer.session
+    manager = state.sessions_manager
+
+    # The sessions manager is directly called to not mark the state as referenced
+    url_ids = manager.sessionid_in_url(session_id, state_id, renderer.request, renderer.response)
+    form_ids = manager.sessionid_in_form(session_id, state_id, renderer, renderer.request, renderer.response)
+
+    return url_ids + tuple(e.get('value') for e in form_ids)
+
+
+def get_head_declarations(head):
+    """Return the css and javascript declarations of a head renderer
+
+    In:
+      - ``head`` -- the head renderer
+
+    Return:
+      - dictionary of the css and javascript declarations (``None`` if not a head renderer of HTML)
+    """
+    if not hasattr(head, '_named_css'):
+        return None
+
+    return {
+        'css': dict(head._named_css),
+        'css_url': dict(head._css_url),
+        'javascript': dict(head._named_javascript),
+        'javascript_url': dict(head._javascript_url)
+    }
+
+
+def diff_head_declarations(before, after):
+    """Return the css and javascript declarations added by a view, in order
+
+    In:
+      - ``before`` -- declarations before the rendering of the view
+      - ``after`` -- declarations after the rendering of the view
+
+    Return:
+      - list of tuples (declaration method name, positional arguments, keyword arguments)
+    """
+    if (before is None) or (after is None):
+        return ()
+
+    declarations = []
+
+    for method, declared in after.items():
+        for name, value in declared.items():
+            if name not in before[method]:
+                declarations.append((value[0], method, (name,) + value[1:-1], value[-1]))
+
+    return [declaration[1:] for declaration in sorted(declarations)]
+
+
+def update_ids(output, old_ids, new_ids):
+    """Replace the session and state ids of a rendered output
+
+    In:
+      - ``output`` -- the tree, list of trees or string
+      - ``old_ids`` -- ids put into the output when it was rendered
+      - ``new_ids`` -- ids of the current state
+
+    Return:
+      - the output (a tree is changed in place)
+    """
+    # The old ids are unique placeholders, not found into the other texts
+    replacements = [(old, new) for old, new in zip(old_ids, new_ids) if old and (old != new)]
+
+    def replace(text):
+        for old, new in replacements:
+            text = text.replace(old, new)
+
+        return text
+
+    if not replacements:
+        return output
+
+    if isinstance(output, basestring):
+        return replace(output)
+
+    if isinstance(output, (list, tuple)):
+        return type(output)(update_ids(e, old_ids, new_ids) for e in output)
+
+    if not isinstance(output, xml._Tag):
+        return output
+
+    for element in output.iter():
+        if not isinstance(element.tag, basestring):
+            # Comments and processing instructions
+            continue
+
+        for name, value in element.attrib.items():
+            new_value = replace(value)
+            if new_value != value:
+                element.set(name, new_value)
+
+        for name in ('text', 'tail'):
+            text = getattr(element, name)
+            if isinstance(text, basestring) and (replace(text) != text):
+                setattr(element, name, replace(text))
+
+    return output
+
+
+def restore(entry, renderer, comp, model):
+    """Reuse a cached view
+
+    In:
+      - ``entry`` -- the cached view
+      - ``renderer`` -- the renderer
+      - ``comp`` -- the component
+      - ``model`` -- name of the view
+
+    Return:
+      - the rendered tree (``None`` if the cached view can't be reused)
+    """
+    tree, ids, old_ids, declarations = entry
+
+    # The callbacks are re-bound to the objects graph of the current state
+    state_callbacks = getattr(renderer.session, 'callbacks', {})
+    if not all(id_ in state_callbacks for id_ in ids):
+        return None
+
+    new_callbacks = comp.__dict__.setdefault('_new_callbacks', {})
+    for id_ in ids:
+        # The callbacks of the nested components are now owned by this view
+        new_callbacks[id_] = (model,) + state_callbacks[id_][1:]
+        callbacks.record(id_)
+
+    tree = copy.deepcopy(tree)
+    xml._Tag.init(tree, renderer)
+    if old_ids is not None:
+        update_ids(tree, old_ids, get_ids(renderer, *renderer.session.get_rendered_ids()))
+        renderer.session.referenced = True
+
+    for method, args, kw in declarations:
+        getattr(renderer.head, method)(*args, **kw)
+
+    return tree
+
+
+def cached(view, dependencies):
+    """Wrap a view into a cached view
+
+    In:
+      - ``view`` -- the view
+      - ``dependencies`` -- function returning the version or the dependencies of an object
+
+    Return:
+      - the cached view
+    """
+    def render(self, renderer, comp, model):
+        key = get_key(self, renderer, comp, model, dependencies(self))
+        if key is None:
+            return view(self, renderer, comp, model)
+
+        try:
+            output = restore(cache[key], renderer, comp, model)
+        except KeyError:
+            output = None
+
+        if output is not None:
+            return output
+
+        state = renderer.session
+        referenced = state.referenced
+        state.referenced = False
+
+        # The ids are rendered as placeholders, the ones of an enclosing cached view if any
+        placeholders = state.placeholders
+        state.placeholders = placeholders or create_placeholders()
+
+        head = get_head_declarations(getattr(renderer, 'head', None))
+        defer_scripts = getattr(getattr(renderer, 'head', None), 'defer_scripts', False)
+
+        try:
+            with callbacks.recording() as ids:
+                output = view(self, renderer, comp, model)
+        finally:
+            rendered_ids = get_ids(renderer, *state.placeholders) if state.referenced else None
+            state.placeholders = placeholders
+
+        if isinstance(output, xml._Tag):
+            declarations = diff_head_declarations(head, get_head_declarations(getattr(renderer, 'head', None)))
+            if defer_scripts and not renderer.head.defer_scripts:
+                declarations = list(declarations) + [('blocking_scripts', (), {})]
+
+            cache[key] = (copy.deepcopy(output), ids, rendered_ids, declarations)
+
+        if (rendered_ids is not None) and (placeholders is None):
+            output = update_ids(output, rendered_ids, get_ids(renderer, state.session_id, state.state_id))
+
+        state.referenced |= referenced
+
+        return output
+
+    return render
@@ -0,0 +1,343 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Ahead-of-time compilation of the views
+
+A compiled view is declared with ``presentation.render_for(cls, model, compiled=True)``
+or decorated by ``compile_view()``.
+
+The source of the view is analyzed and its static subtrees, the tags created
+from the renderer with only literal children and attributes, as
+``h.li(h.a('Home', href='/'), class_='menu')``, are hoisted: they are built
+once for each class of renderer then only copied. The dynamic parts of the
+view are unchanged.
+
+The view is kept as is when its source can't be analyzed or compiled (no source, closure,
+``next_method`` parameter, renderer parameter reassigned ...). At rendering
+time, a subtree is built as usual when the renderer or one of its tags is not
+a plain one (special tag factory, string builder renderer, attributes checked
+...)
+"""
+
+import ast
+import re
+import types
+import inspect
+import linecache
+import __future__
+
+from nagare.namespaces import xml, xhtml_base
+
+# Name of the parameter receiving the ``StaticTrees`` object into the compiled code
+STATICS = '__nagare_statics__'
+
+# Classes of the tags that can be prebuilt
+PLAIN_TAGS = (xml._Tag, xhtml_base._HTMLTag)
+
+FUTURE_FLAGS = [getattr(__future__, feature).compiler_flag for feature in __future__.all_feature_names]
+CODING = re.compile(r'^[ \t\f]*#.*coding[:=][ \t]*([-\w.]+)')
+
+_marker = object()
+
+
+def get_tags_names(node):
+    """Return the names of the tags created by a static expression
+
+    In:
+      - ``node`` -- the AST of the expression
+
+    Return:
+      - set of the names
+    """
+    return {child.attr for child in ast.walk(node) if isinstance(child, ast.Attribute)}
+
+
+class StaticTrees(object):
+    """The prebuilt static subtrees of a compiled view
+    """
+    def __init__(self, builders, names):
+        """Initialization
+
+        In:
+          - ``builders`` -- for each subtree, function receiving a renderer and
+            building the subtree
+          - ``names`` -- for each subtree, the names of its tags
+        """
+        self.builders = builders
+        self.names = names
+
+        self.trees = {}  # (renderer class, tags prefix, namespaces) -> list of prebuilt trees (``None`` if not prebuilt)
+
+    @staticmethod
+    def is_tag_factory(cls, name):
+        """Is an attribute of a renderer class a plain tag factory?
+
+        In:
+          - ``cls`` -- the renderer class
+          - ``name`` -- the name of the attribute
+
+        Return:
+          - a boolean
+        """
+        for klass in inspect.getmro(cls):
+            if name in klass.__dict__:
+                return type(klass.__dict__[name]) is xml.TagProp
+
+        # Any attribute is a tag of the generic XML renderer
+        return getattr(cls, '__getattr__', None) == xml.Renderer.__getattr__
+
+    def build(self, renderer, i):
+        """Build the prototype of a static subtree
+
+        In:
+          - ``renderer`` -- the renderer
+          - ``i`` -- index of the subtree
+
+        Return:
+          - the prototype, not attached to a renderer (``None`` if it can't be prebuilt)
+        """
+        if not all(self.is_tag_factory(renderer.__class__, name) for name in self.names[i]):
+            return None
+
+        tree = self.builders[i](renderer)
+        if not isinstance(tree, PLAIN_TAGS) or any(type(e) not in PLAIN_TAGS for e in tree.iter()):
+            return None
+
+        tree._renderer = None
+        return tree
+
+    def __call__(self, renderer, i):
+        """Return a static subtree
+
+        In:
+          - ``renderer`` -- the renderer
+          - ``i`` -- index of the subtree
+
+        Return:
+          - a copy of the prebuilt subtree, or a newly built subtree
+        """
+        if xml.CHECK_ATTRIBUTES or not isinstance(renderer, xml.XmlRenderer):
+            return self.builders[i](renderer)
+
+        namespaces = renderer.namespaces
+        key = (renderer.__class__, renderer._prefix, tuple(sorted(namespaces.items())) if namespaces else None)
+
+        trees = self.trees.get(key)
+        if trees is None:
+            trees = self.trees[key] = [_marker] * len(self.builders)
+
+        tree = trees[i]
+        if tree is _marker:
+            tree = trees[i] = self.build(renderer, i)
+
+        return self.builders[i](renderer) if tree is None else renderer.copy_template(tree)
+
+
+class Hoister(ast.NodeTransformer):
+    """Replace the static subtrees of a view by calls to the ``StaticTrees`` object
+    """
+    def __init__(self, renderer):
+        """Initialization
+
+        In:
+          - ``renderer`` -- name of the renderer parameter of the view
+        """
+        self.renderer = renderer
+        self.statics = []  # ASTs of the hoisted expressions
+
+    def is_tag(self, node):
+        """Is an expression a tag created with only literal children and attributes?
+
+        In:
+          - ``node`` -- AST of the expression
+
+        Return:
+          - a boolean
+        """
+        if isinstance(node, ast.Attribute):
+            return isinstance(node.value, ast.Name) and (node.value.id == self.renderer) and not node.attr.startswith('_')
+
+        if not isinstance(node, ast.Call) or (node.starargs is not None) or (node.kwargs is not None):
+            return False
+
+        children = node.args + [keyword.value for keyword in node.keywords]
+        return self.is_tag(node.func) and all(self.is_static(child) for child in children)
+
+    def is_static(self, node):
+        """Is an expression a literal or a static tag?
+
+        In:
+          - ``node`` -- AST of the expression
+
+        Return:
+          - a boolean
+        """
+        if isinstance(node, (ast.Str, ast.Num)):
+            return True
+
+        if isinstance(node, (ast.Tuple, ast.List)):
+            return all(self.is_static(e) for e in node.elts)
+
+        return self.is_tag(node)
+
+    def visit_Call(self, node):
+        # Only the tags with children or attributes are worth to be copied
+        if not (node.args or node.keywords) or not self.is_tag(node):
+            return self.generic_visit(node)
+
+        self.statics.append(node)
+        call = ast.Call(ast.Name(STATICS, ast.Load()), [ast.Name(self.renderer, ast.Load()), ast.Num(len(self.statics) - 1)], [], None, None)
+
+        return ast.copy_location(call, node)
+
+    # The nested scopes can shadow the renderer and are not compiled
+    def visit_FunctionDef(self, node):
+        return node
+    visit_ClassDef = visit_Lambda = visit_GeneratorExp = visit_SetComp = visit_DictComp = visit_FunctionDef
+
+
+def is_compilable(view, renderer, body):
+    """Can the AST of a view be compiled?
+
+    In:
+      - ``view`` -- the view
+      - ``renderer`` -- name of the renderer parameter
+      - ``body`` -- AST of the body of the view
+
+    Return:
+      - a boolean
+    """
+    if view.func_closure:
+        return False
+
+    for node in ast.walk(ast.Module(body)):
+        if isinstance(node, ast.Exec) or (isinstance(node, ast.Global) and (renderer in node.names)):
+            return False
+
+        if isinstance(node, ast.Name) and (node.id in (renderer, STATICS)) and not isinstance(node.ctx, ast.Load):
+            return False
+
+        # The private names of the methods would not be mangled
+        name = getattr(node, 'attr', None) or getattr(node, 'id', None)
+        if isinstance(name, str) and name.startswith('__') and not name.endswith('__'):
+            return False
+
+    return True
+
+
+def parse(view):
+    """Return the AST of a view
+
+    In:
+      - ``view`` -- the view
+
+    Return:
+      - tuple (AST of the function definition, future flags) (``None`` if the source can't be analyzed)
+    """
+    try:
+        lines, lineno = inspect.getsourcelines(view)
+    except (IOError, TypeError):
+        return None
+
+    source = ''.join(lines)
+    prefix = []
+
+    if source[:1].isspace():
+        # Method or nested function
+        prefix.append('if 1:\n')
+
+    try:
+        source.decode('ascii')
+    except UnicodeDecodeError:
+        # The source encoding must be declared
+        module_lines = linecache.getlines(view.func_code.co_filename)[:2]
+        encoding = ([match.group(1) for match in map(CODING.match, module_lines) if match] or ['ascii'])[0]
+        prefix.insert(0, '# -*- coding: %s -*-\n' % encoding)
+
+    flags = sum(flag for flag in FUTURE_FLAGS if view.func_code.co_flags & flag)
+
+    try:
+        module = compile(''.join(prefix) + source, view.func_code.co_filename, 'exec', ast.PyCF_ONLY_AST | flags, True)
+    except SyntaxError:
+        return None
+
+    definition = module.body[0]
+    if prefix[-1:] == ['if 1:\n']:
+        definition = definition.body[0]
+
+    if not isinstance(definition, ast.FunctionDef) or (definition.name != view.__name__):
+        return None
+
+    ast.increment_lineno(definition, lineno - 1 - len(prefix))
+
+    return definition, flags
+
+
+def compile_view(view):
+    """Compile a view
+
+    In:
+      - ``view`` -- the view, receiving the object and the renderer as first parameters
+
+    Return:
+      - the compiled view (``view`` if it can't be compiled)
+    """
+    parsed = parse(view)
+    if parsed is None:
+        return view
+
+    definition, flags = parsed
+
+    args = definition.args.args
+    if (len(args) < 2) or not all(isinstance(arg, ast.Name) for arg in args[:2]) or (args[0].id == 'next_method'):
+        return view
+
+    renderer = args[1].id
+    if not is_compilable(view, renderer, definition.body):
+        return view
+
+    hoister = Hoister(renderer)
+    definition.body = [hoister.visit(statement) for statement in definition.body]
+    if not hoister.statics:
+        return view
+
+    # The decorators are already applied and the default values of the parameters,
+    # evaluated into the globals of the view, are given back when the function is rebuilt
+    definition.decorator_list = []
+    definition.args.defaults = []
+
+    # The view is compiled into a factory: ``STATICS`` becomes a free variable of the view
+    builders = ast.List([ast.Lambda(ast.arguments([ast.Name(renderer, ast.Param())], None, None, []), static) for static in hoister.statics], ast.Load())
+    factory = ast.FunctionDef(
+        '__nagare_factory__',
+        ast.arguments([ast.Name(STATICS, ast.Param())], None, None, []),
+        [definition, ast.Return(ast.Tuple([ast.Name(definition.name, ast.Load()), builders], ast.Load()))],
+        []
+    )
+    module = ast.fix_missing_locations(ast.Module([ast.copy_location(factory, definition)]))
+
+    statics = StaticTrees(None, [get_tags_names(static) for static in hoister.statics])
+
+    try:
+        code = compile(module, view.func_code.co_filename, 'exec', flags, True)
+
+        namespace = {}
+        exec code in namespace
+
+        compiled, statics.builders = namespace['__nagare_factory__'](statics)
+    except Exception:
+        return view
+
+    # The compiled view shares the globals of the view
+    compiled = types.FunctionType(compiled.func_code, view.func_globals, view.__name__, view.func_defaults, compiled.func_closure)
+    compiled.__doc__ = view.__doc__
+    compiled.__dict__.update(view.__dict__)
+    compiled.statics = statics
+
+    return compiled
@@ -17,17 +17,26 @@ expired session id, it creates a new root component and a new session.
 
 import sys
 import os
+import time
+import cPickle
+import hashlib
+import contextlib
 
 import webob
 from webob import exc, acceptparse
 
-from nagare import component, presentation, serializer, database, top, security, log, comet, i18n, local
+from nagare import component, presentation, serializer, database, top, security, log, comet, i18n, local, profiler, fragments
 from nagare.security import dummy_manager
-from nagare.callbacks import CallbackLookupError
-from nagare.callbacks import process as process_callbacks
+from nagare.etags import etag_matches
+from nagare.callbacks import CallbackLookupError, is_readonly_request, get_ids as get_callback_ids
+from nagare.callbacks import process as process_callbacks, recording as callbacks_recording
 from nagare.namespaces import xhtml5
 
-from nagare.sessions import ExpirationError, SessionSecurityError
+from nagare.sessions import ExpirationError, SessionSecurityError, SessionBusyError
+from nagare.sessions import serializer as sessions_serializer
+from nagare.sessions import lru_dict
+
+_marker = object()
 
 
 # ---------------------------------------------------------------------------
@@ -51,6 +60,7 @@ class Response(webob.Response):
 
         accept = acceptparse.Accept(accept)
         self.xml_output = accept.best_match(('text/html', 'application/xhtml+xml')) == 'application/xhtml+xml'
+        self.compact_output = False  # Serialize the HTML without indentation?
 
         self.content_type = ''
         self.doctype = None
@@ -73,6 +83,7 @@ class WSGIApp(object):
 
         self.static_path = ''
         self.static_url = ''
+        self.bundles = None
         self.data_path = ''
         self.databases = []
         self.name = ''
@@ -82,6 +93,21 @@ class WSGIApp(object):
         self.sessions = None
         self.last_exception = None
 
+        self.lazy_sessions = True
+        self.coalescing_window = 1.
+        self.streaming_output = False
+        self.compact_output = False
+        self.etags = False
+        self.defer_scripts = False
+        self.preload_links = False
+        self.profile_views = False
+        self.profile_header = False
+        self.esi = 'off'
+        self.profiler = profiler.Statistics()  # Profiles of the views, aggregated over the requests
+        self._coalesced_responses = lru_dict.ThreadSafeLRUDict(100)  # Key -> (time, response)
+        self.bootstrap_cache = False
+        self._root_templates = {}  # Key -> serialized root component (or ``None``)
+
         self.security = dummy_manager.Manager()
 
         self.set_default_locale(i18n.Locale())
@@ -97,6 +123,18 @@ class WSGIApp(object):
         self.name = config['application']['name']
         self.redirect_after_post = config['application']['redirect_after_post']
         self.always_html = config['application']['always_html']
+        self.lazy_sessions = config['application']['lazy_sessions']
+        self.coalescing_window = config['application']['coalescing_window']
+        self.streaming_output = config['application']['streaming_output']
+        self.compact_output = config['application']['compact_output']
+        self.etags = config['application']['etags']
+        self.defer_scripts = config['application']['defer_scripts']
+        self.preload_links = config['application']['preload_links']
+        self.profile_views = config['application']['profile_views']
+        self.profile_header = config['application']['profile_header']
+        self.esi = config['application']['esi']
+        self.bootstrap_cache = config['application']['bootstrap_cache']
+        self.invalidate_root_templates()
 
     def set_static_path(self, static_path):
         """Register the directory of the static contents
@@ -115,6 +153,14 @@ class WSGIApp(object):
         """
         self.static_url = static_url
 
+    def set_bundles(self, bundles):
+        """Register the bundles of the static contents
+
+        In:
+          - ``bundles`` -- the ``bundles.Bundles`` object
+        """
+        self.bundles = bundles
+
     def set_data_path(self, data_path):
         """Register the directory of the data
 
@@ -231,6 +277,20 @@ class WSGIApp(object):
         """
         raise request.create_redirect_response()
 
+    def on_session_busy(self, request, response):
+        """The session lock can't be acquired in time or too many requests are
+        already waiting for it
+
+        In:
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+
+        Return:
+          - raise a ``webob.exc`` object, used to generate the response to the browser
+            (by default a "503 Service Unavailable", a "409 Conflict" can also be used)
+        """
+        raise exc.HTTPServiceUnavailable(headers={'Retry-After': '1'})
+
     def on_back(self, request, response, h, output):
         """The user used the back button
 
@@ -309,7 +369,10 @@ class WSGIApp(object):
         Return:
             - a ``webob.Response`` object
         """
-        return self.response_factory(accept)
+        response = self.response_factory(accept)
+        response.compact_output = self.compact_output
+
+        return response
 
     def create_root(self, *args, **kw):
         """Create the application root component
@@ -319,6 +382,221 @@ class WSGIApp(object):
         """
         return self.root_factory(*args, **kw)
 
+    def get_root_template_key(self, request):
+        """Return the key of the root template to use for a new session
+
+        Different root components can be cached, for example one for each
+        locale:
+
+        .. code-block:: python
+
+            def get_root_template_key(self, request):
+                return request.accept_language.best_match(('en', 'fr'))
+
+        In:
+          - ``request`` -- the web request object
+
+        Return:
+          - the key of the template (``None`` to always use the same root template)
+        """
+        return None
+
+    def invalidate_root_templates(self, key=_marker):
+        """Forget the cached root templates
+
+        In:
+          - ``key`` -- key of the template to forget (all of them by default)
+        """
+        if key is _marker:
+            self._root_templates.clear()
+        else:
+            self._root_templates.pop(key, None)
+
+    def bootstrap_root(self, request):
+        """Create the root component of a new session
+
+        With the ``bootstrap_cache`` parameter, the root component created by
+        the first call to ``create_root()`` is cached, serialized, into this
+        process. Then each new session gets a fresh copy, deserialized from it:
+        the root component factory must not create per-session values (tokens,
+        identifiers, timestamps, data loaded from a database ...)
+
+        In:
+          - ``request`` -- the web request object
+
+        Return:
+          - the root component
+        """
+        if not self.bootstrap_cache:
+            return self.create_root()
+
+        key = self.get_root_template_key(request)
+
+        template = self._root_templates.get(key, _marker)
+        if template is None:
+            # This root component can't be serialized
+            return self.create_root()
+
+        if template is not _marker:
+            return sessions_serializer.template_loads(template)
+
+        root = self.create_root()
+
+        try:
+            self._root_templates[key] = sessions_serializer.template_dumps(root)
+        except (TypeError, cPickle.PicklingError):
+            log.warning("Can't cache the root component: %s", sys.exc_info()[1])
+            self._root_templates[key] = None
+
+        return root
+
+    def is_session_required(self, request, response, state):
+        """Must a new session be created?
+
+        Only called, when ``lazy_sessions`` is activated, for the requests without
+        session. Override it to keep the new session of some requests even when
+        the rendered views don't reference it.
+
+        In:
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+          - ``state`` -- the state of the new session
+
+        Return:
+          - a boolean. By default, ``True`` only if the session and state ids
+            were sent to the client (links, forms or actions were rendered)
+        """
+        return state.referenced
+
+    def is_readonly_request(self, request):
+        """Can the request share its session with the other read-only requests?
+
+        The read-only requests are processed concurrently and each one creates
+        its own new state. Only called for the not XHR requests: the views of a
+        XHR request register their new actions into the state of its page
+
+        In:
+          - ``request`` -- the web request object
+
+        Return:
+          - a boolean. By default, ``True`` if the request only calls actions
+            declared read-only (see ``callbacks.readonly``) or no action at all
+        """
+        return is_readonly_request(request)
+
+    def get_version(self, request, response, root):
+        """Return the version of the page to render
+
+        Only called, when ``etags`` is activated, for the ``GET`` requests
+        without actions. The entity tag of the page is derived from this version
+        so, if the browser already has this version of the page, the page is
+        neither rendered nor serialized. Override it to return a version of the
+        objects displayed by the page (a revision number, a modification date ...)
+
+        A serialized page can't be compared to the one of the browser as it
+        contains the ids of its state and of its actions, new for each rendering
+
+        In:
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+          - ``root`` -- the application root component
+
+        Return:
+          - the version (``None``, the default, for no entity tag)
+        """
+        return None
+
+    def get_etag(self, request, response, version):
+        """Return the entity tag of a page
+
+        In:
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+          - ``version`` -- the version of the page
+
+        Return:
+          - the entity tag
+        """
+        return '"%s"' % hashlib.sha1(version if isinstance(version, str) else repr(version)).hexdigest()
+
+    def not_modified(self, request, response, etag):
+        """Answer "304 Not Modified" if the browser already has the page
+
+        In:
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+          - ``etag`` -- the entity tag of the page
+
+        Return:
+          - a boolean, ``True`` if the response was changed into a "304 Not Modified"
+        """
+        response.headers['ETag'] = etag
+
+        if_none_match = request.headers.get('If-None-Match')
+        if (if_none_match is None) or not etag_matches(etag, if_none_match):
+            return False
+
+        response.status = 304
+        response.app_iter = []
+        response.content_length = None
+        response.content_type = None
+
+        return True
+
+    def get_coalescing_key(self, request, state):
+        """Return the key identifying the duplicates of a request
+
+        During ``coalescing_window`` seconds, the duplicates of a request (double
+        clicked links, resubmitted forms ...) receive its response instead of
+        being processed again
+
+        In:
+          - ``request`` -- the web request object
+          - ``state`` -- the state of the request
+
+        Return:
+          - the key (``None`` if the request must always be processed)
+        """
+        if not self.coalescing_window or state.is_new or request.is_xhr:
+            return None
+
+        params = request.params.items()
+        if not all(isinstance(value, basestring) for _, value in params):
+            # Uploaded files
+            return None
+
+        # The secure id prevents a request without the session cookie to get the response
+        return (
+            state.session_id, state.state_id, state.secure_id,
+            request.method, request.path_info, tuple(sorted(params))
+        )
+
+    def get_coalesced_response(self, key):
+        """Return the response of a recent request
+
+        In:
+          - ``key`` -- key of the request
+
+        Return:
+          - the response (``None`` if not found or too old)
+        """
+        if key is None:
+            return None
+
+        t, response = self._coalesced_responses.peek(key, (0, None))
+        return response if (time.time() - t) < self.coalescing_window else None
+
+    def set_coalesced_response(self, key, response):
+        """Keep the response of a request for its duplicates
+
+        In:
+          - ``key`` -- key of the request
+          - ``response`` -- the response
+        """
+        # A streamed response can't be replayed
+        if (key is not None) and (getattr(response, 'status_int', 500) < 500) and isinstance(getattr(response, 'app_iter', None), list):
+            self._coalesced_responses[key] = (time.time(), response)
+
     def create_renderer(self, async, session, request, response):
         """Create the initial renderer (the root of all the used renderers)
 
@@ -345,9 +623,73 @@ class WSGIApp(object):
                 request.script_name,
                 async_header=True
             )
+        else:
+            renderer.head.bundles = self.bundles
+            renderer.head.defer_scripts = self.defer_scripts
+            renderer.head.preload_links = self.preload_links
+
+            if self.esi != 'off':
+                # The fragment views are included with ESI tags
+                renderer.fragments_url = request.script_name
 
         return renderer
 
+    @contextlib.contextmanager
+    def profile_rendering(self, request, response, renderer):
+        """Context manager profiling the views rendered during a request
+
+        The profile is aggregated to the profiles of the application and/or, if
+        requested, sent back into a HTTP header
+
+        In:
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+          - ``renderer`` -- the initial renderer
+        """
+        header = self.profile_header and (profiler.HEADER in request.headers)
+        if not (self.profile_views or header):
+            yield
+            return
+
+        renderer.profile = profile = profiler.Profile()
+        with callbacks_recording() as profile.callbacks:
+            yield
+
+        if self.profile_views:
+            self.profiler.add(profile)
+
+        if header:
+            response.headers[profiler.HEADER] = profile.format()
+
+    def render_fragment(self, request, response):
+        """Render a fragment view, without session
+
+        In:
+          - ``request`` -- the web request object
+          - ``response`` -- the web response object
+
+        Return:
+          - the response object
+        """
+        try:
+            self.start_request(None, request, response)
+
+            renderer = self.create_renderer(False, None, request, response)
+            renderer.fragments_url = None
+
+            with self.profile_rendering(request, response, renderer):
+                ttl, output = fragments.render_fragment(request.environ['PATH_INFO'], renderer)
+
+            self._phase2(output, renderer.content_type, None, True, response)
+            fragments.set_cache_headers(response, ttl)
+        except exc.HTTPException, response:
+            pass
+        except Exception:
+            self.last_exception = (request, sys.exc_info())
+            response = self.on_exception(request, response)
+
+        return response
+
     def start_request(self, root, request, response):
         """A new request is received, setup its dedicated environment
 
@@ -397,7 +739,13 @@ class WSGIApp(object):
         Out:
           - ``response`` -- the response object
         """
-        (response.content_type, response.body) = serializer.serialize(output, content_type, doctype, not is_xhr)
+        if self.streaming_output and not is_xhr:
+            # The page is sent by chunks, while it's serialized
+            (response.content_type, response.app_iter) = serializer.serialize_stream(output, content_type, doctype, True)
+            response.content_length = None
+        else:
+            (response.content_type, response.body) = serializer.cached_serialize(output, content_type, doctype, not is_xhr)
+
         response.charset = 'utf-8'
 
     def __call__(self, environ, start_response):
@@ -436,12 +784,17 @@ class WSGIApp(object):
         xhr_request = request.is_xhr
 
         state = None
+        coalescing_key = None
         self.last_exception = None
 
         log.set_logger('nagare.application.' + self.name)  # Set the dedicated application logger
 
         # Create a database transaction for each request
         with database.session.begin():
+            if (self.esi != 'off') and fragments.is_fragment_url(request.path_info):
+                # The session independent fragments are directly rendered
+                return self.render_fragment(request, response)(environ, start_response)
+
             try:
                 # Phase 1
                 # -------
@@ -457,10 +810,24 @@ class WSGIApp(object):
                 except SessionSecurityError:
                     self.on_invalid_session(request, response)
 
-                state.acquire()
+                try:
+                    # The views of a XHR request register their new actions into the state of their page
+                    state.acquire(not xhr_request and self.is_readonly_request(request))
+                except SessionBusyError:
+                    self.on_session_busy(request, response)
+
+                # Time waited for the session lock, for the monitoring middlewares
+                environ['nagare.lock_wait_time'] = state.lock_wait_time
+
+                # The duplicates of a request, waiting for the session lock, reuse its response
+                coalescing_key = self.get_coalescing_key(request, state)
+                coalesced_response = self.get_coalesced_response(coalescing_key)
+                if coalesced_response is not None:
+                    coalescing_key = None
+                    raise exc.HTTPException('Coalesced request', coalesced_response)
 
                 try:
-                    root, callbacks = state.get_root() or (self.create_root(), None)
+                    root, callbacks = state.get_root() or (self.bootstrap_root(request), None)
                 except ExpirationError:
                     self.on_expired_session(request, response)
                 except SessionSecurityError:
@@ -477,7 +844,7 @@ class WSGIApp(object):
                     url = request.path_info.strip('/')
                     if url:
                         # If a URL is given, initialize the objects graph with it
-                        presentation.init(root, tuple(url.split('/')), None, request.method, request)
+                        presentation.cached_init(root, tuple(url.split('/')), None, request.method, request)
 
                 try:
                     render = self._phase1(root, request, response, callbacks)
@@ -505,12 +872,21 @@ class WSGIApp(object):
                         response = self.on_after_post(request, response, state.sessionid_in_url(request, response))
                     else:
                         use_same_state = xhr_request
+                        # A page versioned and already in the browser is neither rendered
+                        # nor serialized and, as no action was called, its state is not stored
+                        version = None
+                        if self.etags and (request.method == 'GET') and not render and not get_callback_ids(request):
+                            version = self.get_version(request, response, root)
+
+                        if (version is not None) and self.not_modified(request, response, self.get_etag(request, response, version)):
+                            raise exc.HTTPException('Not modified', response)
 
                         # Create a new renderer
                         renderer = self.create_renderer(xhr_request, state, request, response)
                         # If the phase 1 has returned a render function, use it
                         # else, start the rendering by the application root component
-                        output = render(renderer) if render else root.render(renderer)
+                        with self.profile_rendering(request, response, renderer):
+                            output = render(renderer) if render else root.render(renderer)
 
                         if state.back_used:
                             output = self.on_back(request, response, renderer, output)
@@ -520,8 +896,9 @@ class WSGIApp(object):
 
                         self._phase2(output, renderer.content_type, renderer.doctype, xhr_request, response)
 
-                    # Store the state
-                    state.set_root(use_same_state, root)
+                    # Store the state. A new session is only created if needed
+                    if not state.is_new or not self.lazy_sessions or self.is_session_required(request, response, state):
+                        state.set_root(use_same_state, root)
 
                     security.get_manager().end_rendering(request, response, state)
                 except exc.HTTPException, response:
@@ -533,6 +910,9 @@ class WSGIApp(object):
                     response = self.on_exception(request, response)
             finally:
                 if state:
+                    if state.locked:
+                        self.set_coalesced_response(coalescing_key, response)
+
                     state.release()
 
         return response(environ, start_response)
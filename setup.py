@@ -92,6 +92,7 @@ setup(
 
         [nagare.commands]
         info = nagare.admin.info:Info
+        bundle = nagare.admin.bundle:Bundle
         serve = nagare.admin.serve:Serve
         create-app = nagare.admin.create:Create
         create-db = nagare.admin.db:DBCreate
@@ -118,6 +119,8 @@ setup(
         [nagare.admin]
         info = nagare.admin.interface.info:Admin
         apps = nagare.admin.interface.applications:Admin
+        sessions = nagare.admin.interface.sessions:Admin
+        profiler = nagare.admin.interface.profiler:Admin
         ''',
     classifiers=(
         'Development Status :: 4 - Beta',
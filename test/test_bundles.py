@@ -0,0 +1,111 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import os
+import shutil
+import tempfile
+
+from nagare import bundles, presentation
+from nagare.namespaces import xhtml5
+
+STATIC_FILES = {
+    'a.css': '/* Comment */\nbody {\n  color : red ;\n  background: url(img/bg.png);\n}\n',
+    'b.css': 'p:hover { content: "a  b" }',
+    'c.css': '@import "a.css";',
+    'a.js': 'function f() {\n    // Comment\n\n    return 1;\n}',
+    'b-min.js': 'var x=1',
+    'c.js': '/* Strict */\n"use strict";\nvar y = 2;',
+}
+
+
+static = directory = None
+
+
+def setup_module(module):
+    global static, directory
+
+    static = tempfile.mkdtemp()
+    directory = os.path.join(static, 'bundles')
+
+    for name, content in STATIC_FILES.items():
+        with open(os.path.join(static, name), 'w') as f:
+            f.write(content)
+
+
+def teardown_module(module):
+    shutil.rmtree(static)
+
+
+def create_bundles():
+    return bundles.Bundles(directory, '/static/app/_bundles', [('/static/app', static)])
+
+
+def test_minify():
+    """Bundles - minification"""
+    assert bundles.minify_css(STATIC_FILES['a.css']) == 'body{color :red;background:url(img/bg.png)}'
+    assert bundles.minify_css(STATIC_FILES['b.css']) == 'p:hover{content:"a  b"}'
+
+
+def test_rewrite():
+    """Bundles - the consecutive local files are replaced by their bundle"""
+    b = create_bundles()
+
+    rewritten = b.rewrite('css', [
+        ('/static/app/a.css', {}), ('/static/app/b.css', {}),
+        ('/static/app/b.css', {'media': 'print'}),
+        ('http://cdn/x.css', {}),
+        ('/static/app/c.css', {}), ('/static/app/a.css', {})
+    ])
+
+    bundle = rewritten[0][0]
+    assert bundle.startswith('/static/app/_bundles/') and bundle.endswith('.css')
+    assert rewritten[1:] == [
+        ('/static/app/b.css', {'media': 'print'}),
+        ('http://cdn/x.css', {}),
+        ('/static/app/c.css', {}), ('/static/app/a.css', {})  # ``@import`` rule, not bundled
+    ]
+
+    with open(os.path.join(directory, bundle.split('/')[-1])) as f:
+        assert f.read() == 'body{color :red;background:url(/static/app/img/bg.png)}\np:hover{content:"a  b"}'
+
+    rewritten = b.rewrite('js', [('/static/app/a.js', {}), ('/static/app/b-min.js', {}), ('/static/app/missing.js', {})])
+    assert rewritten == [('/static/app/a.js', {}), ('/static/app/b-min.js', {}), ('/static/app/missing.js', {})]
+
+    # The strict mode would apply to all the files of the bundle
+    rewritten = b.rewrite('js', [('/static/app/a.js', {}), ('/static/app/c.js', {})])
+    assert rewritten == [('/static/app/a.js', {}), ('/static/app/c.js', {})]
+
+    # The javascript files are only concatenated
+    bundle = b.rewrite('js', [('/static/app/a.js', {}), ('/static/app/b-min.js', {})])[0][0]
+    with open(os.path.join(directory, bundle.split('/')[-1])) as f:
+        assert f.read() == STATIC_FILES['a.js'] + ';\nvar x=1'
+
+    # The bundles are kept across the restarts
+    assert create_bundles().bundles == {key: bundle for key, bundle in b.bundles.items() if bundle}
+
+    # Until a file is modified
+    os.utime(os.path.join(static, 'a.js'), (0, 0))
+    assert len(create_bundles().bundles) == 1
+
+
+def test_head():
+    """Bundles - the ``<head>`` references the bundles"""
+    h = xhtml5.Renderer(static_url='/static/app/')
+    h.head.bundles = create_bundles()
+
+    h.head.css_url('a.css')
+    h.head.css_url('b.css')
+    h.head.javascript_url('a.js')
+
+    head = presentation.render(h.head, None, None, None)
+    links = head.xpath('./link/@href')
+    scripts = head.xpath('./script/@src')
+
+    assert (len(links) == 1) and links[0].startswith('/static/app/_bundles/')
+    assert scripts == ['/static/app/a.js']
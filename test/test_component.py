@@ -7,8 +7,9 @@
 # this distribution.
 # --
 
-from nagare import component, presentation, continuation, var
+from nagare import component, presentation, continuation, var, local, views_cache, profiler
 from nagare.namespaces import xhtml
+from nagare.sessions import common
 
 
 class Foo(object):
@@ -128,3 +129,287 @@ def test4():
 
     foo.becomes(model='foo')
     assert foo.render(h).write_htmlstring(pretty_print=True).strip() == "<h1>I'm bar in foo</h1>"
+
+
+# -------------------------------------------------------------------------------------------------------
+
+class Counter(object):
+    def __init__(self):
+        self.value = 0
+        self.nb_renderings = 0
+
+    def increment(self):
+        self.value += 1
+
+
+@presentation.render_for(Counter, cache=lambda self: self.value)
+def render_counter(self, h, *args):
+    self.nb_renderings += 1
+    return h.div(h.a(self.value).action(self.increment))
+
+
+class SessionsManager(common.Sessions):
+    def get_lock(self, session_id):
+        return local.DummyLock()
+
+
+def test5():
+    """Component - cached view"""
+    local.request = local.Process()
+    views_cache.clear()
+
+    counter = Counter()
+    comp = component.Component(counter)
+    state = common.State(SessionsManager(), 10, 42, None, False)
+
+    h = xhtml.Renderer(session=state)
+    html = comp.render(h).write_htmlstring()
+    assert counter.nb_renderings == 1 and '_c=00042' in html
+
+    # The state id is updated into the cached view and its callbacks are re-bound
+    state.state_id = 43
+    state.callbacks = comp.serialize_callbacks(False)
+
+    html = comp.render(xhtml.Renderer(session=state)).write_htmlstring()
+    assert counter.nb_renderings == 1 and '_c=00043' in html and '_c=00042' not in html
+    assert comp._new_callbacks == state.callbacks
+
+    counter.increment()
+    comp.render(xhtml.Renderer(session=state))
+    assert counter.nb_renderings == 2
+
+    comp.render(xhtml.Renderer())
+    assert counter.nb_renderings == 3
+
+    # The dependencies of a cached view must be explicit
+    try:
+        presentation.render_for(Counter, model='tracked', cache=True)
+    except TypeError:
+        pass
+    else:
+        assert False
+
+
+class Note(object):
+    def __init__(self, text):
+        self.text = text
+
+    def edit(self):
+        pass
+
+
+@presentation.render_for(Note, cache=lambda self: self.text)
+def render_note(self, h, *args):
+    return h.p(h.a(self.text).action(self.edit), h.span('42'))
+
+
+def test5bis():
+    """Component - the ids of a cached view are rendered as placeholders"""
+    local.request = local.Process()
+    views_cache.clear()
+
+    comp = component.Component(Note('see ?_s=10&_c=00042'))
+    state = common.State(SessionsManager(), 10, 42, None, False)
+
+    html = comp.render(xhtml.Renderer(session=state)).write_htmlstring()
+    assert ('>see ?_s=10&amp;_c=00042<' in html) and ('_s=10&amp;_c=00042&amp;_action' in html)
+    assert state.referenced and (state.placeholders is None)
+
+    # Only the ids of the links are changed, not the texts
+    state.state_id = 43
+    state.callbacks = comp.serialize_callbacks(False)
+
+    html = comp.render(xhtml.Renderer(session=state)).write_htmlstring()
+    assert ('>see ?_s=10&amp;_c=00042<' in html) and ('_s=10&amp;_c=00043&amp;_action' in html)
+    assert '<span>42</span>' in html
+
+
+class Chart(object):
+    def __init__(self):
+        self.nb_renderings = 0
+
+
+@presentation.render_for(Chart, cache=lambda self: 1)
+def render_chart(self, h, *args):
+    self.nb_renderings += 1
+    h.head.blocking_scripts()
+    return h.div(h.script('draw()'))
+
+
+def test5ter():
+    """Component - the scripts are not deferred when a cached view is restored"""
+    local.request = local.Process()
+    views_cache.clear()
+
+    chart = Chart()
+    comp = component.Component(chart)
+    state = common.State(SessionsManager(), 10, 42, None, False)
+    state.callbacks = {}
+
+    for i in range(2):
+        h = xhtml.Renderer(session=state)
+        h.head.defer_scripts = True
+        comp.render(h)
+        assert not h.head.defer_scripts
+
+    assert chart.nb_renderings == 1
+
+
+# -------------------------------------------------------------------------------------------------------
+
+class Shape(object):
+    route = None
+
+
+class Circle(Shape):
+    pass
+
+
+@presentation.render_for(Shape)
+def render_shape(self, h, *args):
+    return 'shape'
+
+
+@presentation.render_for(Shape, model='name')
+def render_name(self, h, *args):
+    return 'shape name'
+
+
+@presentation.init_for(Shape)
+def init_shape(self, url, *args):
+    self.route = 'shape'
+
+
+@presentation.init_for(Shape, 'url == ("name",)')
+def init_name(self, url, *args):
+    self.route = 'shape name'
+
+
+def test6():
+    """Component - the views resolved once are updated when new views are registered"""
+    h = xhtml.Renderer()
+
+    assert component.Component(Circle()).render(h) == 'shape'
+    assert component.Component(Circle(), model='name').render(h) == 'shape name'
+
+    @presentation.render_for(Circle, model='name')
+    def render(self, h, *args):
+        return 'circle name'
+
+    assert component.Component(Circle()).render(h) == 'shape'
+    assert component.Component(Circle(), model='name').render(h) == 'circle name'
+    assert component.Component(Shape(), model='name').render(h) == 'shape name'
+
+
+def test7():
+    """Component - the routes resolved once are updated when new routes are registered"""
+    circle = component.Component(Circle())
+
+    circle.init(('name',), 'GET', None)
+    assert circle().route == 'shape name'
+    circle.init(('radius',), 'GET', None)
+    assert circle().route == 'shape'
+
+    @presentation.init_for(Circle, 'url == ("radius",)')
+    def init(self, url, *args):
+        self.route = 'circle radius'
+
+    circle.init(('radius',), 'GET', None)
+    assert circle().route == 'circle radius'
+    circle.init(('name',), 'GET', None)
+    assert circle().route == 'shape name'
+
+
+def test7bis():
+    """Component - the conditions of the routes use the names of the scope where they are declared"""
+    circle = component.Component(Circle())
+    area_url = ('area',)  # noqa: F841
+
+    @presentation.init_for(Circle, 'url == area_url')
+    def init(self, url, *args):
+        self.route = 'circle area'
+
+    circle.init(('area',), 'GET', None)
+    assert circle().route == 'circle area'
+    circle.init(('name',), 'GET', None)
+    assert circle().route == 'shape name'
+
+
+# -------------------------------------------------------------------------------------------------------
+
+class Page(object):
+    def __init__(self):
+        self.items = [component.Component(Item()) for i in range(3)]
+
+
+class Item(object):
+    pass
+
+
+@presentation.render_for(Page)
+def render_page(self, h, *args):
+    with h.ul:
+        h << self.items
+
+    return h.root
+
+
+@presentation.render_for(Item)
+def render_item(self, h, *args):
+    return h.li(h.span('item'))
+
+
+def test8():
+    """Component - profile of the rendered views"""
+    h = xhtml.Renderer()
+    h.profile = profiler.Profile()
+
+    component.Component(Page()).render(h)
+
+    page, items = h.profile.views['test.test_component.Page'], h.profile.views['test.test_component.Item']
+    assert (page[0] == 1) and (items[0] == 3)
+    assert page[1] >= items[1] >= items[2] > 0
+    assert (page[3] == 1) and (items[3] == 6)
+
+    statistics = profiler.Statistics()
+    statistics.add(h.profile)
+    statistics.add(h.profile)
+
+    nb_requests, views = statistics.get_views()
+    assert (nb_requests == 2) and (dict((view[0], view[1]) for view in views) == {'test.test_component.Page': 2, 'test.test_component.Item': 6})
+
+
+class BrokenItem(object):
+    pass
+
+
+@presentation.render_for(BrokenItem)
+def render_broken_item(self, h, *args):
+    raise ValueError('broken')
+
+
+@presentation.render_for(Page, model='safe')
+def render_safe_page(self, h, *args):
+    with h.ul:
+        for item in self.items:
+            try:
+                h << item
+            except ValueError:
+                h << h.li('error')
+
+    return h.root
+
+
+def test9():
+    """Component - profile of the views with rendering errors"""
+    h = xhtml.Renderer()
+    h.profile = profiler.Profile()
+
+    o = Page()
+    o.items[1] = component.Component(BrokenItem())
+    component.Component(o, 'safe').render(h)
+
+    assert not h.profile.frames
+    page, items = h.profile.views['test.test_component.Page:safe'], h.profile.views['test.test_component.Item']
+    assert (page[0] == 1) and (items[0] == 2) and ('test.test_component.BrokenItem' not in h.profile.views)
+    assert (page[3] == 2) and (items[3] == 4)
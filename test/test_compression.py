@@ -0,0 +1,82 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import zlib
+
+from nagare import compression
+
+PAGE = '<html><body>%s</body></html>' % ('<p>hello world</p>' * 100)
+
+
+def create_app(content_type='text/html', body=(PAGE,), headers=()):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', content_type)] + list(headers))
+        return body() if callable(body) else list(body)
+
+    return app
+
+
+def call(app, accept_encoding='gzip, deflate'):
+    response = []
+    environ = {'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept_encoding}
+
+    chunks = list(app(environ, lambda status, headers, exc_info=None: response.extend((status, dict(headers)))))
+    return response[0], response[1], chunks
+
+
+def test_negotiate_encoding():
+    """Compression - negotiation of the encoding"""
+    assert compression.negotiate_encoding('') is None
+    assert compression.negotiate_encoding('identity') is None
+    assert compression.negotiate_encoding('gzip, deflate')[0] == 'gzip'
+    assert compression.negotiate_encoding('deflate')[0] == 'deflate'
+    assert compression.negotiate_encoding('gzip;q=0.5, deflate')[0] == 'deflate'
+    assert compression.negotiate_encoding('gzip;q=0, *')[0] == 'deflate'
+    assert compression.negotiate_encoding('*;q=0') is None
+
+
+def test_compressed():
+    """Compression - the page is compressed"""
+    status, headers, chunks = call(compression.CompressionMiddleware(create_app(body=(PAGE[:1000], PAGE[1000:]))))
+
+    body = ''.join(chunks)
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Length'] == str(len(body))
+    assert zlib.decompress(body, 16 + zlib.MAX_WBITS) == PAGE
+    assert len(body) * 8 < len(PAGE)
+
+    status, headers, chunks = call(compression.CompressionMiddleware(create_app()), 'deflate')
+    assert headers['Content-Encoding'] == 'deflate'
+    assert zlib.decompress(''.join(chunks)) == PAGE
+
+
+def test_streamed():
+    """Compression - a streamed page is compressed by chunks"""
+    app = create_app(body=lambda: (PAGE[i:i + 100] for i in range(0, len(PAGE), 100)))
+    status, headers, chunks = call(compression.CompressionMiddleware(app, threshold=300))
+
+    assert headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in headers
+    assert len(chunks) > 2
+    assert zlib.decompress(''.join(chunks), 16 + zlib.MAX_WBITS) == PAGE
+
+
+def test_not_compressed():
+    """Compression - the small, already compressed or already encoded contents are not compressed"""
+    for app, accept_encoding in (
+        (compression.CompressionMiddleware(create_app()), ''),
+        (compression.CompressionMiddleware(create_app(), threshold=len(PAGE) + 1), 'gzip'),
+        (compression.CompressionMiddleware(create_app('image/png')), 'gzip'),
+        (compression.CompressionMiddleware(create_app(headers=[('Content-Encoding', 'br')])), 'gzip')
+    ):
+        status, headers, chunks = call(app, accept_encoding)
+
+        assert headers.get('Content-Encoding') in (None, 'br')
+        assert ''.join(chunks) == PAGE
@@ -0,0 +1,142 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+from paste import fixture
+
+from nagare import local, wsgi, component, presentation, fragments
+from nagare.namespaces import xhtml
+from nagare.sessions.memory_sessions import SessionsWithPickledStates
+
+
+class News(object):
+    nb_renders = 0
+
+    def __init__(self, category):
+        self.category = category
+
+
+@presentation.render_for(News, fragment=60, fragment_args=lambda self: (self.category,))
+def render_news(self, h, *args):
+    News.nb_renders += 1
+    return h.ul(h.li('News about ' + self.category))
+
+
+class Rating(object):
+    def __init__(self, stars):
+        self.stars = int(stars)
+
+
+@presentation.render_for(Rating, fragment=60, fragment_args=lambda self: (self.stars,))
+def render_rating(self, h, *args):
+    return h.p('%d stars' % self.stars)
+
+
+class Page(object):
+    def __init__(self):
+        self.news = component.Component(News(u'caf\xe9 & co'))
+
+
+@presentation.render_for(Page)
+def render_page(self, h, *args):
+    return h.div(h.h1('Page'), self.news)
+
+
+def create_app(esi):
+    local.worker = local.Process()
+    local.request = local.Process()
+
+    app = wsgi.create_WSGIApp(Page)
+    app.set_sessions_manager(SessionsWithPickledStates())
+    app.esi = esi
+    app.start()
+
+    return app
+
+
+def test_inline():
+    """Fragments - rendered into the page when not activated"""
+    h = xhtml.Renderer()
+    assert component.Component(Page()).render(h).write_htmlstring() == (
+        '<div><h1>Page</h1><ul><li>News about caf\xc3\xa9 &amp; co</li></ul></div>'
+    )
+
+    app = fixture.TestApp(create_app('off'))
+    res = app.get('/')
+    assert ('<li>News about' in res.body) and ('Surrogate-Control' not in res.headers)
+
+    app.get('/_fragment/test.test_fragments.News/x', status=404)
+
+
+def test_include():
+    """Fragments - included with an ESI tag, at a session independent URL"""
+    app = fixture.TestApp(create_app('edge'))
+
+    res = app.get('/')
+    assert res.header('Surrogate-Control') == fragments.ESI_CONTENT
+    assert 'News about' not in res.body
+
+    src = '/_fragment/test.test_fragments.News/caf%25C3%25A9%2520%2526%2520co'
+    assert '<esi:include xmlns:esi="%s" src="%s"></esi:include>' % (fragments.esi.NS, src) in res.body
+
+    res = app.get(src)
+    assert res.body.strip() == '<ul><li>News about caf\xc3\xa9 &amp; co</li></ul>'
+    assert res.header('Cache-Control') == 'public, max-age=60'
+    assert res.header('Surrogate-Control') == 'max-age=60'
+    assert 'Set-Cookie' not in res.headers
+
+    app.get('/_fragment/test.test_fragments.Unknown', status=404)
+
+    # Not the arguments of the class
+    app.get('/_fragment/test.test_fragments.News', status=404)
+    app.get('/_fragment/test.test_fragments.News/a/b', status=404)
+    app.get('/_fragment/test.test_fragments.Rating/x', status=404)
+    assert '5 stars' in app.get('/_fragment/test.test_fragments.Rating/5').body
+
+
+def test_middleware():
+    """Fragments - ESI tags processed by the local middleware"""
+    app = fixture.TestApp(fragments.ESIMiddleware(create_app('local')))
+
+    News.nb_renders = 0
+    for i in range(3):
+        res = app.get('/')
+        assert '<h1>Page</h1><ul><li>News about caf\xc3\xa9 &amp; co</li></ul>' in res.body.replace('\n', '')
+        assert ('Surrogate-Control' not in res.headers) and ('ETag' not in res.headers)
+        assert int(res.header('Content-Length')) == len(res.body)
+
+    # The fragment is cached by the middleware
+    assert News.nb_renders == 1
+
+
+class LazyResponse(object):
+    """WSGI application starting its response with its first chunk"""
+    closed = False
+
+    def __init__(self, environ, start_response):
+        self.start_response = start_response
+
+    def __iter__(self):
+        self.start_response('200 OK', [('Content-Type', 'text/plain')])
+        yield 'hello'
+        yield ' world'
+
+    def close(self):
+        LazyResponse.closed = True
+
+
+def test_middleware_passthrough():
+    """Fragments - the pages without ESI tags are streamed then closed"""
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    output = fragments.ESIMiddleware(LazyResponse)({}, start_response)
+    assert (''.join(output) == 'hello world') and (statuses == ['200 OK'])
+    assert LazyResponse.closed
@@ -14,7 +14,8 @@ import unittest
 from lxml import etree
 
 from nagare.namespaces import xml, xhtml
-from nagare.serializer import serialize
+from nagare.serializer import serialize, serialize_stream
+from nagare.wsgi import Response
 
 
 class TestSerializer(unittest.TestCase):
@@ -28,6 +29,45 @@ class TestSerializer(unittest.TestCase):
         r = serialize(h.p('hello'), 'text/html', '<!DOCTYPE html>', True)
         self.assertEqual(r, ('text/html', '<!DOCTYPE html>\n<p>hello</p>\n'))
 
+    def test_html_stream(self):
+        h = xhtml.Renderer()
+
+        with h.html:
+            with h.body:
+                for i in range(1000):
+                    h << h.div(h.p('hello %d' % i), class_='item')
+
+        html = serialize(h.root, 'text/html', '<!DOCTYPE html>', True)[1]
+
+        content_type, chunks = serialize_stream(h.root, 'text/html', '<!DOCTYPE html>', True)
+        chunks = list(chunks)
+        self.assertEqual(content_type, 'text/html')
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(chunks[0].startswith('<!DOCTYPE html>\n<html><body><div class="item">'))
+        self.assertEqual(''.join(chunks).replace('\n', ''), html.replace('\n', ''))
+
+        r = serialize_stream(h.p('hello'), 'application/xhtml+xml', '<!DOCTYPE html>', False)
+        self.assertEqual(r, ('application/xhtml+xml', ['<p>hello</p>']))
+
+    def test_html_compact(self):
+        response = Response('text/html')
+        response.compact_output = True
+        h = xhtml.Renderer(response=response)
+
+        with h.html:
+            with h.body:
+                h << h.div(h.p('hello'), h.p('world'))
+
+        r = serialize(h.root, 'text/html', '<!DOCTYPE html>', True)
+        self.assertEqual(r, ('text/html', '<!DOCTYPE html>\n<html><body><div><p>hello</p><p>world</p></div></body></html>'))
+
+        r = serialize(h.p('hello'), 'text/html', None, False)
+        self.assertEqual(r, ('text/html', '<p>hello</p>'))
+
+        root = h.parse_htmlstring('<html xmlns="http://www.w3.org/1999/xhtml"><body><p>hello</p></body></html>', xhtml=True)
+        self.assertEqual(root.tag, 'html')
+        self.assertEqual(serialize(root, 'text/html', None, False)[1], '<html><body><p>hello</p></body></html>')
+
     def test_xhtml(self):
         h = xhtml.Renderer()
 
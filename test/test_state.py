@@ -0,0 +1,143 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+from nagare import state
+from nagare.sessions import serializer
+
+
+class Catalog(object):
+    __transient__ = ('layout',)
+
+    def __init__(self):
+        self.category = 'books'
+        self.layout = 'big layout'
+        self.nb_computations = 0
+
+    @state.transient
+    def products(self):
+        self.nb_computations += 1
+        return [self.category] * 3
+
+
+def test_transient_attributes():
+    """State - transient attributes declaration"""
+    assert state.transient_attributes(Catalog) == frozenset(('layout', 'products'))
+    assert state.transient_attributes(object) == frozenset()
+
+
+def test_transient_lazy():
+    """State - transient attribute computed once"""
+    catalog = Catalog()
+
+    assert catalog.products == ['books'] * 3
+    assert catalog.products == ['books'] * 3
+    assert catalog.nb_computations == 1
+
+
+def test_transient_dumps():
+    """State - transient attributes not kept into the states"""
+    catalog = Catalog()
+    catalog.products
+
+    pickle = serializer.Pickle()
+    session_data, state_data = pickle.dumps(catalog, True)
+
+    # The serialized object keeps its transient attributes
+    assert catalog.layout == 'big layout'
+    assert 'products' in catalog.__dict__
+
+    catalog2, callbacks = pickle.loads(session_data, state_data)
+    assert 'layout' not in catalog2.__dict__
+    assert 'products' not in catalog2.__dict__
+
+    assert catalog2.products == ['books'] * 3
+    assert catalog2.nb_computations == 2
+
+
+class Rules(object):
+    pass
+
+
+class Product(object):
+    def __init__(self, rules):
+        self.rules = rules
+
+
+def test_shared():
+    """State - shared objects not kept into the states"""
+    rules = state.shared(Rules(), 'test.rules')
+
+    try:
+        product = Product(rules)
+
+        pickle = serializer.Pickle()
+        session_data, state_data = pickle.dumps(product, True)
+        assert not session_data
+
+        product2, callbacks = pickle.loads(session_data, state_data)
+        assert product2.rules is rules
+    finally:
+        state.unshared('test.rules')
+
+    assert state.get_shared_name(rules) is None
+
+
+def test_shared_builtins():
+    """State - shared dictionaries and lists not kept into the states"""
+    rates = state.shared({'EUR': 1.}, 'test.rates')
+    codes = state.shared(['EUR', 'USD'], 'test.codes')
+
+    try:
+        product = Product(rules=(rates, codes))
+
+        pickle = serializer.Pickle()
+        session_data, state_data = pickle.dumps(product, True)
+        assert 'USD' not in state_data
+
+        product2, callbacks = pickle.loads(session_data, state_data)
+        assert (product2.rules[0] is rates) and (product2.rules[1] is codes)
+    finally:
+        state.unshared('test.rates')
+        state.unshared('test.codes')
+
+    assert not state.has_shared_builtins()
+
+
+def test_shared_twice():
+    """State - an object can't be shared under two names"""
+    rules = state.shared(Rules(), 'test.rules')
+
+    try:
+        assert state.shared(rules, 'test.rules') is rules
+
+        try:
+            state.shared(rules, 'test.rules2')
+        except ValueError:
+            pass
+        else:
+            assert False, 'ValueError not raised'
+
+        assert state.get_shared_name(rules) == 'test.rules'
+    finally:
+        state.unshared('test.rules')
+
+
+class Basket(object):
+    def __init__(self):
+        self.owner = 'John'
+        self.products = [Product('P%d' % i) for i in range(3)]
+
+
+def test_pickled_sizes():
+    """State - sizes broken down by class and attribute"""
+    sizes = serializer.pickled_sizes(Basket())
+
+    assert set(sizes) == {(__name__ + '.Basket', 'owner'), (__name__ + '.Basket', 'products'), (__name__ + '.Product', 'rules')}
+    assert sizes[(__name__ + '.Product', 'rules')][0] == 3
+    assert sum(size for _, size in sizes.values()) < serializer.pickled_size(Basket())
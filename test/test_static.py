@@ -0,0 +1,125 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import os
+import gzip
+import shutil
+import tempfile
+
+from nagare.publishers import static
+
+root = None
+
+
+def setup_module(module):
+    global root
+
+    root = tempfile.mkdtemp()
+
+    with open(os.path.join(root, 'small.css'), 'w') as f:
+        f.write('body { color: red }')
+
+    with open(os.path.join(root, 'large.js'), 'w') as f:
+        f.write('x' * 100000)
+
+    f = gzip.open(os.path.join(root, 'large.js.gz'), 'w')
+    f.write('x' * 100000)
+    f.close()
+
+
+def teardown_module(module):
+    shutil.rmtree(root)
+
+
+def get_file(path):
+    filename = os.path.join(root, path[1:])
+    return filename if os.path.isfile(filename) else None
+
+
+def call(app, path, **headers):
+    response = []
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path}
+    environ.update(('HTTP_' + name.upper(), value) for name, value in headers.items())
+
+    body = app(environ, lambda status, headers: response.extend((status, dict(headers))))
+    return response[0], response[1], ''.join(body)
+
+
+def test_file():
+    """Static files - small file kept in memory"""
+    app = static.StaticFiles(get_file, max_age=3600)
+
+    status, headers, body = call(app, '/small.css')
+    assert (status == '200 OK') and (body == 'body { color: red }')
+    assert headers['Content-Type'] == 'text/css'
+    assert headers['Content-Length'] == '19'
+    assert headers['Cache-Control'] == 'public, max-age=3600'
+    assert app.files['/small.css'].content == body
+
+    assert call(app, '/missing.css')[0] == '404 Not Found'
+
+
+def test_not_modified():
+    """Static files - conditional requests"""
+    app = static.StaticFiles(get_file)
+    status, headers, body = call(app, '/small.css')
+
+    assert call(app, '/small.css', if_none_match=headers['ETag'])[0] == '304 Not Modified'
+    assert call(app, '/small.css', if_none_match='"other"', if_modified_since=headers['Last-Modified'])[0] == '200 OK'
+    assert call(app, '/small.css', if_modified_since=headers['Last-Modified'])[0] == '304 Not Modified'
+    assert call(app, '/small.css', if_modified_since='Thu, 01 Jan 1970 00:00:00 GMT')[0] == '200 OK'
+
+
+def test_range():
+    """Static files - byte ranges"""
+    app = static.StaticFiles(get_file)
+
+    status, headers, body = call(app, '/small.css', range='bytes=0-3')
+    assert (status == '206 Partial Content') and (body == 'body')
+    assert headers['Content-Range'] == 'bytes 0-3/19'
+
+    assert call(app, '/small.css', range='bytes=-3')[2] == 'd }'
+    assert call(app, '/large.js', range='bytes=99990-')[2] == 'x' * 10
+    assert call(app, '/small.css', range='bytes=100-')[0] == '416 Requested Range Not Satisfiable'
+    assert call(app, '/small.css', range='bytes=0-1,4-5')[0] == '200 OK'
+    assert call(app, '/small.css', range='bytes=0-3', if_range='"other"')[0] == '200 OK'
+
+
+def test_gzip():
+    """Static files - precompressed sibling"""
+    app = static.StaticFiles(get_file)
+
+    status, headers, body = call(app, '/large.js', accept_encoding='gzip')
+    assert (headers['Content-Encoding'] == 'gzip') and headers['Content-Type'].endswith('javascript')
+    assert (headers['Vary'] == 'Accept-Encoding') and (len(body) < 1000)
+
+    status, headers, body = call(app, '/large.js')
+    assert ('Content-Encoding' not in headers) and (body == 'x' * 100000)
+
+
+def test_file_wrapper():
+    """Static files - large files sent by the file wrapper"""
+    app = static.StaticFiles(get_file)
+
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/large.js', 'wsgi.file_wrapper': lambda f, size: ('wrapped', f.name)}
+    assert app(environ, lambda status, headers: None) == ('wrapped', os.path.join(root, 'large.js'))
+
+
+def test_invalidation():
+    """Static files - the modified files are read again"""
+    app = static.StaticFiles(get_file, check_interval=0)
+    filename = os.path.join(root, 'small.css')
+
+    assert call(app, '/small.css')[2] == 'body { color: red }'
+
+    with open(filename, 'w') as f:
+        f.write('body { color: blue }')
+    os.utime(filename, (0, 0))
+
+    assert call(app, '/small.css')[2] == 'body { color: blue }'
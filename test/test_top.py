@@ -316,3 +316,55 @@ class TestTop(unittest.TestCase):
         h = xhtml.Renderer(request=Request({'PATH_INFO': '/foo'}), response=self.h.response)
         h.head << h.head.link(rel='canonical', href='/bar')
         self.assertEqual(top.wrap('text/html', h, h.root).write_xmlstring(), '<html><head><link href="/bar" rel="canonical"/></head><body></body></html>')
+
+    def test_defer_scripts(self):
+        h = xhtml.Renderer(request=Request({'PATH_INFO': ''}), response=self.h.response)
+        h.head.defer_scripts = True
+        h.head.javascript_url('/a.js')
+        h.head.javascript_url('/b.js', charset='utf-8')
+        h.head.javascript_url('/c.js')
+        h.head.javascript_url('/d.js', async='async')
+        h << h.p('hello')
+
+        html = top.wrap('text/html', h, h.root)
+        # Only the scripts after the last blocking one are deferred
+        self.assertEqual([script.get('defer') for script in html.xpath('./head/script')], [None, None, 'defer', None])
+
+        h = xhtml.Renderer(request=Request({'PATH_INFO': ''}), response=self.h.response)
+        h.head.defer_scripts = True
+        h.head.javascript_url('/a.js')
+        h << h.a('hello', onclick='f()')
+
+        html = top.wrap('text/html', h, h.root)
+        # The page isn't scanned for the javascript codes
+        self.assertEqual(html.find('./head/script').get('defer'), 'defer')
+
+        h = xhtml.Renderer(request=Request({'PATH_INFO': ''}), response=self.h.response)
+        h.head.defer_scripts = True
+        h.head.javascript_url('/a.js')
+        h << h.script('f()')
+        h.head.blocking_scripts()
+
+        html = top.wrap('text/html', h, h.root)
+        # The view opted out
+        self.assertIsNone(html.find('./head/script').get('defer'))
+
+    def test_preload_links(self):
+        response = Response()
+        response.xml_output = False
+
+        h = xhtml.Renderer(request=Request({'PATH_INFO': ''}), response=response)
+        h.head.preload_links = True
+        h.head.css_url('/a.css')
+        h.head.javascript_url('/a.js')
+        h.head.preload('/font.woff2', 'font', type='font/woff2')
+
+        html = top.wrap('text/html', h, h.root)
+        self.assertEqual(
+            html.find('./head/link').attrib,
+            {'rel': 'preload', 'href': '/font.woff2', 'as': 'font', 'type': 'font/woff2', 'crossorigin': 'anonymous'}
+        )
+        self.assertEqual(
+            response.headers['Link'],
+            '</a.css>; rel=preload; as=style, </a.js>; rel=preload; as=script, </font.woff2>; rel=preload; as=font; crossorigin'
+        )
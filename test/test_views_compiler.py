@@ -0,0 +1,125 @@
+# --
+# Copyright (c) 2008-2017 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+from nagare import component, presentation, views_compiler
+from nagare.namespaces import xml, xhtml, xhtml5
+
+
+class Menu(object):
+    def __init__(self, entries):
+        self.entries = entries
+
+
+def render_menu(self, h, *args):
+    """Menu view"""
+    with h.div(class_='menu'):
+        h << h.h1('Menu ', h.small('(static)'), id='title')
+
+        with h.ul:
+            for entry in self.entries:
+                h << h.li(h.a(entry, href='#'), class_='entry')
+
+        h << h.p(h.span('a', 1), ' ', h.b('b', class_='x'))
+        h << h.a('Help', href='help.html')
+
+    return h.root
+
+
+compiled_menu = views_compiler.compile_view(render_menu)
+
+
+def html(view, renderer, o=None):
+    return view(o or Menu(['Home', 'News']), renderer, None, None).write_htmlstring()
+
+
+def test_static_trees():
+    """Views compiler - the static subtrees are prebuilt"""
+    assert compiled_menu is not render_menu
+    assert compiled_menu.__doc__ == 'Menu view'
+    assert len(compiled_menu.statics.builders) == 4
+
+    for i in range(3):
+        assert html(compiled_menu, xhtml.Renderer()) == html(render_menu, xhtml.Renderer())
+
+    # The ``<a>`` tag has a special factory
+    assert compiled_menu.statics.trees.values()[0][3] is None
+
+
+def test_renderers():
+    """Views compiler - same trees with all the renderers"""
+    for renderer in (xhtml5.Renderer, lambda: xml.Renderer()):
+        h1 = renderer()
+        h2 = renderer()
+
+        h1 << compiled_menu(Menu(['Home']), h1, None, None)
+        h2 << render_menu(Menu(['Home']), h2, None, None)
+
+        assert h1.root.write_xmlstring() == h2.root.write_xmlstring()
+
+
+def test_fallback():
+    """Views compiler - the views that can't be analyzed are not compiled"""
+    def view_without_static(self, h, *args):
+        return h.div(self.entries)
+
+    def view_with_reassignment(self, h, *args):
+        h = h.new()
+        return h.div(h.span('x'))
+
+    def view_with_closure(self, h, *args):
+        return h.div(view_without_static, h.span('x'))
+
+    for view in (view_with_closure, view_without_static, view_with_reassignment, lambda self, h, *args: h.div(h.span('x')), len):
+        assert views_compiler.compile_view(view) is view
+
+
+DEFAULT_TITLE = 'Menu'
+
+
+def view_with_defaults(self, h, comp, model, title=DEFAULT_TITLE, entries=('Home',)):
+    return h.div(h.h1(title), h.ul([h.li(entry) for entry in entries]), h.p('static', class_='x'))
+
+
+def test_defaults():
+    """Views compiler - the default values of the parameters are kept"""
+    compiled = views_compiler.compile_view(view_with_defaults)
+    assert compiled is not view_with_defaults
+    assert compiled.func_defaults == view_with_defaults.func_defaults
+
+    assert html(compiled, xhtml.Renderer()) == html(view_with_defaults, xhtml.Renderer()) == (
+        '<div><h1>Menu</h1><ul><li>Home</li></ul><p class="x">static</p></div>'
+    )
+
+
+class Page(object):
+    pass
+
+
+@presentation.render_for(Page, compiled=True)
+def render_page(self, h, comp, *args):
+    with h.div(id='page'):
+        h << h.h1('Title')
+        h << comp.render(h, model='content')
+
+    return h.root
+
+
+@presentation.render_for(Page, model='content', compiled=True)
+def render_page_content(self, h, *args):
+    return h.p('Content ', h.i('of the page'))
+
+
+def test_render_for():
+    """Views compiler - compiled views registered with ``render_for()``"""
+    assert hasattr(render_page, 'statics') and hasattr(render_page_content, 'statics')
+
+    h = xhtml.Renderer()
+    assert component.Component(Page()).render(h).write_htmlstring() == (
+        '<div id="page"><h1>Title</h1><p>Content <i>of the page</i></p></div>'
+    )
@@ -7,8 +7,11 @@
 # this distribution.
 # --
 
-from nagare import local, wsgi
+from paste import fixture
+
+from nagare import local, wsgi, callbacks, presentation
 from nagare.sessions import ExpirationError, common
+from nagare.sessions.memory_sessions import SessionsWithPickledStates
 
 local.request = local.Process()
 
@@ -88,3 +91,423 @@ def test_bad_session():
     """Request - session expired"""
     r = process_request(App(session_manager=ExpiredSessionManager(local.DummyLock)))
     assert (r.status_code == 301) and r['Location'] == 'http://localhost:8080/app/'
+
+
+class Root(object):
+    pass
+
+
+def test_bootstrap_cache():
+    """Request - new root components copied from a cached template"""
+    roots = []
+
+    def create_root():
+        roots.append(Root())
+        return roots[-1]
+
+    app = wsgi.WSGIApp(create_root)
+    app.bootstrap_cache = True
+
+    root1 = app.bootstrap_root(None)
+    root2 = app.bootstrap_root(None)
+    assert (len(roots) == 1) and (root1 is roots[0])
+    assert isinstance(root2, Root) and (root2 is not root1)
+
+    app.invalidate_root_templates()
+    app.bootstrap_root(None)
+    assert len(roots) == 2
+
+    app.bootstrap_cache = False
+    app.bootstrap_root(None)
+    app.bootstrap_root(None)
+    assert len(roots) == 4
+
+
+class LazySessionManager(common.Sessions):
+    def __init__(self):
+        super(LazySessionManager, self).__init__()
+        self.sessions = {}
+
+    def get_lock(self, session_id):
+        return Lock()
+
+    def create(self, session_id, secure_id, lock):
+        self.sessions[session_id] = None
+
+    def store_state(self, session_id, state_id, secure_id, use_same_state, session_data, state_data):
+        self.sessions[session_id] = state_data
+
+
+def test_lazy_sessions():
+    """Request - new session only created when referenced"""
+    sessions_manager = LazySessionManager()
+    app = App(sessions_manager)
+
+    environ = create_environ()
+    environ['QUERY_STRING'] = ''
+    request = app.create_request(environ)
+    response = app.create_response(request, 'text/html')
+
+    state = sessions_manager.get_state(request, response, False)
+    state.acquire()
+    assert state.get_root() is None
+    assert not app.is_session_required(request, response, state)
+    state.delete()
+    state.release()
+    assert not sessions_manager.sessions and ('Set-Cookie' not in response.headers)
+
+    state = sessions_manager.get_state(request, response, False)
+    state.acquire()
+    state.get_root()
+    state.sessionid_in_url(request, response)
+    assert app.is_session_required(request, response, state)
+    state.set_root(False, Root())
+    state.release()
+    assert (state.session_id in sessions_manager.sessions) and ('_nagare=' in response.headers['Set-Cookie'])
+
+
+def test_readonly_requests():
+    """Request - requests only calling read-only actions"""
+    actions = {}
+    action = callbacks.register(None, 4, lambda: None, False, None, actions)
+    readonly_action = callbacks.register(None, 4, callbacks.readonly(lambda: None), False, None, actions)
+
+    app = App()
+    environ = create_environ()
+
+    request = app.create_request(dict(environ, QUERY_STRING='_s=10&_c=42'))
+    assert app.is_readonly_request(request)
+
+    request = app.create_request(dict(environ, QUERY_STRING='_s=10&_c=42&' + readonly_action))
+    assert app.is_readonly_request(request)
+
+    request = app.create_request(dict(environ, QUERY_STRING='_s=10&_c=42&%s&%s' % (readonly_action, action)))
+    assert not app.is_readonly_request(request)
+
+
+def test_shared_lock():
+    """Request - readers / writer lock"""
+    lock = local.RWLock()
+
+    lock.acquire_shared()
+    lock.acquire_shared()
+    assert (lock.readers == 2) and not lock.writer
+
+    lock.release_shared()
+    lock.release_shared()
+
+    lock.acquire()
+    assert (lock.readers == 0) and lock.writer
+    lock.release()
+
+
+class BusyLock(object):
+    def acquire(self):
+        return False
+
+    release = acquire
+
+
+class BusySessionManager(common.Sessions):
+    def get_lock(self, session_id):
+        return BusyLock()
+
+
+def test_session_busy():
+    """Request - session lock not acquired"""
+    sessions_manager = BusySessionManager()
+    r = process_request(App(session_manager=sessions_manager))
+    assert (r.status_code == 503) and (r['Retry-After'] == '1')
+    assert sessions_manager.lock_statistics.nb_busy == 1
+
+
+def test_bounded_lock():
+    """Request - lock with a maximum wait time"""
+    lock = local.RWLock(max_wait_time=0.01)
+
+    assert lock.acquire()
+    assert not lock.acquire()
+    assert not lock.acquire_shared()
+
+    lock.release()
+    assert lock.acquire_shared()
+
+
+def test_bounded_shared_lock():
+    """Request - shared access with an explicit maximum wait time"""
+    lock = local.RWLock()
+
+    assert lock.acquire()
+    assert not lock.acquire_shared(0.01)
+
+    lock.release()
+    assert lock.acquire_shared(0.01)
+
+
+class MemcacheConnection(dict):
+    def __init__(self):
+        super(MemcacheConnection, self).__init__()
+        self.ttls = {}
+
+    def add(self, key, value, ttl):
+        if key in self:
+            return False
+
+        self[key] = value
+        self.ttls[key] = ttl
+        return True
+
+    def touch(self, key, ttl):
+        self.ttls[key] = ttl
+
+    def incr(self, key):
+        self[key] += 1
+        return self[key]
+
+    def decr(self, key):
+        self[key] -= 1
+        return self[key]
+
+    def delete(self, key):
+        self.pop(key, None)
+
+
+def test_memcache_competing_locks():
+    """Request - a request rejected by a memcache lock doesn't release it"""
+    from nagare.sessions import memcached_sessions
+
+    connection = MemcacheConnection()
+    lock1 = memcached_sessions.Lock(connection, 10, 60, 0.001, 0.01)
+    lock2 = memcached_sessions.Lock(connection, 10, 60, 0.001, 0.01)
+
+    assert lock1.acquire()
+    assert not lock2.acquire()
+    assert lock1.lock in connection
+    assert not lock2.acquire()
+
+    lock1.release()
+    assert lock2.acquire()
+    assert not lock1.acquire_shared(0.01)
+    lock2.release()
+
+
+def test_memcache_readers_ttl():
+    """Request - the readers counter of a memcache lock expires"""
+    from nagare.sessions import memcached_sessions
+
+    connection = MemcacheConnection()
+    lock = memcached_sessions.Lock(connection, 10, 60, 0.001, 0.01)
+
+    assert lock.acquire_shared()
+    assert (connection[lock.readers] == 1) and (connection.ttls[lock.readers] == 60)
+
+    # A reader never releasing the lock blocks the writers until the counter expires
+    assert not memcached_sessions.Lock(connection, 10, 60, 0.001, 0.01).acquire()
+    connection.delete(lock.readers)
+    assert memcached_sessions.Lock(connection, 10, 60, 0.001, 0.01).acquire()
+
+
+def test_memcache_locks_without_ttl():
+    """Request - without timeout, the requests not acquiring a memcache lock go ahead"""
+    from nagare.sessions import memcached_sessions
+
+    connection = MemcacheConnection()
+    lock1 = memcached_sessions.Lock(connection, 10, 60, 0.001, 0.01)
+    lock2 = memcached_sessions.Lock(connection, 10, 0, 0.001, 0.01)
+
+    assert lock1.acquire()
+    assert lock2.acquire() and not lock2.owned
+    assert lock2.acquire_shared() and not lock2.shared
+
+    # The lock of the other request is kept
+    lock2.release()
+    lock2.release_shared()
+    assert connection[lock1.lock] and not connection.get(lock1.readers)
+    lock1.release()
+
+
+def test_coalesced_requests():
+    """Request - duplicated requests reuse the same response"""
+    sessions_manager = LazySessionManager()
+    app = App(sessions_manager)
+
+    request = app.create_request(create_environ())
+    response = app.create_response(request, 'text/html')
+
+    state = common.State(sessions_manager, 10, 42, None, False)
+    key = app.get_coalescing_key(request, state)
+    assert key is not None
+
+    app.set_coalesced_response(key, response)
+    assert app.get_coalesced_response(key) is response
+    assert app.get_coalesced_response(app.get_coalescing_key(request, common.State(sessions_manager, 10, 43, None, False))) is None
+
+    app.coalescing_window = 0
+    assert app.get_coalescing_key(request, state) is None
+
+
+class Page(object):
+    def __init__(self):
+        self.nb_renders = 0
+
+
+@presentation.render_for(Page)
+def render_page(self, h, *args):
+    self.nb_renders += 1
+    return h.p('hello')
+
+
+def create_app():
+    local.worker = local.Process()
+
+    app = wsgi.create_WSGIApp(Page)
+    app.set_sessions_manager(SessionsWithPickledStates())
+    app.etags = True
+    app.start()
+
+    return app
+
+
+def test_etags():
+    """Request - entity tag and "304 Not Modified" answer"""
+    wsgi_app = create_app()
+    app = fixture.TestApp(wsgi_app)
+
+    # No entity tag without a version of the pages
+    assert 'ETag' not in app.get('/').headers
+
+    wsgi_app.get_version = lambda request, response, root: 1
+
+    res = app.get('/')
+    etag = res.header('ETag')
+    assert etag.startswith('"') and ('<p>hello</p>' in res.body)
+
+    res = app.get('/', headers={'If-None-Match': 'W/' + etag}, status=304)
+    assert (res.header('ETag') == etag) and not res.body
+
+    app.get('/', headers={'If-None-Match': '"other"'}, status=200)
+
+
+def test_etags_state():
+    """Request - the state of a page already in the browser is not stored"""
+    wsgi_app = create_app()
+    wsgi_app.lazy_sessions = False
+    wsgi_app.get_version = lambda request, response, root: 1
+    app = fixture.TestApp(wsgi_app)
+
+    etag = app.get('/').header('ETag')
+    (session_id, session), = wsgi_app.sessions._sessions.items.items()
+    states = session[4].items
+    assert len(states) == 1
+
+    app.get('/?_s=%d&_c=0' % session_id, headers={'If-None-Match': etag}, status=304)
+    assert len(states) == 1
+
+    app.get('/?_s=%d&_c=0' % session_id, status=200)
+    assert len(states) == 2
+
+
+def test_etags_version():
+    """Request - entity tag derived from the version of the page"""
+    versions = []
+    roots = []
+
+    def get_version(request, response, root):
+        roots.append(root())
+        return versions[-1]
+
+    wsgi_app = create_app()
+    wsgi_app.get_version = get_version
+    app = fixture.TestApp(wsgi_app)
+
+    versions.append(1)
+    etag = app.get('/').header('ETag')
+    assert roots[-1].nb_renders == 1
+
+    res = app.get('/', headers={'If-None-Match': etag}, status=304)
+    assert (res.header('ETag') == etag) and (roots[-1].nb_renders == 0)
+
+    versions.append(2)
+    res = app.get('/', headers={'If-None-Match': etag}, status=200)
+    assert (res.header('ETag') != etag) and (roots[-1].nb_renders == 1)
+
+    wsgi_app.etags = False
+    assert 'ETag' not in app.get('/').headers
+
+
+class XhrPage(object):
+    nb_renders = 0
+    with_action = False
+
+    def click(self):
+        pass
+
+
+@presentation.render_for(XhrPage)
+def render_xhr_page(self, h, *args):
+    XhrPage.nb_renders += 1
+    return h.a('link').action(self.click) if XhrPage.with_action else h.p('hello')
+
+
+def test_xhr_requests_not_shared():
+    """Request - the XHR requests store their new actions into the state of their page"""
+    local.worker = local.Process()
+
+    wsgi_app = wsgi.create_WSGIApp(XhrPage)
+    wsgi_app.set_sessions_manager(SessionsWithPickledStates())
+    wsgi_app.lazy_sessions = False
+    wsgi_app.start()
+    app = fixture.TestApp(wsgi_app)
+
+    app.get('/')
+    (session_id, session), = wsgi_app.sessions._sessions.items.items()
+    states = session[4].items
+    state_id = session[0] - 1
+    state = states[state_id]
+
+    XhrPage.nb_renders = 0
+    XhrPage.with_action = True
+    app.get('/?_s=%d&_c=%d&_a' % (session_id, state_id))
+    assert (XhrPage.nb_renders == 1) and (session[0] == state_id + 1)
+    assert (len(states) == 1) and (states[state_id] is not state)
+
+    # A read-only request not XHR creates its own new state
+    app.get('/?_s=%d&_c=%d' % (session_id, state_id))
+    assert (XhrPage.nb_renders == 2) and (session[0] == state_id + 2)
+    assert len(states) == 2
+
+
+class ProfiledPage(object):
+    def click(self):
+        pass
+
+
+@presentation.render_for(ProfiledPage)
+def render_profiled_page(self, h, *args):
+    return h.a('link').action(self.click)
+
+
+def test_profile():
+    """Request - profile of the views"""
+    local.worker = local.Process()
+
+    wsgi_app = wsgi.create_WSGIApp(ProfiledPage)
+    wsgi_app.set_sessions_manager(SessionsWithPickledStates())
+    wsgi_app.start()
+
+    app = fixture.TestApp(wsgi_app)
+    assert app.get('/', headers={'X-Nagare-Profile': '1'}).header('X-Nagare-Profile', None) is None
+
+    wsgi_app.profile_header = True
+    assert 'X-Nagare-Profile' not in app.get('/').headers
+
+    profile = app.get('/', headers={'X-Nagare-Profile': '1'}).header('X-Nagare-Profile')
+    assert profile.startswith('test.test_wsgi.ProfiledPage; nb=1; total=') and profile.endswith('; tags=1; callbacks=1')
+    assert wsgi_app.profiler.get_views() == (0, [])
+
+    wsgi_app.profile_views = True
+    app.get('/')
+    app.get('/')
+
+    nb_requests, views = wsgi_app.profiler.get_views()
+    assert (nb_requests == 2) and (len(views) == 1) and (views[0][1] == 2)